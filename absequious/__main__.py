@@ -1,113 +1,823 @@
 import argparse
 import csv
+import io
+import json
 import multiprocessing
+import os
+import shutil
 import subprocess
 import sys
-from io import StringIO
+import time
+from collections import Counter, deque
+from contextlib import nullcontext
+from functools import lru_cache, partial
 from multiprocessing import Pool
 from pathlib import Path
-from tempfile import NamedTemporaryFile, TemporaryDirectory
+from tempfile import TemporaryDirectory, TemporaryFile
 
-from Bio import SeqIO
-
-from . import utils, algo
-from .parse import HMMAln, NoAlignmentFound, annot_fmt
+from . import metrics, output, utils, algo
+from .chains import DEFAULT_MODEL_TABLE, ModelTableError, model_info
+from .counts import RunCounts
+from .hmm import load_models
+from .parse import HMMAln
+from .reads import RANGE_BYTES, iter_range, iter_reads, open_reads, split_ranges
 
 DEFAULT_HMM = Path(utils.get_script_dir()) / "data" / "ighv.hmm"
+FRAMES_PER_READ = 6
+# hmmsearch's default reporting threshold
+REPORT_E = 10.0
+# number of reads translated at once by the trans6 subcommand
+TRANS6_BATCH_SIZE = 10000
+# batches handed to each worker process ahead of the one it's aligning
+IN_FLIGHT_PER_JOB = 2
 
 
-def trans6(rec, fout):
+def trans6_batch(reads, fout, top_frames=FRAMES_PER_READ):
+    """
+    six-frame translate a batch of (read_id, dna) reads, writing the translations to @fout as FASTA and
+    returning a dictionary mapping target ID to translation.  if @top_frames is less than
+    six, only that many of the most plausible frames of each read are kept.  with @fout
+    None, nothing is written
+    """
     t = {}
-    for (comp, offset, seq) in utils.translate_six(str(rec.seq)):
-        seq_id = f"{rec.id}:{comp.name}:offset_{offset}"
-        t[seq_id] = seq
-        fout.write(f">{seq_id}\n{seq}\n".encode("utf-8"))
-    fout.flush()
+    with metrics.stage("translate", len(reads)):
+        for (read_id, _), frames in zip(
+            reads, utils.translate_six_batch([dna for _, dna in reads])
+        ):
+            for comp, offset, seq in utils.prefilter_frames(frames, top_frames):
+                t[f"{read_id}:{comp.name}:offset_{offset}"] = seq
+    if fout is not None:
+        with metrics.stage("write_fasta", len(reads)):
+            fout.write(
+                "".join(f">{seq_id}\n{seq}\n" for seq_id, seq in t.items()).encode(
+                    "utf-8"
+                )
+            )
+            fout.flush()
     return t
 
 
+def trans6_range(read_range):
+    """six-frame translate the reads of ReadRange @read_range, returning FASTA as bytes"""
+    fout = io.BytesIO()
+    for batch in batches(iter_range(read_range), TRANS6_BATCH_SIZE):
+        trans6_batch(batch, fout)
+    return fout.getvalue()
+
+
+def input_ranges(path, jobs):
+    """
+    split the file of reads at @path into ReadRanges for @jobs workers to read, or return
+    None if there's a single worker or the file can't be split
+    """
+    if jobs <= 1:
+        return None
+    return split_ranges(path, n_ranges(path, jobs))
+
+
+def n_ranges(path, jobs):
+    """
+    the number of ranges to split the file at @path into, for @jobs workers: enough to keep
+    them all busy, and of at most about RANGE_BYTES each
+    """
+    return max(-(-os.path.getsize(path) // RANGE_BYTES), jobs * (IN_FLIGHT_PER_JOB + 1))
+
+
 def run_trans6(args):
-    with open(args.filename) as fin, open(args.filename + ".trans.fa", "wb") as fout:
-        reader = SeqIO.parse(fin, "fastq") if args.filename.lower().endswith(".fastq") else SeqIO.parse(fin, "fasta")
-        for rec in reader:
-            _ = trans6(rec, fout)
+    jobs = 1 if args.no_multiprocess else args.jobs
+    ranges = input_ranges(args.filename, jobs)
+    with open(args.filename + ".trans.fa", "wb") as fout:
+        if ranges:
+            # each worker reads and translates its own part of the file
+            for fasta in pool_imap(trans6_range, ranges, jobs):
+                fout.write(fasta)
+            return
+        with open_reads(args.filename) as fin:
+            for batch in batches(iter_reads(fin), TRANS6_BATCH_SIZE):
+                _ = trans6_batch(batch, fout)
+
+
+class DedupReads:
+    """
+    collapse reads with identical DNA sequences, so that each sequence is aligned only once:
+    unique() yields the first read with each sequence, and fan_out() turns the alignments of
+    those reads back into one alignment per input read, in input order
+    """
+
+    def __init__(self, reads):
+        self.reads = reads
+        self.n_reads = 0
+        # reads waiting for their sequence's alignment, in input order
+        self._pending = deque()
+        # sequences passed on for alignment and not yet aligned, in order
+        self._unaligned = deque()
+        self._alns = {}
+
+    @property
+    def n_unique(self):
+        return len(self._alns) + len(self._unaligned)
+
+    def unique(self):
+        seen = set()
+        for read_id, dna in self.reads:
+            self.n_reads += 1
+            self._pending.append((read_id, dna))
+            if dna not in seen:
+                seen.add(dna)
+                self._unaligned.append(dna)
+                yield read_id, dna
+
+    def fan_out(self, alns):
+        for aln in alns:
+            self._alns[self._unaligned.popleft()] = aln
+            while self._pending and self._pending[0][1] in self._alns:
+                read_id, dna = self._pending.popleft()
+                aln = self._alns[dna]
+                yield aln and aln.for_read(read_id)
+
+
+def batches(reader, batch_size):
+    batch = []
+    for rec in reader:
+        batch.append(rec)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def ordered_imap(pool, func, tasks, max_in_flight):
+    """
+    like @pool.imap, but never has more than @max_in_flight tasks submitted and unfinished,
+    so that @tasks is only consumed as fast as the workers keep up
+    """
+    in_flight = deque()
 
+    def next_result():
+        metrics.gauge("in_flight", len(in_flight))
+        with metrics.stage("wait_workers"):
+            return in_flight.popleft().get()
 
-def single_pipeline(t):
-    rec, temp_dir = t
+    for task in tasks:
+        if len(in_flight) >= max_in_flight:
+            yield next_result()
+        in_flight.append(pool.apply_async(func, (task,)))
+    while in_flight:
+        yield next_result()
+
+
+def iter_batch_alignments(reads, hmm, parser="text", top_frames=FRAMES_PER_READ):
+    """
+    translate a batch of (read_id, dna) reads into a single multi-record FASTA file and align all of them
+    with one hmmsearch run, yielding (read_id, alignment) tuples for each read's
+    best-scoring frame.
+
+    with @parser "text", hmmsearch's report is parsed as it is produced, and each read is
+    yielded as soon as it has been parsed.  with "tabular", alignments are instead built
+    from hmmsearch's --domtblout and -A output once the search has finished.
+
+    only the @top_frames most plausible frames of each read are aligned
+    """
     with TemporaryDirectory() as temp_dir:
-        with NamedTemporaryFile(dir=temp_dir, suffix=".trans.fa") as trans_f:
-            translated = trans6(rec, trans_f)
-            raw_aln = subprocess.run(
-                ["hmmsearch", "--notextw", args.hmm, trans_f.name],
-                stdout=subprocess.PIPE,
-            )
-            try:
-                x = HMMAln(
-                    StringIO(raw_aln.stdout.decode("utf-8")), str(rec.seq), translated
+        trans_fname = Path(temp_dir) / "batch.trans.fa"
+        with open(trans_fname, "wb") as trans_f:
+            translated = trans6_batch(reads, trans_f, top_frames)
+        dna_seqs = dict(reads)
+        # fix the search space size to that of a single read, so that E-values (and hence
+        # reporting thresholds) don't depend on the batch size
+        cmd = ["hmmsearch", "--notextw", "-Z", str(FRAMES_PER_READ)]
+
+        if parser == "tabular":
+            domtbl_fname = Path(temp_dir) / "batch.domtbl"
+            sto_fname = Path(temp_dir) / "batch.sto"
+            # include in the alignment everything hmmsearch would report
+            cmd += ["-o", os.devnull, "--domtblout", domtbl_fname, "-A", sto_fname]
+            cmd += ["--incE", str(REPORT_E), "--incdomE", str(REPORT_E)]
+            with metrics.stage("hmmsearch", len(reads), children=True):
+                subprocess.run(cmd + [hmm, trans_fname], check=True)
+            with open(domtbl_fname) as domtbl, open(sto_fname) as sto, metrics.stage(
+                "parse", len(reads)
+            ):
+                yield from HMMAln.iter_best(
+                    HMMAln.iter_tabular_alignments(
+                        domtbl, sto, load_models(hmm), dna_seqs, translated
+                    )
                 )
-            except NoAlignmentFound:
-                return None
-            except Exception as e:
-                print("~~~~ exception processing", rec.id)
-                print(type(e))
-                raise
-            return x
+            return
+
+        # the report is parsed as hmmsearch writes it, so parsing is timed along with the
+        # search
+        with metrics.stage("hmmsearch", len(reads), children=True), subprocess.Popen(
+            cmd + [hmm, trans_fname], stdout=subprocess.PIPE, text=True
+        ) as proc:
+            yield from HMMAln.iter_best(
+                HMMAln.iter_alignments(proc.stdout, dna_seqs, translated)
+            )
+        if proc.returncode:
+            raise subprocess.CalledProcessError(proc.returncode, cmd)
 
 
-def run_pipeline(args):
-    with TemporaryDirectory() as temp_dir, open(args.input_filename) as fin:
-        if not args.no_multiprocess:
-            alns = []
-            for rec in SeqIO.parse(fin, "fasta"):
-                alns.append(single_pipeline((rec, temp_dir)))
+@lru_cache(maxsize=None)
+def load_pyhmmer_models(hmm):
+    """the models in HMM file @hmm, read once per process with pyhmmer"""
+    from pyhmmer.plan7 import HMMFile
+
+    with HMMFile(hmm) as f:
+        return list(f)
+
+
+def iter_inprocess_alignments(reads, hmm, top_frames=FRAMES_PER_READ):
+    """
+    like iter_batch_alignments, but searching with pyhmmer, HMMER's Python bindings, rather
+    than running hmmsearch: the translations are searched in memory, and the alignments built
+    from the hits found rather than from hmmsearch's output
+    """
+    from pyhmmer.easel import DigitalSequenceBlock, TextSequence
+    from pyhmmer.plan7 import Pipeline
+
+    models = load_pyhmmer_models(str(hmm))
+    alphabet = models[0].alphabet
+    translated = trans6_batch(reads, None, top_frames)
+    with metrics.stage("search", len(reads)):
+        targets = DigitalSequenceBlock(
+            alphabet,
+            [
+                TextSequence(name=seq_id, sequence=seq).digitize(alphabet)
+                for seq_id, seq in translated.items()
+            ],
+        )
+        # as in iter_batch_alignments, E-values are for the search space of a single read
+        pipeline = Pipeline(alphabet, Z=FRAMES_PER_READ)
+        all_hits = [pipeline.search_hmm(model, targets) for model in models]
+    dna_seqs = dict(reads)
+    with metrics.stage("parse", len(reads)):
+        yield from HMMAln.iter_best(
+            aln
+            for hits in all_hits
+            for aln in HMMAln.iter_hit_alignments(hits, dna_seqs, translated)
+        )
+
+
+def batch_pipeline(t):
+    """
+    align a batch of reads, returning a list of alignments (or None), one per read
+    """
+    reads, hmm, parser, top_frames, engine = t
+    # with a cache, every read of a batch may have been looked up
+    if not reads:
+        return []
+    try:
+        if engine == "inprocess":
+            alns = dict(iter_inprocess_alignments(reads, hmm, top_frames))
         else:
-            reader = SeqIO.parse(fin, "fastq") if args.input_filename.lower().endswith(".fastq") else SeqIO.parse(fin, "fasta")
+            alns = dict(iter_batch_alignments(reads, hmm, parser, top_frames))
+    except Exception as e:
+        # stdout may be the output
+        print(
+            f"{type(e).__name__} aligning the batch starting with {reads[0][0]}",
+            file=sys.stderr,
+        )
+        raise
+    return [alns.get(read_id) for read_id, _ in reads]
+
+
+def iter_pipeline(
+    reads,
+    hmm,
+    batch_size=500,
+    jobs=1,
+    parser="text",
+    top_frames=FRAMES_PER_READ,
+    engine="subprocess",
+    cache=None,
+):
+    """
+    iterate over the best alignment (or None) for each of @reads, (read_id, dna) tuples, in
+    input order.  with @jobs > 1, batches of @batch_size reads are aligned in a pool of that
+    many worker processes, with at most IN_FLIGHT_PER_JOB batches per worker read ahead.
+    @engine "subprocess" runs hmmsearch on each batch, and "inprocess" searches with pyhmmer.
+    with an AlignmentCache @cache, each batch is looked up in it first, and only the reads
+    not cached are aligned
+    """
+    read_batches = batches(reads, batch_size)
+    if cache is not None:
+        read_batches = cache.lookup(read_batches)
+    tasks = ((batch, hmm, parser, top_frames, engine) for batch in read_batches)
+    if jobs <= 1:
+        batch_alns = map(batch_pipeline, tasks)
+    else:
+        batch_alns = pool_imap(batch_pipeline, tasks, jobs)
+    if cache is not None:
+        yield from cache.merge(batch_alns)
+        return
+    for alns in batch_alns:
+        yield from alns
 
-            with Pool(multiprocessing.cpu_count()) as p:
-                alns = p.map(
-                    single_pipeline,
-                    ((rec, temp_dir) for rec in reader)
-                )
 
-    df = algo.report(alns)
-    summ = algo.summary(df, alns)
-    freq = algo.full_seq_freq(df, alns)
+def pool_imap(func, tasks, jobs):
+    """
+    iterate over the results of @func over @tasks, in order, run in a pool of @jobs worker
+    processes with ordered_imap
+    """
+    # with metrics recorded, each worker's are sent back with its results
+    recorder = metrics.active()
+    if recorder is not None:
+        func = recorder.in_worker(func)
+    with Pool(jobs) as p:
+        for result in ordered_imap(p, func, tasks, jobs * IN_FLIGHT_PER_JOB):
+            if recorder is not None:
+                result, snapshot = result
+                recorder.merge(snapshot)
+            yield result
 
-    def dump_m(l, fout):
-        for t in l:
-            fout.write(",".join(map(str, t)))
-            fout.write("\n")
 
+def range_pipeline(t):
+    """
+    align the reads of a ReadRange, as iter_pipeline does in a single process, returning
+    (read_ids, alns, n_unique), where alns holds the alignment (or None) of each read
+    """
+    read_range, hmm, batch_size, parser, top_frames, engine, dedup = t
+    read_ids, deduped = [], None
+    reads = metrics.timed_iter("read", iter_range(read_range))
+    reads = tee_read_ids(reads, read_ids)
+    if dedup:
+        deduped = DedupReads(reads)
+        reads = deduped.unique()
+    alns = iter_pipeline(reads, hmm, batch_size, 1, parser, top_frames, engine)
+    if deduped:
+        alns = deduped.fan_out(alns)
+    alns = list(alns)
+    return read_ids, alns, deduped.n_unique if deduped else len(alns)
+
+
+class RangeReads:
+    """
+    align the reads of @ranges, ReadRanges, with each read by a worker process running
+    range_pipeline.  alignments() yields the alignment (or None) of each read in turn, and
+    appends its ID to the deque @read_ids, if given.  n_reads and n_unique count the reads
+    and the unique sequences aligned, as DedupReads does, though reads are only collapsed
+    within a range
+    """
+
+    def __init__(self, ranges, read_ids=None):
+        self.ranges = ranges
+        self.read_ids = read_ids
+        self.n_reads = self.n_unique = 0
+
+    def alignments(self, hmm, batch_size, jobs, parser, top_frames, engine, dedup):
+        tasks = (
+            (r, hmm, batch_size, parser, top_frames, engine, dedup) for r in self.ranges
+        )
+        for read_ids, alns, n_unique in pool_imap(range_pipeline, tasks, jobs):
+            self.n_reads += len(alns)
+            self.n_unique += n_unique
+            if self.read_ids is not None:
+                self.read_ids.extend(read_ids)
+            yield from alns
+
+
+def report_chunk(chunk, layout, reads_out, run, chain_ctr, chunk_ids=None):
+    """
+    build the reads report of a chunk of alignments (or None), writing it with @reads_out and
+    counting it in RunCounts @run and, with models of more than one chain, Counter
+    @chain_ctr.  @chunk_ids are the IDs of the reads, for per-sample counts.  returns the
+    alignments
+    """
+    aligned = [aln for aln in chunk if aln is not None]
+    with metrics.stage("report", len(chunk)):
+        table = algo.ReportTable.from_alignments(aligned, layout)
+        if len(layout.chains) > 1:
+            chain_ctr.update(table["chain"])
+    with metrics.stage("write_reads", len(chunk)):
+        reads_out.write(table)
+    with metrics.stage("count", len(chunk)):
+        run.add_chunk(chunk, table, chunk_ids)
+    return aligned
+
+
+def align_chunks(checkpoint, args, layout, jobs):
+    """
+    align the chunks of the input that Checkpoint @checkpoint doesn't have yet, as
+    range_pipeline does, saving each to it as it's finished
+    """
+    pending = checkpoint.pending()
+    tasks = (
+        (
+            r,
+            args.hmm,
+            args.batch_size,
+            args.parser,
+            args.frames,
+            args.engine,
+            not args.no_dedup,
+        )
+        for _, r in pending
+    )
+    if jobs > 1:
+        results = pool_imap(range_pipeline, tasks, jobs)
+    else:
+        results = map(range_pipeline, tasks)
+    for (i, _), (read_ids, alns, n_unique) in zip(pending, results):
+        run, chain_ctr = RunCounts(args.sample), Counter()
+        with checkpoint.open_reads(i, layout) as reads_out:
+            for chunk, chunk_ids in zip(
+                batches(alns, args.batch_size), batches(read_ids, args.batch_size)
+            ):
+                report_chunk(chunk, layout, reads_out, run, chain_ctr, chunk_ids)
+        checkpoint.save(i, run, n_unique, chain_ctr)
+
+
+def dump_m(l, fout):
+    for t in l:
+        fout.write(",".join(map(str, t)))
+        fout.write("\n")
+
+
+def write_summary(counts, fout, cluster_dist=None):
+    """
+    write the summary of CloneCounts @counts, as in foo_summ.csv.  given @cluster_dist, clones
+    are clustered by CDR3 with cluster_clones: each clone's row gets its cluster's ID, and
+    the clusters follow
+    """
+    freq = counts.full_seq_freq()
+    clusters = []
+    if cluster_dist is not None:
+        from .cluster import cluster_clones
+
+        cdr3_cluster, clusters = cluster_clones(counts, cluster_dist)
+        # the rows after chao1, the singletons and a blank line are clones
+        freq[3:] = [row + (cdr3_cluster[row[1]],) for row in freq[3:]]
+    dump_m(counts.summary(), fout)
+    fout.write("\n")
+    dump_m(freq, fout)
+    if clusters:
+        fout.write("\n")
+        dump_m(clusters, fout)
+
+
+def write_summary_files(counts, output_base, cluster_dist=None, fmt="csv"):
+    """
+    write the summary of CloneCounts @counts to foo_summ.csv or, with @fmt "parquet" or
+    "arrow", as the tables of output.summary_tables
+    """
+    if fmt == "csv":
+        with open(output_base + "_summ.csv", "w") as fout:
+            write_summary(counts, fout, cluster_dist)
+    else:
+        output.write_summary_tables(counts, output_base, fmt, cluster_dist)
+
+
+def write_sample_summaries(run, output_base, cluster_dist=None, fmt="csv"):
+    """write a summary for each sample of RunCounts @run, to foo_{sample}_summ.csv"""
+    for sample, counts in run.samples.items():
+        write_summary_files(
+            counts, f"{output_base}_{sample or 'unassigned'}", cluster_dist, fmt
+        )
+
+
+def tee_read_ids(reads, read_ids):
+    """pass on @reads, (read_id, dna) tuples, appending each ID to the deque @read_ids"""
+    for read in reads:
+        read_ids.append(read[0])
+        yield read
+
+
+def run_pipeline(args):
     # default output_base to be the same as input_filename
     # eg: with input_filename "foo.fa" and no output_base specified, outputs "foo.fa_reads.csv"
     # and "foo.fa_summ.csv" are produced
     output_base = args.output_base
     if args.output_base is None:
         output_base = args.input_filename
+    if args.sample and output_base == "-":
+        sys.exit("--sample needs an --output_base for the per-sample summaries")
+    if args.max_clones and args.counts:
+        sys.exit("--counts can't be saved with --max-clones")
+    if args.max_clones and args.cluster is not None:
+        # only the CDR3s of the clones kept would be clustered
+        sys.exit("--cluster can't be used with --max-clones")
+    if args.resume and not args.work_dir:
+        sys.exit("--resume needs a --work-dir")
+    if args.work_dir:
+        for given, option in (
+            (args.padded, "--padded"),
+            (args.cache, "--cache"),
+            (args.max_clones, "--max-clones"),
+        ):
+            if given:
+                sys.exit(f"{option} can't be used with --work-dir")
+        # chunks are aligned independently, so duplicates can only be collapsed within each
+        if not (args.no_dedup or args.per_range_dedup):
+            sys.exit("--work-dir needs --per-range-dedup or --no-dedup")
+    fmt = args.output_format
+    if fmt != "csv":
+        if output_base == "-":
+            sys.exit(f"--output-format {fmt} needs an --output_base")
+        try:
+            output.check_pyarrow()
+        except ImportError as e:
+            sys.exit(str(e))
+    # the report has the domains of each chain the models of --hmm annotate
+    try:
+        layout = algo.ReportLayout(
+            model_info(args.hmm, args.models), liabilities=args.liabilities
+        )
+    except ModelTableError as e:
+        sys.exit(str(e))
+    jobs = 1 if args.no_multiprocess else args.jobs
+    checkpoint = None
+    # the modules of optional stages are imported as they're needed, as worker processes
+    # forked later inherit whatever has been
+    if args.work_dir:
+        from .cache import model_key
+        from .checkpoint import Checkpoint, CheckpointError
 
-    if output_base == "-":
-        # write everything to stdout
-        dump_m(summ, sys.stdout)
-        sys.stdout.write("\n")
-        dump_m(freq, sys.stdout)
-        sys.stdout.write("\n")
-        df.to_csv(sys.stdout, index=False)
-
-    else: 
-        with open(output_base + "_reads.csv", "w") as fout:
-            df.to_csv(fout, index=False)
-        with open(output_base + "_summ.csv", "w") as fout:
-            dump_m(summ, fout)
-            fout.write("\n")
-            dump_m(freq, fout)
+        # the options that change the output, which a resumed run must share
+        settings = {
+            "hmm": model_key(args.hmm, args.frames),
+            "models": os.path.abspath(args.models),
+            "sample": args.sample,
+            "columns": layout.columns,
+        }
+        try:
+            checkpoint = Checkpoint(
+                args.work_dir,
+                args.input_filename,
+                settings,
+                n_ranges(args.input_filename, jobs),
+                args.resume,
+            )
+        except CheckpointError as e:
+            sys.exit(str(e))
+        if checkpoint.done:
+            print(
+                f"resuming: {len(checkpoint.done)} of {len(checkpoint.ranges)} chunks "
+                "done",
+                file=sys.stderr,
+            )
+
+    start = time.perf_counter()
+    recorder = None
+    if args.metrics or args.profile:
+        recorder = metrics.enable(profile=args.profile is not None)
+    new_counts = algo.CloneCounts
+    if args.max_clones:
+        from .sketch import ApproxCloneCounts
+
+        new_counts = partial(ApproxCloneCounts, args.max_clones)
+    run = RunCounts(args.sample, new_counts)
+    counts = run.counts
+    # with --sample, the IDs of reads that are in flight, to find the sample of failed reads
+    read_ids = deque()
+    # padding depends on every alignment, so padded rows are written in a second pass
+    padded = algo.PaddedAlignments(TemporaryFile(), layout) if args.padded else None
+    # the reads aligned to each chain, with models of more than one
+    chain_ctr = Counter()
+    # reads are written out as they're aligned, and only the counts behind the summary are kept
+    # in memory.  on stdout the summary comes first, so spool the reads to a temporary file
+    if fmt != "csv":
+        reads_out = output.ColumnarReportWriter(
+            f"{output_base}_reads.{fmt}", fmt, layout
+        )
+    elif output_base == "-":
+        reads_out = output.CSVReportWriter(TemporaryFile("w+"), layout)
+    else:
+        reads_out = output.CSVReportWriter(
+            open(output_base + "_reads.csv", "w"), layout
+        )
+    with reads_out:
+        cache = nullcontext()
+        if args.cache:
+            from .cache import DEFAULT_MAX_ENTRIES, AlignmentCache
+
+            cache = AlignmentCache(
+                args.cache,
+                args.hmm,
+                args.frames,
+                args.engine,
+                args.parser,
+                max_entries=(
+                    DEFAULT_MAX_ENTRIES if args.cache_size is None else args.cache_size
+                ),
+            )
+        # with several workers, each can read its own part of the input, if it can be split,
+        # unless reads are looked up in the cache, which only the main process holds.  reads
+        # are then only collapsed within each part, so that's left to --per-range-dedup
+        ranges = None
+        if not args.cache and (args.no_dedup or args.per_range_dedup):
+            ranges = input_ranges(args.input_filename, jobs)
+        fin = nullcontext() if ranges or checkpoint else open_reads(args.input_filename)
+        with fin, cache:
+            if checkpoint:
+                # the output is written from the chunks saved, once they're all done
+                align_chunks(checkpoint, args, layout, jobs)
+                with metrics.stage("write_reads", checkpoint.n_reads):
+                    checkpoint.copy_reads(reads_out, layout, args.batch_size)
+                with metrics.stage("count"):
+                    checkpoint.counts(run)
+                chain_ctr.update(checkpoint.chains())
+                dedup, alns = checkpoint, ()
+            elif ranges:
+                dedup = RangeReads(ranges, read_ids if args.sample else None)
+                alns = dedup.alignments(
+                    args.hmm,
+                    args.batch_size,
+                    jobs,
+                    args.parser,
+                    args.frames,
+                    args.engine,
+                    not args.no_dedup,
+                )
+            else:
+                reads = metrics.timed_iter("read", iter_reads(fin))
+                if args.sample:
+                    reads = tee_read_ids(reads, read_ids)
+                if not args.no_dedup:
+                    dedup = DedupReads(reads)
+                    reads = dedup.unique()
+                alns = iter_pipeline(
+                    reads,
+                    args.hmm,
+                    args.batch_size,
+                    jobs,
+                    args.parser,
+                    args.frames,
+                    args.engine,
+                    cache if args.cache else None,
+                )
+                if not args.no_dedup:
+                    alns = dedup.fan_out(alns)
+            for chunk in batches(alns, args.batch_size):
+                chunk_ids = [read_ids.popleft() for _ in chunk] if args.sample else None
+                aligned = report_chunk(
+                    chunk, layout, reads_out, run, chain_ctr, chunk_ids
+                )
+                if padded:
+                    with metrics.stage("pad", len(chunk)):
+                        padded.add(aligned)
+
+        elapsed = time.perf_counter() - start
+        print(
+            f"aligned {counts.total} reads in {elapsed:.1f}s "
+            f"({counts.total / elapsed:.1f} reads/s)",
+            file=sys.stderr,
+        )
+        if chain_ctr:
+            print(
+                "reads by chain: "
+                + ", ".join(f"{chain} {chain_ctr[chain]}" for chain in layout.chains),
+                file=sys.stderr,
+            )
+        if not args.no_dedup:
+            print(
+                f"aligned {dedup.n_unique} unique sequences "
+                f"({dedup.n_reads - dedup.n_unique} duplicate reads)",
+                file=sys.stderr,
+            )
+        if args.cache:
+            print(
+                f"cache: {cache.hits} hits, {cache.misses} misses",
+                file=sys.stderr,
+            )
+        if args.frames < FRAMES_PER_READ:
+            # only the sequences aligned are translated: the unique ones not in the cache
+            if args.cache:
+                translated = cache.misses
+            elif not args.no_dedup:
+                translated = dedup.n_unique
+            else:
+                translated = counts.total
+            pruned = translated * (FRAMES_PER_READ - args.frames)
+            print(
+                f"prefilter: pruned {pruned} of {translated * FRAMES_PER_READ} frames "
+                f"of {translated} sequences translated",
+                file=sys.stderr,
+            )
+
+        if args.counts:
+            run.dump(args.counts)
+
+        if output_base == "-":
+            # write everything to stdout
+            with metrics.stage("summary"):
+                write_summary(counts, sys.stdout, args.cluster)
+            sys.stdout.write("\n")
+            reads_out.fout.seek(0)
+            shutil.copyfileobj(reads_out.fout, sys.stdout)
+
+        else: 
+            with metrics.stage("summary"):
+                write_summary_files(counts, output_base, args.cluster, fmt)
+                write_sample_summaries(run, output_base, args.cluster, fmt)
+
+    if padded:
+        with padded.spill, metrics.stage("write_padded", counts.aligned):
+            if output_base == "-":
+                sys.stdout.write("\n")
+                write_padded(padded, sys.stdout, args.batch_size)
+            elif fmt != "csv":
+                path = f"{output_base}_padded.{fmt}"
+                output.write_padded(padded, path, fmt, args.batch_size)
+            else:
+                with open(output_base + "_padded.csv", "w") as fout:
+                    write_padded(padded, fout, args.batch_size)
+
+    if checkpoint:
+        checkpoint.remove()
+
+    if recorder is not None:
+        metrics.disable()
+        if args.profile:
+            recorder.dump_profiles(args.profile)
+        if args.metrics:
+            elapsed = time.perf_counter() - start
+            report = recorder.report(
+                reads=counts.total,
+                unique=None if args.no_dedup else dedup.n_unique,
+                wall_s=round(elapsed, 6),
+                reads_per_s=round(counts.total / elapsed, 1),
+                jobs=jobs,
+                batch_size=args.batch_size,
+                engine=args.engine,
+                output_format=fmt,
+            )
+            with open(args.metrics, "w") as fout:
+                json.dump(report, fout, indent=2)
+                fout.write("\n")
+
+
+def write_padded(padded, fout, batch_size):
+    writer = csv.writer(fout, lineterminator="\n")
+    writer.writerow(padded.columns())
+    writer.writerows(padded.rows(batch_size))
+
+
+def run_merge(args):
+    run = RunCounts.load(args.counts_files[0])
+    for path in args.counts_files[1:]:
+        run.merge(RunCounts.load(path))
+    if args.counts:
+        run.dump(args.counts)
+    if args.output_base == "-":
+        if args.output_format != "csv":
+            sys.exit(f"--output-format {args.output_format} needs an --output_base")
+        write_summary(run.counts, sys.stdout, args.cluster)
+    else:
+        write_summary_files(
+            run.counts, args.output_base, args.cluster, args.output_format
+        )
+        write_sample_summaries(run, args.output_base, args.cluster, args.output_format)
+
+
+def add_output_format_argument(subparser):
+    subparser.add_argument(
+        "--output-format",
+        choices=output.FORMATS,
+        default="csv",
+        help="write CSV, or typed tables as Parquet or Arrow IPC (Feather) files, with "
+        "the summary split into foo_summ, foo_clones and foo_clusters; needs pyarrow",
+    )
+
+
+def int_at_least(minimum):
+    """an argparse type for integers of at least @minimum"""
+
+    def parse(value):
+        try:
+            n = int(value)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"invalid int value: {value!r}")
+        if n < minimum:
+            raise argparse.ArgumentTypeError(f"must be at least {minimum}")
+        return n
+
+    return parse
+
+
+def add_cluster_argument(subparser):
+    subparser.add_argument(
+        "--cluster",
+        type=int_at_least(0),
+        metavar="D",
+        help="also cluster clones whose CDR3s have the same length and differ at up to D "
+        "positions, adding cluster IDs and frequencies to the summary",
+    )
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.set_defaults(func=lambda _: parser.print_help())
     parser.add_argument(
-        "-T", "--no-multiprocess", action="store_false", help="disable multiprocessing"
+        "-T", "--no-multiprocess", action="store_true", help="disable multiprocessing"
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=multiprocessing.cpu_count(),
+        help="number of worker processes (default: number of CPUs); 1 disables "
+        "multiprocessing, like -T",
     )
 
     subparsers = parser.add_subparsers()
@@ -116,19 +826,170 @@ if __name__ == "__main__":
         "trans6",
         help="helper function: translate DNA Fasta file to 6 protein sequences",
     )
-    trans_args.add_argument("filename")
+    trans_args.add_argument(
+        "filename",
+        help="FASTA or FASTQ file, plain or compressed with gzip, bgzip or zstd",
+    )
     trans_args.set_defaults(func=run_trans6)
 
     aln_args = subparsers.add_parser(
         "aln", help="translate DNA and align resulting protein sequences to HMM"
     )
-    aln_args.add_argument("input_filename")
+    aln_args.add_argument(
+        "input_filename",
+        help="reads, as FASTA or FASTQ, plain or compressed with gzip, bgzip or zstd; "
+        "with several jobs, workers read their own parts of plain and bgzip files",
+    )
     aln_args.add_argument(
         "--output_base",
         help="root of output filename; given foo, we create foo_cdr3.csv and foo.csv",
     )
-    aln_args.add_argument("--hmm", default=DEFAULT_HMM)
+    aln_args.add_argument(
+        "--hmm",
+        default=DEFAULT_HMM,
+        help="HMM file, of one or more models, eg for heavy and light chains; each read is "
+        "annotated with the model it aligns to best",
+    )
+    aln_args.add_argument(
+        "--models",
+        default=DEFAULT_MODEL_TABLE,
+        metavar="PATH",
+        help="table of the chain and domains of each model of --hmm "
+        "(default: data/models.tsv)",
+    )
+    aln_args.add_argument(
+        "--batch-size",
+        type=int,
+        default=500,
+        help="number of reads aligned per hmmsearch run; 1 aligns each read separately",
+    )
+    aln_args.add_argument(
+        "--metrics",
+        metavar="PATH",
+        help="write the wall and CPU time spent in each stage of the run, and the reads "
+        "through it, summed over worker processes, to PATH as JSON",
+    )
+    aln_args.add_argument(
+        "--profile",
+        metavar="DIR",
+        help="profile each stage of the run with cProfile, over all worker processes, "
+        "writing DIR/{stage}.prof",
+    )
+    aln_args.add_argument(
+        "--engine",
+        choices=("subprocess", "inprocess"),
+        default="subprocess",
+        help="run hmmsearch on each batch of reads, or search in process with pyhmmer "
+        "(HMMER's Python bindings), loading the HMM once per worker",
+    )
+    aln_args.add_argument(
+        "--parser",
+        choices=("text", "tabular"),
+        default="text",
+        help="parse hmmsearch's text report, or its --domtblout and -A output",
+    )
+    aln_args.add_argument(
+        "--frames",
+        type=int,
+        choices=range(1, FRAMES_PER_READ + 1),
+        default=FRAMES_PER_READ,
+        metavar="K",
+        help="align only the K most plausible reading frames of each read, ranked by "
+        "stop codons and conserved VH motifs (default: all 6)",
+    )
+    aln_args.add_argument(
+        "--no-dedup",
+        action="store_true",
+        help="align every read, rather than each distinct DNA sequence once",
+    )
+    aln_args.add_argument(
+        "--per-range-dedup",
+        action="store_true",
+        help="with -j > 1 and a plain or bgzip input, have each worker read its own ranges "
+        "of the input, collapsing duplicate reads only within a range: the input is read "
+        "in parallel, but a sequence repeated across ranges is aligned once in each",
+    )
+    aln_args.add_argument(
+        "--cache",
+        metavar="PATH",
+        help="SQLite file in which to keep alignments between runs, so that sequences "
+        "aligned before (with the same HMM and --frames) aren't aligned again",
+    )
+    aln_args.add_argument(
+        "--cache-size",
+        type=int,
+        metavar="N",
+        help="most sequences kept in the --cache; the least recently used are evicted "
+        "(default: a million)",
+    )
+    aln_args.add_argument(
+        "--padded",
+        action="store_true",
+        help="also write foo_padded.csv, with the domains of each aligned read padded so "
+        "that every HMM position falls in the same column",
+    )
+    aln_args.add_argument(
+        "--liabilities",
+        action="store_true",
+        help="flag developability liabilities (N-glycosylation, deamidation, "
+        "isomerization, unpaired cysteines, Met/Trp oxidation in CDRs) in a column of "
+        "the reads report, and count the reads with each in the summary",
+    )
+    aln_args.add_argument(
+        "--work-dir",
+        metavar="DIR",
+        help="checkpoint the run to DIR, saving the results of each chunk of the input as "
+        "it's finished, so that it can be resumed with --resume if it dies; the input must "
+        "be a plain or bgzip file.  chunks are aligned independently, so --per-range-dedup "
+        "(collapsing duplicate reads only within a chunk) or --no-dedup must be given",
+    )
+    aln_args.add_argument(
+        "--resume",
+        action="store_true",
+        help="resume the run checkpointed to --work-dir, aligning only the chunks it "
+        "hasn't finished",
+    )
+    aln_args.add_argument(
+        "--counts",
+        metavar="PATH",
+        help="also save the clone counts behind the summary to PATH, for the merge command",
+    )
+    aln_args.add_argument(
+        "--sample",
+        metavar="REGEX",
+        help="also summarize each sample separately, to foo_{sample}_summ.csv, taking the "
+        "sample of each read from its ID: the first group of REGEX, or the whole match",
+    )
+    aln_args.add_argument(
+        "--max-clones",
+        # the estimates need a sample of at least 3 sequences
+        type=int_at_least(3),
+        metavar="N",
+        help="count clones in bounded memory: list only the N most frequent, and estimate "
+        "chao1 and the number of singletons from a sample of N unique sequences, with "
+        "error bounds in an extra column",
+    )
+    add_cluster_argument(aln_args)
+    add_output_format_argument(aln_args)
     aln_args.set_defaults(func=run_pipeline)
 
+    merge_args = subparsers.add_parser(
+        "merge",
+        help="combine the --counts of runs over consecutive parts of a library into the "
+        "summary of a single run over all of it",
+    )
+    merge_args.add_argument("counts_files", nargs="+", metavar="COUNTS")
+    merge_args.add_argument(
+        "--output_base",
+        default="-",
+        help="root of output filename; given foo, we create foo_summ.csv (default: stdout)",
+    )
+    merge_args.add_argument(
+        "--counts", metavar="PATH", help="also save the merged counts to PATH"
+    )
+    add_cluster_argument(merge_args)
+    add_output_format_argument(merge_args)
+    merge_args.set_defaults(func=run_merge)
+
     args = parser.parse_args()
     args.func(args)
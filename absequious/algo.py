@@ -1,11 +1,15 @@
-from collections import Counter, OrderedDict
-from itertools import zip_longest
-from skbio.diversity import alpha
-import pandas as pd
-
-from . import AlnState, Unreachable
-
-# length of each domain in reference space
+from bisect import bisect_left
+from collections import Counter
+from functools import lru_cache
+from itertools import compress
+from typing import NamedTuple
+import numpy as np
+
+from . import AlnState, liability
+from .chains import ModelInfo
+
+# the domains of the heavy-chain model of data/ighv.hmm, and their lengths in reference space,
+# as in data/models.tsv.  these and HMM_LEN annotate alignments when no models are given
 DOMAIN_LENS = (
     ("H-FR1", 25),
     ("H-CDR1", 8),
@@ -16,170 +20,807 @@ DOMAIN_LENS = (
     ("H-FR4", 11),
 )
 
-# FIXME: grab this from hmmsearch output
 HMM_LEN = 122
+IGHV = ModelInfo("ighv", "H", HMM_LEN, DOMAIN_LENS)
 
+_INSERT = AlnState.insert.value
+_DELETE = AlnState.delete.value
+_MATCHES = (AlnState.match_high.value, AlnState.match_low.value)
+_MISMATCH = AlnState.mismatch.value
 
-def _update_ins_ct(ins_cts, aln_states, pos):
-    last_pos = pos
-    ct = 0
-    for _, state in aln_states:
-        if state == AlnState.insert:
-            ct += 1
-        else:
-            if ct:
-                ins_cts[last_pos] = max(ins_cts[last_pos], ct)
-                ct = 0
-            last_pos += 1
-    if ct:
-        ins_cts[last_pos] = max(ins_cts[last_pos], ct)
+
+def _ref_positions(alns, hmm_len):
+    """
+    return (states, offsets, keys, inserts) for the concatenated states of @alns: alignment i
+    is states[offsets[i]:offsets[i + 1]], keys is the HMM position of each state (for
+    insertions, of the position they precede), and inserts is true for insertions.  anything
+    past position @hmm_len is treated as an insertion before hmm_len + 1
+    """
+    n = len(alns)
+    lens = np.fromiter((len(aln.states) for aln in alns), dtype=np.int64, count=n)
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(lens, out=offsets[1:])
+    states = np.frombuffer(b"".join(aln.states for aln in alns), dtype=np.uint8)
+    ref_ct = np.zeros(len(states) + 1, dtype=np.int64)
+    np.cumsum(states != _INSERT, out=ref_ct[1:])
+    ref_before = ref_ct[:-1] - np.repeat(ref_ct[offsets[:-1]], lens)
+    hmm_from = np.fromiter(
+        (aln.best_match.hmm_from for aln in alns), dtype=np.int64, count=n
+    )
+    pos = np.repeat(hmm_from, lens) + ref_before
+    inserts = (states == _INSERT) | (pos > hmm_len)
+    return states, offsets, np.minimum(pos, hmm_len + 1), inserts
 
 
-def _insert_padding(ctr, alignments):
+def update_padding(padding, alns):
     """
-    given a list of alignments, find the maximum number of insertions at each position
+    update @padding, as returned by insert_padding, with the insertions in HMMAln @alns
     """
-    for aln in alignments:
-        _update_ins_ct(ctr, aln.annots, aln.best_match["hmm_from"])
-    return ctr
+    if not alns:
+        return padding
+    states, offsets, keys, inserts = _ref_positions(alns, len(padding) - 2)
+    # each run of insertions is keyed by the reference position it precedes
+    runs = np.repeat(np.arange(len(alns)), np.diff(offsets)) * len(padding) + keys
+    runs, counts = np.unique(runs[inserts], return_counts=True)
+    np.maximum.at(padding, runs % len(padding), counts)
+    return padding
 
 
-def insert_padding(alignments):
-    return _insert_padding(Counter(), alignments)
+def insert_padding(alignments, hmm_len=HMM_LEN):
+    """
+    given a list of alignments, find the maximum number of insertions before each HMM
+    position.  returns an array indexed by position, from 1 to hmm_len + 1 (for insertions
+    after the last position)
+    """
+    return update_padding(np.zeros(hmm_len + 2, dtype=np.int64), alignments)
 
 
-def split_and_pad(padding_ctr, aln, DOMS=DOMAIN_LENS):
+def _pad_batch(padding, alns, domain_lens):
     """
-    given @padding_ctr and HMMAln @aln, split the aligned sequence at domain boundaries and
-    insert padding
+    lay out HMMAln @alns (or anything with residues, states and best_match.hmm_from) in the
+    columns given by @padding, splitting them into domains by HMM position.  returns a list
+    of columns, as segment_batch does, with one for the residues after the last domain
+    """
+    hmm_len = len(padding) - 2
+    # column of each HMM position, after the insertions before it; hmm_len + 1 is the end
+    pos_cols = np.arange(-1, hmm_len + 1) + np.cumsum(padding)
+    pos_cols[0] = 0
+    width = pos_cols[hmm_len + 1]
+    template = np.full(width, ord("."), dtype=np.uint8)
+    template[pos_cols[1 : hmm_len + 1]] = ord("-")
+
+    grid = np.tile(template, (len(alns), 1))
+    if alns:
+        states, offsets, keys, inserts = _ref_positions(alns, hmm_len)
+        residues = np.frombuffer(b"".join(aln.residues for aln in alns), np.uint8)
+        rendered = _render(residues, states)
+        idx = np.arange(len(states))
+        # insertions are left-aligned in their run's columns
+        last_ref = np.maximum.accumulate(
+            np.where(inserts, np.repeat(offsets[:-1] - 1, np.diff(offsets)), idx)
+        )
+        run_pos = idx - last_ref - 1
+        if np.any(inserts & (run_pos >= padding[keys])):
+            raise ValueError("padding doesn't cover all of the insertions")
+        cols = np.where(
+            inserts, pos_cols[keys] - padding[keys] + run_pos, pos_cols[keys]
+        )
+        rows = np.repeat(np.arange(len(alns)), np.diff(offsets))
+        grid[rows, cols] = rendered
+
+    # each domain starts with the insertions before its first position
+    dom_starts = [1] + list(_domain_ends(tuple(domain_lens)))
+    bounds = [
+        pos_cols[min(pos, hmm_len + 1)] - padding[min(pos, hmm_len + 1)]
+        for pos in dom_starts
+    ] + [width]
+    text = grid.tobytes().decode("ascii")
+    return [
+        [text[row + start : row + end] for row in range(0, len(text), width)]
+        for start, end in zip(bounds, bounds[1:])
+    ]
+
+
+# byte translation tables for rendering aligned residues
+_UPPER = np.frombuffer(bytes(range(256)).upper(), dtype=np.uint8)
+_LOWER = np.frombuffer(bytes(range(256)).lower(), dtype=np.uint8)
+# how the residue in each state is rendered, by state value
+_RENDER = {
+    AlnState.match_high.value: str.upper,
+    AlnState.match_low.value: str.upper,
+    AlnState.mismatch.value: str.lower,
+    AlnState.insert.value: str,
+    AlnState.delete.value: lambda _: "-",
+}
+
+
+@lru_cache(maxsize=None)
+def _domain_ends(domain_lens):
+    return np.cumsum([dom_len for _, dom_len in domain_lens], dtype=np.int64)
+
+
+def _render(residues, states):
+    """render residues by state: matches upper case, mismatches lower case, deletions "-" """
+    rendered = residues.copy()
+    matches = np.isin(states, _MATCHES)
+    rendered[matches] = _UPPER[residues[matches]]
+    mismatches = states == _MISMATCH
+    rendered[mismatches] = _LOWER[residues[mismatches]]
+    rendered[states == _DELETE] = ord("-")
+    return rendered
+
+
+def _segment(alns, domain_lens):
+    """
+    find the domain boundaries of each of @alns in one pass over all of them.
+
+    domain k of an alignment ends at the residue matching reference position sum(domain_lens[:k
+    + 1]), counted from hmm_from; as in hmmsearch's coordinates, hmm_from itself is one past the
+    first residue.  domains that end before hmm_from are empty, and the first domain that
+    doesn't always keeps at least one residue.  anything after the last domain is a final
+    domain, named "".
+
+    returns (text, offsets, starts, ends, first, n_done): text holds the rendered residues of
+    all alignments (matches upper case, mismatches lower case, deletions "-"), and alignment i
+    is text[offsets[i]:offsets[i + 1]].  domain k of alignment i is
+    text[offsets[i] + starts[i, k]:offsets[i] + ends[i, k]], for k up to len(domain_lens)
+    inclusive.  first[i] is the index of the first domain not stripped by hmm_from, and
+    n_done[i] the number of domains from there on that the alignment covers completely
     """
+    n, n_doms = len(alns), len(domain_lens)
+    lens = np.fromiter((len(aln.states) for aln in alns), dtype=np.int64, count=n)
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(lens, out=offsets[1:])
+    states = np.frombuffer(b"".join(aln.states for aln in alns), dtype=np.uint8)
+    residues = np.frombuffer(b"".join(aln.residues for aln in alns), dtype=np.uint8)
+
+    rendered = _render(residues, states)
+
+    # cumulative count of reference positions, ie non-insert states
+    ref_ct = np.zeros(len(states) + 1, dtype=np.int64)
+    np.cumsum(states != _INSERT, out=ref_ct[1:])
+    base = ref_ct[offsets[:-1]]
+    total = ref_ct[offsets[1:]] - base
+
+    dom_ends = _domain_ends(tuple(domain_lens))
+    hmm_from = np.fromiter(
+        (aln.best_match.hmm_from for aln in alns), dtype=np.int64, count=n
+    )
+    first = np.searchsorted(dom_ends, hmm_from)
+    # reference positions each domain needs, counted from the start of the alignment
+    needed = dom_ends[None, :] - hmm_from[:, None]
+    needed += (dom_ends[np.minimum(first, n_doms - 1)] == hmm_from)[:, None]
+    stripped = np.arange(n_doms)[None, :] < first[:, None]
+    done = (needed <= total[:, None]) & ~stripped
+
+    ends = np.empty((n, n_doms + 1), dtype=np.int64)
+    ends[:, :n_doms] = (
+        np.searchsorted(ref_ct, base[:, None] + needed) - offsets[:-1, None]
+    )
+    ends[:, :n_doms][~done] = np.broadcast_to(lens[:, None], (n, n_doms))[~done]
+    ends[:, :n_doms][stripped] = 0
+    ends[:, n_doms] = lens
+    starts = np.zeros_like(ends)
+    starts[:, 1:] = ends[:, :-1]
 
-    def split(domain_lens, strip_start, annots, start_pos, acc):
-        if domain_lens:
-            dom_name, dom_len = domain_lens[0]
+    text = rendered.tobytes().decode("ascii")
+    return text, offsets, starts, ends, first, done.sum(axis=1)
+
+
+def _segment_one(aln, domain_lens):
+    """
+    _segment for a single alignment, without the overhead of numpy on small arrays.  returns
+    (text, starts, ends, first, n_done), where starts and ends index text
+    """
+    states, residues = aln.states, aln.residues.decode("ascii")
+    text = "".join([_RENDER[state](tgt) for tgt, state in zip(residues, states)])
+    ref_pos = [pos for pos, state in enumerate(states) if state != _INSERT]
+
+    dom_ends = _domain_ends(tuple(domain_lens)).tolist()
+    hmm_from = aln.best_match.hmm_from
+    first = bisect_left(dom_ends, hmm_from)
+    exact = first < len(dom_ends) and dom_ends[first] == hmm_from
+    ends, n_done = [0] * first, 0
+    for dom_end in dom_ends[first:]:
+        needed = dom_end - hmm_from + exact
+        if needed <= len(ref_pos):
+            ends.append(ref_pos[needed - 1] + 1)
+            n_done += 1
         else:
-            dom_name, dom_len = "", float("inf")
-        if strip_start:
-            if padding_ctr is not None:
-                for i in range(
-                    min(strip_start, dom_len if dom_len > 1 else strip_start)
-                ):
-                    acc.extend("-" for _ in range(padding_ctr.get(i, 1)))
-
-            if strip_start > dom_len:
-                return [(dom_name, "".join(acc))] + split(
-                    domain_lens[1:] if domain_lens else [],
-                    strip_start - dom_len,
-                    annots,
-                    0,
-                    [],
-                )
-            # else: dom_len > strip_start
-            dom_len -= strip_start
-
-        for pos in range(start_pos, len(annots)):
-            tgt, state = annots[pos]
-            if state is AlnState.insert:
-                acc.append(tgt)
-            elif state is AlnState.delete:
-                acc.append("-")
-            elif state in (AlnState.match_high, AlnState.match_low):
-                acc.append(tgt.upper())
-            elif state is AlnState.mismatch:
-                acc.append(tgt.lower())
-            else:
-                raise Unreachable()
+            ends.append(len(states))
+    ends.append(len(states))
+    return text, [0] + ends[:-1], ends, first, n_done
 
-            if padding_ctr is not None and padding_ctr.get(pos, 1) > 1:
-                acc.extend("-" for _ in range(padding_ctr[pos] - 1))
 
-            # handle domain labels
-            if state is not AlnState.insert:
-                dom_len -= 1
-                if dom_len < 1:
-                    return [(dom_name, "".join(acc))] + split(
-                        domain_lens[1:] if domain_lens else (), 0, annots, pos + 1, []
-                    )
-        return [(dom_name, "".join(acc))] if acc else []
+def segment_batch(alns, domain_lens=DOMAIN_LENS):
+    """
+    split the aligned sequences of HMMAln @alns at domain boundaries, as split_and_pad does
+    without padding, but for all of them at once.  returns (columns, n_domains), where
+    columns[k] lists domain k of each alignment ("" where it is missing), with one more
+    column for the residues after the last domain, and n_domains lists the number of domains
+    split_and_pad returns for each alignment
+    """
+    text, offsets, starts, ends, first, n_done = _segment(alns, domain_lens)
+    # domains stripped by hmm_from are present, but empty; the rest are present up to the
+    # first that isn't complete, which is present if it has any residues
+    last = first + n_done
+    n_domains = last + (starts[np.arange(len(alns)), last] < np.diff(offsets))
+    starts += offsets[:-1, None]
+    ends += offsets[:-1, None]
+    columns = [
+        [text[start:end] for start, end in zip(starts[:, k], ends[:, k])]
+        for k in range(len(domain_lens) + 1)
+    ]
+    return columns, n_domains.tolist()
 
-    return split(DOMS, aln.best_match["hmm_from"], aln.annots, 0, [])
+
+def split_and_pad(padding_ctr, aln, DOMS=DOMAIN_LENS):
+    """
+    given @padding_ctr and HMMAln @aln, split the aligned sequence at domain boundaries and
+    insert padding
+
+    with @padding_ctr None, domains are cut by counting reference positions from hmm_from, and
+    missing domains are left out.  otherwise @padding_ctr is as returned by insert_padding,
+    and every domain is laid out in the same columns for every alignment: positions the
+    alignment doesn't cover are "-", and unused insertion columns "."; the residues after the
+    last domain are only included if any alignment has some
+    """
+    names = [dom_name for dom_name, _ in DOMS] + [""]
+    if padding_ctr is not None:
+        columns = _pad_batch(padding_ctr, [aln], DOMS)
+        ret = [(dom_name, column[0]) for dom_name, column in zip(names, columns)]
+        return ret if ret[-1][1] else ret[:-1]
+
+    text, starts, ends, first, n_done = _segment_one(aln, DOMS)
+    # domains stripped by hmm_from are present, even if empty; the rest are present up to
+    # the first that isn't complete, which is present if it isn't empty
+    return [
+        (names[k], text[starts[k] : ends[k]])
+        for k in range(first + n_done + 1)
+        if k < first or starts[k] < ends[k]
+    ]
 
 
 def multi_aln(padding_ctr, alignments, DOMS=DOMAIN_LENS):
     return [split_and_pad(padding_ctr, aln, DOMS) for aln in alignments]
 
 
-def has_frameshift(aln):
+def has_frameshift(aln, hmm_len=HMM_LEN):
     """
-    heuristics for determining whether a frameshift is present.
+    heuristics for determining whether a frameshift is present, given the length @hmm_len
+    of the model aligned to.
 
     TODO: we should incorporate quality scores, if available
     """
-    if aln.best_match["hmm_from"] > 2 and aln.best_match["tgt_from"] > 2:
+    best_match = aln.best_match
+    if best_match.hmm_from > 2 and best_match.tgt_from > 2:
         return True
-    if (
-        aln.best_match["hmm_to"] < HMM_LEN - 1
-        and aln.best_match["tgt_to"] < aln.tgt_len - 1
-    ):
+    if best_match.hmm_to < hmm_len - 1 and best_match.tgt_to < aln.tgt_len - 1:
         return True
     return False
 
 
 def has_stop(aln):
-    return "*" in aln.tgt_seq[aln.best_match["tgt_from"] : aln.best_match["tgt_to"]]
+    return "*" in aln.tgt_seq[aln.best_match.tgt_from : aln.best_match.tgt_to]
+
 
+def _take(items, rows):
+    """the items of @items numbered @rows, or all of them if @rows is None"""
+    return items if rows is None else [items[i] for i in rows]
 
-def report(alignments):
-    padding_by_pos = None  # insert_padding([x for x in alignments if x is not None])
-    padded_alns = [
-        None if aln is None else split_and_pad(padding_by_pos, aln)
-        for aln in alignments
+
+def _put(column, rows, values):
+    """set the items of @column numbered @rows to @values in turn"""
+    for i, value in zip(rows, values):
+        column[i] = value
+
+
+class ReportLayout:
+    """
+    the columns of the reads report for alignments to @models, ModelInfo tuples: the read,
+    its DNA and protein, the domains of each chain in turn, the tail (residues aligned past
+    the last domain), then the complete?, frameshift? and stop? flags.  with models of more than one chain, a "chain" column precedes the
+    domains, and each read has only the domains of its own chain.  with @liabilities, a
+    final liabilities column lists those of each read's domains (see liability.py)
+    """
+
+    def __init__(self, models=(IGHV,), liabilities=False):
+        self.models = {model.name: model for model in models}
+        self.chains = list(dict.fromkeys(model.chain for model in models))
+        self.domains = list(
+            dict.fromkeys(name for model in models for name, _ in model.domain_lens)
+        )
+        head = ["read", "dna_in_frame", "protein"]
+        if len(self.chains) > 1:
+            head.append("chain")
+        self.columns = (
+            head + self.domains + ["tail", "complete?", "frameshift?", "stop?"]
+        )
+        self.liabilities = liabilities
+        if liabilities:
+            self.columns.append("liabilities")
+        self.domain_slice = slice(len(head), len(head) + len(self.domains))
+        # the name of each chain's CDR3 column, or None
+        self.cdr3 = {model.chain: model.cdr3 for model in models}
+        self._only = models[0] if len(models) == 1 else None
+
+    def model(self, aln):
+        """the ModelInfo of the model HMMAln @aln is to"""
+        return self._only or self.models[aln.model]
+
+    def groups(self, alns):
+        """
+        group HMMAln @alns by model, returning (ModelInfo, rows) for each model, where rows
+        numbers its alignments in @alns, or is None for all of them.  with a single model,
+        every alignment is taken to be to it
+        """
+        if self._only is not None:
+            return [(self._only, None)]
+        rows = {}
+        for i, aln in enumerate(alns):
+            rows.setdefault(aln.model, []).append(i)
+        return [(self.models[name], model_rows) for name, model_rows in rows.items()]
+
+
+DEFAULT_LAYOUT = ReportLayout()
+REPORT_COLUMNS = DEFAULT_LAYOUT.columns
+_DOMAINS = DEFAULT_LAYOUT.domain_slice
+_CDR3 = REPORT_COLUMNS.index("H-CDR3")
+
+
+def report_row(aln, padding_ctr=None):
+    """
+    return the row of the reads report for HMMAln @aln, as a list of values in the order of
+    REPORT_COLUMNS
+    """
+    padded_aln = split_and_pad(padding_ctr, aln)
+    row = [
+        aln.seq_id,
+        aln.dna_seq,
+        ("".join(s for _, s in padded_aln)).upper().replace("-", ""),
     ]
-    _df = OrderedDict(
-        (k, [])
-        for k in ["read", "dna_in_frame", "protein"]
-        + [nom for nom, _ in DOMAIN_LENS]
-        + ["complete?", "frameshift?", "stop?",]
-    )
-    for aln, padded_aln in zip(alignments, padded_alns):
-        if aln is not None:
-            _df["read"].append(aln.seq_id)
-            _df["dna_in_frame"].append(aln.dna_seq)
-            _df["protein"].append(
-                ("".join(s for _, s in padded_aln)).upper().replace("-", "")
+    # the domains, then the tail, if the alignment runs past the last domain
+    domains = [padded_seq.upper().replace("-", "") for _, padded_seq in padded_aln]
+    row += domains + [""] * (len(DOMAIN_LENS) + 1 - len(domains))
+    row += [len(padded_aln) == 7, has_frameshift(aln), has_stop(aln)]
+    return row
+
+
+def _clean(column):
+    """upper-case each of the strings in @column and remove gaps, in one pass"""
+    if not column:
+        return []
+    return "\n".join(column).upper().replace("-", "").split("\n")
+
+
+class ReportTable:
+    """
+    columnar store for the reads report, holding a list per column of @layout, a
+    ReportLayout, plus sequence: the domains joined, identifying each read's clone.
+    columns can be looked up by name, eg table["H-CDR3"]
+    """
+
+    def __init__(self, columns, layout=DEFAULT_LAYOUT):
+        self.columns = columns
+        self.layout = layout
+
+    @classmethod
+    def from_alignments(cls, alns, layout=DEFAULT_LAYOUT):
+        """
+        build the report for HMMAln @alns, splitting all of the alignments to each model
+        into domains at once
+        """
+        if not alns:
+            return cls.from_rows([], layout)
+        columns = {
+            "read": [aln.seq_id for aln in alns],
+            "dna_in_frame": [aln.dna_seq for aln in alns],
+        }
+        groups = layout.groups(alns)
+        if len(layout.chains) > 1:
+            columns["chain"] = [layout.model(aln).chain for aln in alns]
+        if groups[0][1] is not None:
+            # each column is filled in from the alignments to each model in turn
+            columns.update((name, [""] * len(alns)) for name in layout.domains)
+            columns["tail"] = [""] * len(alns)
+            columns["complete?"] = [False] * len(alns)
+            columns["frameshift?"] = [False] * len(alns)
+            if layout.liabilities:
+                columns["liabilities"] = [""] * len(alns)
+
+        for model, rows in groups:
+            group = _take(alns, rows)
+            domains, n_domains = segment_batch(group, model.domain_lens)
+            names = [name for name, _ in model.domain_lens] + ["tail"]
+            values = dict(zip(names, [_clean(column) for column in domains]))
+            n_doms = len(model.domain_lens)
+            values["complete?"] = [n == n_doms for n in n_domains]
+            values["frameshift?"] = [has_frameshift(aln, model.length) for aln in group]
+            if layout.liabilities:
+                values["liabilities"] = liability.annotate(
+                    [values[name] for name in names[:-1]], names[:-1]
+                )
+            if rows is None:
+                columns.update(values)
+            else:
+                for name, column in values.items():
+                    _put(columns[name], rows, column)
+
+        domains = [columns[name] for name in layout.domains]
+        columns["sequence"] = list(map("".join, zip(*domains)))
+        columns["protein"] = list(
+            map(str.__add__, columns["sequence"], columns["tail"])
+        )
+        columns["stop?"] = list(map(has_stop, alns))
+        return cls(columns, layout)
+
+    @classmethod
+    def from_rows(cls, rows, layout=DEFAULT_LAYOUT):
+        """build a table from rows in the order of @layout's columns, eg from report_row"""
+        columns = {name: [] for name in layout.columns}
+        for row in rows:
+            for name, value in zip(layout.columns, row):
+                columns[name].append(value)
+        return cls._with_sequence(columns, layout)
+
+    @classmethod
+    def from_frame(cls, df, layout=DEFAULT_LAYOUT):
+        """build a table from a pandas DataFrame of the reads report, eg from report"""
+        columns = {name: df[name].tolist() for name in layout.columns}
+        return cls._with_sequence(columns, layout)
+
+    @classmethod
+    def _with_sequence(cls, columns, layout):
+        domains = [_clean(columns[name]) for name in layout.domains]
+        columns["sequence"] = list(map("".join, zip(*domains)))
+        return cls(columns, layout)
+
+    def __len__(self):
+        return len(self.columns["read"])
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def cdr3s(self):
+        """the CDR3 of each read, from its chain's CDR3 column ("" if it has none)"""
+        if len(self.layout.chains) == 1:
+            (name,) = self.layout.cdr3.values()
+            return self[name] if name else [""] * len(self)
+        columns = {
+            chain: self[name] for chain, name in self.layout.cdr3.items() if name
+        }
+        return [
+            columns[chain][i] if chain in columns else ""
+            for i, chain in enumerate(self["chain"])
+        ]
+
+    def take(self, rows):
+        """return a table of just the rows numbered @rows"""
+        return ReportTable(
+            {name: [column[i] for i in rows] for name, column in self.columns.items()},
+            self.layout,
+        )
+
+    def rows(self):
+        """iterate over the rows of the report, as report_row returns them"""
+        for row in zip(*(self.columns[name] for name in self.layout.columns)):
+            yield list(row)
+
+    def to_pandas(self):
+        """return the report as a pandas DataFrame; pandas is only needed for this"""
+        import pandas as pd
+
+        return pd.DataFrame(
+            {name: self.columns[name] for name in self.layout.columns},
+            columns=self.layout.columns,
+        )
+
+
+def report_rows(alns, layout=DEFAULT_LAYOUT):
+    """
+    return the rows of the reads report for HMMAln @alns, as report_row does without padding,
+    splitting all of them into domains at once
+    """
+    return list(ReportTable.from_alignments(alns, layout).rows())
+
+
+def report(alignments, layout=DEFAULT_LAYOUT):
+    """return the reads report for @alignments, skipping None, as a pandas DataFrame"""
+    return ReportTable.from_alignments(
+        [aln for aln in alignments if aln is not None], layout
+    ).to_pandas()
+
+
+def chao1(n_observed, singletons, doubletons):
+    """
+    the bias-corrected chao1 richness estimate, as skbio.diversity.alpha.chao1 computes it
+    from a vector of counts, given the numbers of observed, singleton and doubleton clones
+    """
+    return n_observed + singletons * (singletons - 1) / (2 * (doubletons + 1))
+
+
+class CloneCounts:
+    """
+    the counts behind summary and full_seq_freq, accumulated one report row at a time so
+    that reads can be processed as a stream.  memory use depends only on the number of
+    unique sequences
+    """
+
+    def __init__(self):
+        self.failed = 0
+        self.aligned = 0
+        self.complete = 0
+        self.frameshift = 0
+        self.stop = 0
+        self.good_ctr, self.all_ctr, self.seq_to_cdr3 = Counter(), Counter(), {}
+        self.cdr3_ctr = Counter()
+        # the reads with each liability, once reports with liabilities are counted
+        self.liability_ctr = None
+
+    @classmethod
+    def from_report(cls, report, alns):
+        """
+        count @report, a ReportTable or a DataFrame as returned by report, given the
+        alignments @alns it was built from
+        """
+        if not isinstance(report, ReportTable):
+            report = ReportTable.from_frame(report)
+        counts = cls()
+        counts.add_table(report, failed=sum(1 for x in alns if x is None))
+        return counts
+
+    @property
+    def total(self):
+        return self.aligned + self.failed
+
+    def add_failed(self):
+        self.failed += 1
+
+    def add(self, row):
+        """count a row of the reads report, as returned by report_row"""
+        complete, frameshift, stop = row[-3:]
+        self.aligned += 1
+        self.complete += complete
+        self.frameshift += frameshift
+        self.stop += stop
+
+        seq = "".join(row[_DOMAINS]).replace("-", "").upper()
+        self.seq_to_cdr3[seq] = row[_CDR3].replace("-", "").upper()
+        self.all_ctr[seq] += 1
+        self.cdr3_ctr[row[_CDR3]] += 1
+        if complete and not frameshift:
+            self.good_ctr[seq] += 1
+
+    def add_table(self, table, failed=0):
+        """count all the rows of ReportTable @table, and @failed reads without alignments"""
+        good = self._add_totals(table, failed)
+        seqs, cdr3s = table["sequence"], table.cdr3s()
+        self.seq_to_cdr3.update(zip(seqs, _clean(cdr3s)))
+        self.all_ctr.update(seqs)
+        self.cdr3_ctr.update(cdr3s)
+        self.good_ctr.update(compress(seqs, good))
+
+    def _add_totals(self, table, failed):
+        """
+        count the failed/complete/frameshift/stop totals of @table, returning which of its
+        rows are complete and frameshift-free
+        """
+        complete = np.array(table["complete?"], dtype=bool)
+        frameshift = np.array(table["frameshift?"], dtype=bool)
+        self.failed += failed
+        self.aligned += len(table)
+        self.complete += int(complete.sum())
+        self.frameshift += int(frameshift.sum())
+        self.stop += sum(table["stop?"])
+        if table.layout.liabilities:
+            self._add_liabilities(liability.count(table["liabilities"]))
+        return complete & ~frameshift
+
+    def _add_liabilities(self, ctr):
+        if self.liability_ctr is None:
+            self.liability_ctr = Counter()
+        self.liability_ctr.update(ctr)
+
+    def merge(self, other):
+        """
+        add the counts of CloneCounts @other.  merging the counts of consecutive parts of the
+        input, in order, gives exactly the counts of the whole
+        """
+        self._merge_totals(other)
+        self.seq_to_cdr3.update(other.seq_to_cdr3)
+        self.all_ctr.update(other.all_ctr)
+        self.good_ctr.update(other.good_ctr)
+        self.cdr3_ctr.update(other.cdr3_ctr)
+        return self
+
+    def _merge_totals(self, other):
+        self.failed += other.failed
+        self.aligned += other.aligned
+        self.complete += other.complete
+        self.frameshift += other.frameshift
+        self.stop += other.stop
+        if other.liability_ctr is not None:
+            self._add_liabilities(other.liability_ctr)
+
+    def summary(self):
+        failed, tot = self.failed, self.total
+        rows = (
+            ("failed", "", failed / tot, failed, tot),
+            ("complete", "", self.complete / tot, self.complete, tot),
+            ("frameshift", "", self.frameshift / tot, self.frameshift, tot),
+            ("stop_codon", "", self.stop / tot, self.stop, tot),
+        )
+        if self.liability_ctr is not None:
+            ctr = self.liability_ctr
+            rows += tuple(
+                (f"liability_{name}", "", ctr[name] / tot, ctr[name], tot)
+                for name in liability.LIABILITIES
             )
-            for (dom_name, _), (_, padded_seq) in zip_longest(
-                DOMAIN_LENS, padded_aln, fillvalue=("", "")
-            ):
-                _df[dom_name].append(padded_seq.upper().replace("-", ""))
-            _df["complete?"].append(len(padded_aln) == 7)
-            _df["frameshift?"].append(has_frameshift(aln))
-            _df["stop?"].append(has_stop(aln))
+        return rows
+
+    def good_clones(self):
+        """(sequence, count) for the complete, frameshift-free clones, in the order first seen"""
+        return self.good_ctr.items()
+
+    def cdr3_freq(self):
+        tot = self.total
+        # most frequent first, ties in CDR3 order
+        cdr3_cts = sorted(self.cdr3_ctr.items())
+        cdr3_cts.sort(key=(lambda item: item[1]), reverse=True)
+        return [(cdr3, ct / tot, ct, tot) for cdr3, ct in cdr3_cts if ct > 1]
+
+    def full_seq_freq(self):
+        tot = self.total
+        # the frequencies of frequencies, eg freqs[1] is the number of singletons
+        freqs = Counter(self.all_ctr.values())
+        singletons, ret = 0, []
+        for seq, ct in self.good_ctr.most_common():
+            if ct < 2:
+                singletons += 1
+            else:
+                ret.append((seq, self.seq_to_cdr3[seq], ct / tot, ct, tot))
+        ret.insert(0, ("", "", "", "", ""))
+        ret.insert(
+            0, ("unique_singleton_sequences", "", singletons / tot, singletons, tot)
+        )
+        ret.insert(
+            0,
+            (
+                "chao1_estimated_diversity",
+                "",
+                "",
+                "",
+                chao1(len(self.all_ctr), freqs[1], freqs[2]),
+            ),
+        )
+        return ret
+
+
+class _SpilledMatch(NamedTuple):
+    hmm_from: int
+
+
+class _SpilledAln(NamedTuple):
+    """the parts of an HMMAln that padding needs, as read back from a spill file"""
+
+    read_id: str
+    model: str
+    best_match: _SpilledMatch
+    residues: bytes
+    states: bytes
+
 
-    return pd.DataFrame(_df)
+# states are spilled as digits, to keep records on one line
+_STATE_DIGITS = bytes.maketrans(bytes(range(10)), b"0123456789")
+_DIGIT_STATES = bytes.maketrans(b"0123456789", bytes(range(10)))
+
+
+class PaddedAlignments:
+    """
+    padded, column-aligned domain sequences for a stream of alignments.  the padding can't be
+    known until every alignment has been seen, so add() keeps the maximum insertions before
+    each HMM position and spills a compact record of each alignment to the binary file
+    @spill; rows() then reads the records back, a batch at a time
+
+    the columns are those of the domains of ReportLayout @layout.  alignments to each model
+    are padded separately, and have only the domains of their own chain
+    """
+
+    def __init__(self, spill, layout=DEFAULT_LAYOUT):
+        self.spill = spill
+        self.layout = layout
+        self.paddings = {
+            name: np.zeros(model.length + 2, dtype=np.int64)
+            for name, model in layout.models.items()
+        }
+
+    @property
+    def padding(self):
+        """the padding of the alignments to the layout's first model"""
+        return next(iter(self.paddings.values()))
+
+    def add(self, alns):
+        """add the HMMAln @alns, none of which may be None"""
+        for model, rows in self.layout.groups(alns):
+            update_padding(self.paddings[model.name], _take(alns, rows))
+        self.spill.writelines(
+            b"%s\t%s\t%d\t%s\t%s\n"
+            % (
+                aln.read_id.encode(),
+                self.layout.model(aln).name.encode(),
+                aln.best_match.hmm_from,
+                aln.residues,
+                aln.states.translate(_STATE_DIGITS),
+            )
+            for aln in alns
+        )
+
+    @property
+    def has_tail(self):
+        """whether there's a column for residues after the last domain"""
+        return any(
+            bool(padding[-1])
+            or _domain_ends(self.layout.models[name].domain_lens)[-1] < len(padding) - 1
+            for name, padding in self.paddings.items()
+        )
+
+    def columns(self):
+        names = ["read"] + (["chain"] if len(self.layout.chains) > 1 else [])
+        names += self.layout.domains
+        return names + ["tail"] if self.has_tail else names
+
+    def _records(self):
+        self.spill.seek(0)
+        for line in self.spill:
+            read_id, model, hmm_from, residues, states = line.rstrip(b"\n").split(b"\t")
+            yield _SpilledAln(
+                read_id.decode(),
+                model.decode(),
+                _SpilledMatch(int(hmm_from)),
+                residues,
+                states.translate(_DIGIT_STATES),
+            )
+
+    def rows(self, batch_size=500):
+        """iterate over the padded rows of the alignments added, in order"""
+        has_tail = self.has_tail
+        batch = []
+        for rec in self._records():
+            batch.append(rec)
+            if len(batch) >= batch_size:
+                yield from self._pad_rows(batch, has_tail)
+                batch = []
+        yield from self._pad_rows(batch, has_tail)
+
+    def _pad_rows(self, batch, has_tail):
+        layout = self.layout
+        columns = {}
+        groups = layout.groups(batch)
+        if groups and groups[0][1] is not None:
+            columns.update((name, [""] * len(batch)) for name in layout.domains)
+            columns["tail"] = [""] * len(batch)
+        for model, rows in groups:
+            padded = _pad_batch(
+                self.paddings[model.name], _take(batch, rows), model.domain_lens
+            )
+            names = [name for name, _ in model.domain_lens] + ["tail"]
+            if rows is None:
+                columns.update(zip(names, padded))
+            else:
+                for name, column in zip(names, padded):
+                    _put(columns[name], rows, column)
+
+        out = [[rec.read_id for rec in batch]]
+        if len(layout.chains) > 1:
+            out.append([layout.models[rec.model].chain for rec in batch])
+        out += [columns.get(name, []) for name in layout.domains]
+        if has_tail:
+            out.append(columns.get("tail", []))
+        return zip(*out)
 
 
 def summary(report, alns):
-    failed = sum(1 for x in alns if x is None)
-    tot = len(report) + failed
-    return (
-        ("failed", "", failed / (len(report) + failed), failed, tot),
-        (
-            "complete",
-            "",
-            report["complete?"].sum() / tot,
-            report["complete?"].sum(),
-            tot,
-        ),
-        (
-            "frameshift",
-            "",
-            report["frameshift?"].sum() / tot,
-            report["frameshift?"].sum(),
-            tot,
-        ),
-        ("stop_codon", "", report["stop?"].sum() / tot, report["stop?"].sum(), tot),
-    )
+    return CloneCounts.from_report(report, alns).summary()
 
 
 def cdr3_freq(report, alns):
@@ -188,16 +829,7 @@ def cdr3_freq(report, alns):
       (cdr3_sequence, fraction, count, total_reads)
     CDR3s with only 1 read are dropped
     """
-    failed = sum(1 for x in alns if x is None)
-    tot = len(report) + failed
-    cdr3_cts = []
-    report.groupby("H-CDR3").apply(
-        lambda x: cdr3_cts.append(
-            (x["H-CDR3"].values[0], x.count()[0] / tot, x.count()[0], tot)
-        )
-    )
-    cdr3_cts.sort(key=(lambda row: row[1]), reverse=True)
-    return [t for t in cdr3_cts if t[2] > 1]
+    return CloneCounts.from_report(report, alns).cdr3_freq()
 
 
 def full_seq_freq(report, alns):
@@ -207,27 +839,4 @@ def full_seq_freq(report, alns):
     where sequence is the complete sequence
     sequences with only 1 read are dropped
     """
-    failed = sum(1 for x in alns if x is None)
-    tot = len(report) + failed
-    good_ctr, all_ctr, seq_to_cdr3 = Counter(), Counter(), {}
-    for _, row in report.iterrows():
-        seq = "".join(row[domain] for domain, _ in DOMAIN_LENS)
-        seq = seq.replace("-", "").upper()
-        seq_to_cdr3[seq] = row["H-CDR3"].replace("-", "").upper()
-        all_ctr[seq] += 1
-        if row["complete?"] and not row["frameshift?"]:
-            good_ctr[seq] += 1
-
-    singletons, ret = 0, []
-    for seq, ct in good_ctr.most_common():
-        if ct < 2:
-            singletons += 1
-        else:
-            ret.append((seq, seq_to_cdr3[seq], ct / tot, ct, tot))
-    ret.insert(0, ("", "", "", "", ""))
-    ret.insert(0, ("unique_singleton_sequences", "", singletons / tot, singletons, tot))
-    ret.insert(
-        0,
-        ("chao1_estimated_diversity", "", "", "", alpha.chao1(list(all_ctr.values()))),
-    )
-    return ret
+    return CloneCounts.from_report(report, alns).full_seq_freq()
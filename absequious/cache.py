@@ -0,0 +1,203 @@
+"""
+persistent cache of alignments, so that re-running a library doesn't pay for hmmsearch again
+"""
+
+import hashlib
+import json
+import sqlite3
+from collections import deque
+
+from .parse import BestMatch, HMMAln
+
+# entries kept when the cache is closed, evicting the least recently used
+DEFAULT_MAX_ENTRIES = 1000000
+# new entries are written in transactions of this many
+WRITE_BATCH_SIZE = 10000
+# part of every key; bump when the serialized form of alignments changes
+FORMAT_VERSION = 3
+
+_MISS = object()
+
+
+def model_key(hmm, top_frames, engine="subprocess", parser="text"):
+    """
+    return a digest of the HMM file @hmm and the other settings that affect a read's alignment:
+    --frames, --engine and --parser, so that cached alignments are no longer used when any of
+    them changes
+    """
+    h = hashlib.sha1()
+    with open(hmm, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    h.update(
+        f"frames={top_frames} engine={engine} parser={parser} format={FORMAT_VERSION}".encode()
+    )
+    return h.hexdigest()
+
+
+def seq_key(dna):
+    return hashlib.sha1(dna.encode()).digest()
+
+
+def dump_aln(aln):
+    """serialize the alignment @aln (or None) to a string"""
+    if aln is None:
+        return "null"
+    return json.dumps(
+        [
+            aln.seq_id[len(aln.read_id) :],
+            aln.best_match,
+            aln.score_and_eval,
+            aln.residues.decode(),
+            list(aln.states),
+            aln.tgt_seq,
+            aln.model,
+        ]
+    )
+
+
+def load_aln(value, read_id, dna_seq):
+    """deserialize an alignment dumped with dump_aln, for read @read_id with DNA @dna_seq"""
+    fields = json.loads(value)
+    if fields is None:
+        return None
+    suffix, best_match, score_and_eval, residues, states, tgt_seq, model = fields
+    seq_id = read_id + suffix
+    return HMMAln.from_parts(
+        seq_id,
+        BestMatch(*best_match),
+        score_and_eval and tuple(score_and_eval),
+        residues.encode(),
+        bytes(states),
+        dna_seq,
+        {seq_id: tgt_seq},
+        model,
+    )
+
+
+class AlignmentCache:
+    """
+    SQLite-backed cache mapping a read's DNA sequence to its best alignment (or None, if it
+    has none) against a particular HMM, found with a particular @engine and @parser
+
+    lookup() passes on the reads of each batch whose alignments aren't cached, and merge()
+    combines the alignments of those reads with the cached ones, a batch at a time, in input
+    order, storing the new ones
+    """
+
+    def __init__(
+        self,
+        path,
+        hmm,
+        top_frames,
+        engine="subprocess",
+        parser="text",
+        max_entries=DEFAULT_MAX_ENTRIES,
+    ):
+        self.model = model_key(hmm, top_frames, engine, parser)
+        self.max_entries = max_entries
+        self.hits = self.misses = 0
+        self._db = sqlite3.connect(path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS alignments ("
+            " seq BLOB NOT NULL, model TEXT NOT NULL, aln TEXT NOT NULL,"
+            " used INTEGER NOT NULL, PRIMARY KEY (seq, model))"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS alignments_used ON alignments (used)"
+        )
+        # entries are stamped with the run that last used them, for eviction
+        (last_run,) = self._db.execute(
+            "SELECT COALESCE(MAX(used), 0) FROM alignments"
+        ).fetchone()
+        self._run = last_run + 1
+        self._pending = deque()
+        self._writes, self._touched = [], []
+
+    def get(self, dna):
+        """return the cached alignment value for @dna, or None if there isn't one"""
+        row = self._db.execute(
+            "SELECT aln FROM alignments WHERE seq = ? AND model = ?",
+            (seq_key(dna), self.model),
+        ).fetchone()
+        return row and row[0]
+
+    def lookup(self, read_batches):
+        """
+        for each of @read_batches, lists of (read_id, dna) tuples, yield a list of those reads
+        with no cached alignment (which may be empty)
+        """
+        for batch in read_batches:
+            entries, misses = [], []
+            for read_id, dna in batch:
+                value = self.get(dna)
+                if value is None:
+                    self.misses += 1
+                    entries.append((read_id, dna, _MISS))
+                    misses.append((read_id, dna))
+                else:
+                    self.hits += 1
+                    self._touched.append((self._run, seq_key(dna), self.model))
+                    entries.append((read_id, dna, value))
+            self._pending.append(entries)
+            yield misses
+
+    def merge(self, batch_alns):
+        """
+        given the alignments of each batch of reads passed on by lookup(), iterate over the
+        alignments of all reads, in input order
+        """
+        for alns in batch_alns:
+            alns = iter(alns)
+            for read_id, dna, value in self._pending.popleft():
+                if value is not _MISS:
+                    yield load_aln(value, read_id, dna)
+                    continue
+                aln = next(alns)
+                self._writes.append(
+                    (seq_key(dna), self.model, dump_aln(aln), self._run)
+                )
+                yield aln
+            if (
+                len(self._writes) >= WRITE_BATCH_SIZE
+                or len(self._touched) >= WRITE_BATCH_SIZE
+            ):
+                self.flush()
+
+    def flush(self):
+        with self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO alignments (seq, model, aln, used)"
+                " VALUES (?, ?, ?, ?)",
+                self._writes,
+            )
+            self._db.executemany(
+                "UPDATE alignments SET used = ? WHERE seq = ? AND model = ?",
+                self._touched,
+            )
+        self._writes, self._touched = [], []
+
+    def evict(self):
+        """
+        drop the least recently used entries beyond max_entries.  entries made with a different
+        HMM (or --frames, --engine or --parser) are never used again, so they are the first to
+        go
+        """
+        with self._db:
+            self._db.execute(
+                "DELETE FROM alignments WHERE rowid IN ("
+                " SELECT rowid FROM alignments ORDER BY model = ? DESC, used DESC"
+                " LIMIT -1 OFFSET ?)",
+                (self.model, self.max_entries),
+            )
+
+    def close(self):
+        self.flush()
+        self.evict()
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
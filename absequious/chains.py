@@ -0,0 +1,85 @@
+"""
+the chain and domains of each model of an HMM database, from a metadata table such as
+data/models.tsv: a tab-separated file with the columns model, chain and domains, where domains
+lists the name and length in reference space of each domain, in order, as name:length.
+as in hmm_from's reference space, the domain lengths of a model add up to its length + 1
+"""
+
+from pathlib import Path
+from typing import NamedTuple, Optional, Tuple
+
+from .hmm import load_models
+
+DEFAULT_MODEL_TABLE = Path(__file__).resolve().parent / "data" / "models.tsv"
+
+
+class ModelInfo(NamedTuple):
+    """
+    how the alignments of one model are annotated: the @chain it models (eg "H"), its
+    @length in match states, and (name, length) for each of its domains
+    """
+
+    name: str
+    chain: str
+    length: int
+    domain_lens: Tuple[Tuple[str, int], ...]
+
+    @property
+    def cdr3(self) -> Optional[str]:
+        """the name of the model's CDR3 domain, or None if it has none"""
+        return next(
+            (name for name, _ in self.domain_lens if name.endswith("CDR3")), None
+        )
+
+
+class ModelTableError(ValueError):
+    pass
+
+
+def read_model_table(path):
+    """
+    read the metadata table at @path, returning a dictionary mapping model name to (chain,
+    domain_lens)
+    """
+    table = {}
+    with open(path) as fin:
+        for line in fin:
+            if not line.strip() or line.startswith("#"):
+                continue
+            fields = line.rstrip("\n").split("\t")
+            if fields == ["model", "chain", "domains"]:
+                continue
+            try:
+                name, chain, domains = fields
+                domain_lens = tuple(
+                    (dom_name, int(dom_len))
+                    for dom_name, dom_len in (
+                        domain.rsplit(":", 1) for domain in domains.split()
+                    )
+                )
+            except ValueError:
+                raise ModelTableError(f"{path}: couldn't parse line: {line.strip()}")
+            table[name] = chain, domain_lens
+    return table
+
+
+def model_info(hmm, table=DEFAULT_MODEL_TABLE):
+    """
+    return ModelInfo for each model in the HMM file @hmm, in the order of the file, taking
+    their lengths from the HMM and their chains and domains from the metadata @table
+    """
+    chains, models = read_model_table(table), load_models(hmm)
+    missing = [name for name in models if name not in chains]
+    if missing:
+        raise ModelTableError(f"{table} has no entry for models {', '.join(missing)}")
+    infos = []
+    for name, model in models.items():
+        chain, domain_lens = chains[name]
+        total = sum(dom_len for _, dom_len in domain_lens)
+        if total != model.length + 1:
+            raise ModelTableError(
+                f"{table}: the domains of {name} add up to {total}, but must add up to "
+                f"its length + 1, {model.length + 1}"
+            )
+        infos.append(ModelInfo(name, chain, model.length, domain_lens))
+    return tuple(infos)
@@ -0,0 +1,238 @@
+"""
+checkpoints of an aln run (aln --work-dir), so that a run that dies can be resumed, losing only
+the chunks of the input in flight
+
+the input is split into numbered chunks, ReadRanges of a plain or BGZF file.  as each chunk
+is finished, its part of the reads report and its clone counts are saved to the work
+directory, and then a line is appended to its manifest, chunks.jsonl, with the chunk's range
+of bytes and a checksum of them.  a chunk is done when it has a line in the manifest; on
+resuming, done chunks are checked against the input, and only the others are aligned.  the
+output is written from the saved chunks once every chunk is done:
+  run.json          the settings of the run, which resuming must match
+  chunks.jsonl      the manifest
+  {n}_reads.csv     chunk n's part of the reads report, with a header
+  {n}.counts        chunk n's counts, as RunCounts.dump saves them
+"""
+
+import csv
+import hashlib
+import json
+import os
+import shutil
+from collections import Counter
+
+from .algo import ReportTable
+from .counts import RunCounts
+from .output import CSVReportWriter
+from .reads import split_ranges
+
+# bump when the files of a work directory change
+FORMAT_VERSION = 1
+
+_FLAGS = ("complete?", "frameshift?", "stop?")
+
+
+class CheckpointError(ValueError):
+    pass
+
+
+def range_checksum(r):
+    """
+    the SHA-1 of the bytes of ReadRange @r, from its start to its end, or for BGZF, of the
+    blocks they fall in
+    """
+    start, end = r.start, r.end
+    if r.bgzf:
+        start, end = start >> 16, None if end is None else end >> 16
+    h = hashlib.sha1()
+    with open(r.path, "rb") as f:
+        f.seek(start)
+        left = None if end is None else end - start
+        while left is None or left > 0:
+            block = f.read(1 << 20 if left is None else min(left, 1 << 20))
+            if not block:
+                break
+            h.update(block)
+            if left is not None:
+                left -= len(block)
+    return h.hexdigest()
+
+
+class Checkpoint:
+    """
+    the work directory @work_dir of a run over the reads at @path.  @settings are the
+    options that affect the output, which a resumed run must share; @n_chunks is the number
+    of chunks to split the input into, unless resuming, when it's taken from the run saved.
+    raises CheckpointError if the input can't be split, or if resuming a run that doesn't
+    match this one or its input
+    """
+
+    def __init__(self, work_dir, path, settings, n_chunks, resume=False):
+        self.work_dir = work_dir
+        self.path = path
+        settings = dict(
+            settings,
+            format=FORMAT_VERSION,
+            input=os.path.abspath(path),
+            input_size=os.path.getsize(path),
+        )
+        run_fname = self._path("run.json")
+        saved = os.path.exists(run_fname)
+        if saved:
+            if not resume:
+                raise CheckpointError(
+                    f"{work_dir} holds a checkpoint: resume it with --resume, or remove it"
+                )
+            with open(run_fname) as fin:
+                saved = json.load(fin)
+            n_chunks = saved.pop("chunks")
+            if saved != settings:
+                changed = sorted(k for k in settings if saved.get(k) != settings[k])
+                raise CheckpointError(
+                    f"{work_dir} is a checkpoint of another run: {', '.join(changed)} "
+                    "differ"
+                )
+
+        # before anything is written, so that nothing is left of a run that can't start
+        self.ranges = split_ranges(path, n_chunks)
+        if self.ranges is None:
+            raise CheckpointError(
+                f"{path} can't be split into chunks: checkpoints need a plain or bgzip "
+                "file"
+            )
+        if not saved:
+            os.makedirs(work_dir, exist_ok=True)
+            with open(run_fname + ".tmp", "w") as fout:
+                json.dump(dict(settings, chunks=n_chunks), fout, indent=2)
+            os.replace(run_fname + ".tmp", run_fname)
+        # chunk number -> its manifest entry
+        self.done = self._read_manifest()
+        for i, entry in self.done.items():
+            r = self.ranges[i] if i < len(self.ranges) else None
+            if (
+                r is None
+                or [entry["start"], entry["end"]] != [r.start, r.end]
+                or entry["sha1"] != range_checksum(r)
+            ):
+                raise CheckpointError(
+                    f"{path} has changed since chunk {i} was saved to {work_dir}"
+                )
+
+    def _path(self, fname):
+        return os.path.join(self.work_dir, fname)
+
+    def _read_manifest(self):
+        done, size = {}, 0
+        manifest = self._path("chunks.jsonl")
+        if not os.path.exists(manifest):
+            return done
+        with open(manifest, "rb") as fin:
+            for line in fin:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                if not line.endswith(b"\n"):
+                    break
+                done[entry["chunk"]] = entry
+                size += len(line)
+        # a line cut short by a crash is dropped, and its chunk done again
+        os.truncate(manifest, size)
+        return done
+
+    def pending(self):
+        """(chunk number, ReadRange) for each chunk not yet done, in order"""
+        return [(i, r) for i, r in enumerate(self.ranges) if i not in self.done]
+
+    def reads_path(self, i):
+        return self._path(f"{i:06d}_reads.csv")
+
+    def counts_path(self, i):
+        return self._path(f"{i:06d}.counts")
+
+    def open_reads(self, i, layout):
+        """a CSVReportWriter for chunk @i's part of the reads report"""
+        return CSVReportWriter(open(self.reads_path(i) + ".tmp", "w"), layout)
+
+    def save(self, i, run, n_unique, chain_ctr):
+        """
+        mark chunk @i done, once its reads have been written to open_reads(i) and closed,
+        saving RunCounts @run, the counts of its reads.  @n_unique counts the unique
+        sequences aligned, and Counter @chain_ctr the reads of each chain
+        """
+        run.dump(self.counts_path(i) + ".tmp")
+        os.replace(self.counts_path(i) + ".tmp", self.counts_path(i))
+        os.replace(self.reads_path(i) + ".tmp", self.reads_path(i))
+        r = self.ranges[i]
+        entry = {
+            "chunk": i,
+            "start": r.start,
+            "end": r.end,
+            "sha1": range_checksum(r),
+            "reads": run.counts.total,
+            "unique": n_unique,
+            "chains": dict(chain_ctr),
+        }
+        with open(self._path("chunks.jsonl"), "a") as fout:
+            fout.write(json.dumps(entry) + "\n")
+            fout.flush()
+            os.fsync(fout.fileno())
+        self.done[i] = entry
+
+    @property
+    def n_reads(self):
+        return sum(entry["reads"] for entry in self.done.values())
+
+    @property
+    def n_unique(self):
+        return sum(entry["unique"] for entry in self.done.values())
+
+    def chains(self):
+        """the reads of each chain, over the chunks done"""
+        ctr = Counter()
+        for entry in self.done.values():
+            ctr.update(entry["chains"])
+        return ctr
+
+    def counts(self, run):
+        """merge the counts of every chunk, in order, into RunCounts @run"""
+        for i in range(len(self.ranges)):
+            run.merge(RunCounts.load(self.counts_path(i)))
+        return run
+
+    def copy_reads(self, reads_out, layout, batch_size):
+        """write the reads report of every chunk, in order, with the writer @reads_out"""
+        for i in range(len(self.ranges)):
+            with open(self.reads_path(i), newline="") as fin:
+                next(fin)
+                if isinstance(reads_out, CSVReportWriter):
+                    shutil.copyfileobj(fin, reads_out.fout)
+                    continue
+                rows = []
+                for row in csv.reader(fin):
+                    rows.append(row)
+                    if len(rows) == batch_size:
+                        reads_out.write(_table(rows, layout))
+                        rows = []
+                if rows:
+                    reads_out.write(_table(rows, layout))
+
+    def remove(self):
+        """remove the files of the checkpoint, and the work directory if that empties it"""
+        for i in range(len(self.ranges)):
+            for fname in (self.reads_path(i), self.counts_path(i)):
+                if os.path.exists(fname):
+                    os.remove(fname)
+        for fname in ("chunks.jsonl", "run.json"):
+            if os.path.exists(self._path(fname)):
+                os.remove(self._path(fname))
+        if not os.listdir(self.work_dir):
+            os.rmdir(self.work_dir)
+
+
+def _table(rows, layout):
+    """a ReportTable of @rows read back from CSV, with the flags as booleans"""
+    table = ReportTable.from_rows(rows, layout)
+    for name in _FLAGS:
+        table.columns[name] = [value == "True" for value in table[name]]
+    return table
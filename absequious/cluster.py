@@ -0,0 +1,94 @@
+"""
+clonotype clustering: CDR3s of the same length that differ at only a few positions are put
+in the same cluster, so that reads split off a clone by PCR and sequencing errors are
+counted with it
+"""
+
+from collections import Counter, defaultdict
+from itertools import combinations
+
+
+def _find(parent, i):
+    while parent[i] != i:
+        # path halving
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def cluster_cdr3s(cdr3s, max_dist=1):
+    """
+    cluster the distinct strings @cdr3s, linking those of the same length that differ at up
+    to @max_dist positions; clusters are the connected components.  returns the cluster of
+    each string, numbered from 0 in order of their first string
+
+    strings differing at up to @max_dist positions are equal once those positions are masked,
+    so rather than comparing every pair, the strings of each length are grouped by what's
+    left of them with each set of @max_dist positions masked, one set at a time
+    """
+    parent = list(range(len(cdr3s)))
+    by_len = defaultdict(list)
+    for i, cdr3 in enumerate(cdr3s):
+        by_len[len(cdr3)].append(i)
+
+    for length, members in by_len.items():
+        if len(members) < 2:
+            continue
+        for masked in combinations(range(length), min(max_dist, length)):
+            # the slices of the strings left unmasked
+            starts = (0,) + tuple(pos + 1 for pos in masked)
+            ends = masked + (length,)
+            slices = [(start, end) for start, end in zip(starts, ends) if start < end]
+            first = {}
+            for i in members:
+                cdr3 = cdr3s[i]
+                key = "".join([cdr3[start:end] for start, end in slices])
+                j = first.setdefault(key, i)
+                if j != i:
+                    root_i, root_j = _find(parent, i), _find(parent, j)
+                    if root_i != root_j:
+                        parent[max(root_i, root_j)] = min(root_i, root_j)
+
+    labels, ret = {}, []
+    for i in range(len(cdr3s)):
+        root = _find(parent, i)
+        ret.append(labels.setdefault(root, len(labels)))
+    return ret
+
+
+def cluster_clones(counts, max_dist=1):
+    """
+    cluster the complete, frameshift-free clones of CloneCounts @counts by CDR3, with
+    cluster_cdr3s.  returns a dictionary mapping each CDR3 to its cluster's ID, and a list
+    of tuples of the form:
+      (cluster_id, cdr3, fraction, count, total_reads)
+    for the clusters of more than 1 read, most reads first, where cdr3 is that of the
+    cluster's largest CDR3.  the first tuple gives the number of clusters
+
+    clusters are numbered from 1, most reads first, ties in the order first seen
+    """
+    cdr3_cts = Counter()
+    for seq, ct in counts.good_clones():
+        cdr3_cts[counts.seq_to_cdr3[seq]] += ct
+    cdr3s = list(cdr3_cts)
+    labels = cluster_cdr3s(cdr3s, max_dist)
+
+    n_clusters = max(labels, default=-1) + 1
+    sizes, largest = [0] * n_clusters, [None] * n_clusters
+    for cdr3, label in zip(cdr3s, labels):
+        sizes[label] += cdr3_cts[cdr3]
+        if largest[label] is None or cdr3_cts[cdr3] > cdr3_cts[largest[label]]:
+            largest[label] = cdr3
+    order = sorted(range(n_clusters), key=lambda label: sizes[label], reverse=True)
+    ids = [None] * n_clusters
+    for rank, label in enumerate(order):
+        ids[label] = f"cluster_{rank + 1}"
+
+    tot = counts.total
+    rows = [("cdr3_clusters", "", "", "", n_clusters)]
+    rows.extend(
+        (ids[label], largest[label], sizes[label] / tot, sizes[label], tot)
+        for label in order
+        if sizes[label] > 1
+    )
+    return {cdr3: ids[label] for cdr3, label in zip(cdr3s, labels)}, rows
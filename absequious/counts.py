@@ -0,0 +1,137 @@
+"""
+clone counts saved to a file, so that runs over shards of a library (or over many
+libraries) can be combined into one summary without aligning their reads again
+"""
+
+import gzip
+import json
+import re
+from collections import Counter
+
+from .algo import CloneCounts
+
+# bump when the serialized form of counts changes
+FORMAT_VERSION = 1
+
+
+def dump_clone_counts(counts):
+    """return CloneCounts @counts as a JSON-serializable dict"""
+    seqs = list(counts.all_ctr)
+    index = {seq: i for i, seq in enumerate(seqs)}
+    return {
+        "failed": counts.failed,
+        "aligned": counts.aligned,
+        "complete": counts.complete,
+        "frameshift": counts.frameshift,
+        "stop": counts.stop,
+        # clones in the order first seen, which decides the order of ties in the summary
+        "seqs": [[seq, counts.seq_to_cdr3[seq], counts.all_ctr[seq]] for seq in seqs],
+        "good": [[index[seq], ct] for seq, ct in counts.good_ctr.items()],
+        "cdr3": list(counts.cdr3_ctr.items()),
+        "liabilities": counts.liability_ctr,
+    }
+
+
+def load_clone_counts(fields):
+    """the inverse of dump_clone_counts"""
+    counts = CloneCounts()
+    counts.failed = fields["failed"]
+    counts.aligned = fields["aligned"]
+    counts.complete = fields["complete"]
+    counts.frameshift = fields["frameshift"]
+    counts.stop = fields["stop"]
+    seqs = []
+    for seq, cdr3, ct in fields["seqs"]:
+        seqs.append(seq)
+        counts.seq_to_cdr3[seq] = cdr3
+        counts.all_ctr[seq] = ct
+    for i, ct in fields["good"]:
+        counts.good_ctr[seqs[i]] = ct
+    counts.cdr3_ctr.update(dict(fields["cdr3"]))
+    if fields.get("liabilities") is not None:
+        counts.liability_ctr = Counter(fields["liabilities"])
+    return counts
+
+
+class RunCounts:
+    """
+    the clone counts of a run, over all of its reads and, given @sample_pattern, per sample:
+    the sample of each read is the first group of the regular expression @sample_pattern
+    found in its ID (or the whole match, if it has no groups), and "" if there's no match.
+    the counts are made with @new_counts, eg CloneCounts
+    """
+
+    def __init__(self, sample_pattern=None, new_counts=CloneCounts):
+        self.sample_pattern = sample_pattern
+        self.new_counts = new_counts
+        self.counts = new_counts()
+        self.samples = {}
+        self._sample_re = sample_pattern and re.compile(sample_pattern)
+
+    def sample(self, read_id):
+        m = self._sample_re.search(read_id)
+        if m is None:
+            return ""
+        return (m.group(1) if m.re.groups else m.group(0)) or ""
+
+    def add_chunk(self, chunk, table, read_ids=None):
+        """
+        count a chunk of alignments, None for reads that failed to align, given ReportTable
+        @table of the rest.  with a sample pattern, @read_ids are the IDs of the reads in
+        @chunk
+        """
+        self.counts.add_table(table, failed=len(chunk) - len(table))
+        if self._sample_re is None:
+            return
+        # the rows of @table and the number of failed reads, by sample
+        by_sample, row = {}, 0
+        for aln, read_id in zip(chunk, read_ids):
+            rows_failed = by_sample.setdefault(self.sample(read_id), [[], 0])
+            if aln is None:
+                rows_failed[1] += 1
+            else:
+                rows_failed[0].append(row)
+                row += 1
+        for sample, (rows, failed) in by_sample.items():
+            counts = self.samples.setdefault(sample, self.new_counts())
+            counts.add_table(table.take(rows), failed=failed)
+
+    def merge(self, other):
+        """add the counts of RunCounts @other, for the reads following those counted here"""
+        self.counts.merge(other.counts)
+        for sample, counts in other.samples.items():
+            self.samples.setdefault(sample, self.new_counts()).merge(counts)
+        return self
+
+    def dump(self, path):
+        """save the counts to the gzipped JSON file @path"""
+        with gzip.open(path, "wt") as fout:
+            json.dump(
+                {
+                    "format": FORMAT_VERSION,
+                    "sample_pattern": self.sample_pattern,
+                    "counts": dump_clone_counts(self.counts),
+                    "samples": [
+                        [sample, dump_clone_counts(counts)]
+                        for sample, counts in self.samples.items()
+                    ],
+                },
+                fout,
+                separators=(",", ":"),
+            )
+
+    @classmethod
+    def load(cls, path):
+        """load counts saved with dump"""
+        with gzip.open(path, "rt") as fin:
+            fields = json.load(fin)
+        if fields.get("format") != FORMAT_VERSION:
+            raise ValueError(
+                f"{path}: unsupported counts format {fields.get('format')}"
+            )
+        run = cls(fields["sample_pattern"])
+        run.counts = load_clone_counts(fields["counts"])
+        run.samples = {
+            sample: load_clone_counts(counts) for sample, counts in fields["samples"]
+        }
+        return run
@@ -0,0 +1,120 @@
+"""
+minimal reader for HMMER3 ASCII profile files, extracting what we need to annotate alignments
+without going through hmmsearch's human-readable output
+"""
+
+import math
+from functools import lru_cache
+
+AMINO_ACIDS = "ACDEFGHIKLMNPQRSTVWY"
+
+# HMMER's default amino acid background frequencies (BLOSUM62 composition)
+BACKGROUND = dict(
+    zip(
+        AMINO_ACIDS,
+        (
+            0.0787945,
+            0.0151600,
+            0.0535222,
+            0.0668298,
+            0.0397062,
+            0.0695071,
+            0.0229198,
+            0.0590092,
+            0.0594422,
+            0.0963728,
+            0.0237718,
+            0.0414386,
+            0.0482904,
+            0.0395639,
+            0.0540978,
+            0.0683364,
+            0.0540687,
+            0.0673417,
+            0.0114135,
+            0.0304133,
+        ),
+    )
+)
+
+
+class HMMFormatError(ValueError):
+    pass
+
+
+class HMMModel:
+    """
+    attributes:
+    - name: model name (NAME)
+    - length: number of match states (LENG)
+    - checksum: checksum of the training alignment (CKSUM), or None
+    - consensus: consensus residue for each match state, indexed from 1 (index 0 is unused);
+      upper case where the residue is strongly conserved, as in hmmsearch's alignments
+    - positives: for each match state (also indexed from 1), the set of residues with a
+      positive emission score; these are the residues hmmsearch marks with "+"
+    """
+
+    def __init__(self, name, length, checksum, consensus, positives):
+        self.name = name
+        self.length = length
+        self.checksum = checksum
+        self.consensus = consensus
+        self.positives = positives
+
+    def __repr__(self):
+        return f"HMMModel({self.name!r}, length={self.length})"
+
+
+def _parse_model(lines):
+    header, alphabet, nodes = {}, None, []
+    for line in lines:
+        fields = line.split()
+        if not fields:
+            continue
+        if alphabet is None:
+            if fields[0] == "HMM":
+                alphabet = fields[1:]
+            else:
+                header[fields[0]] = " ".join(fields[1:])
+        elif fields[0].isdigit():
+            # match state line: node number, emissions, then MAP, CONS, RF, MM, CS
+            emissions = fields[1 : len(alphabet) + 1]
+            cons = fields[len(alphabet) + 2]
+            positives = frozenset(
+                res
+                for res, em in zip(alphabet, emissions)
+                if em != "*" and math.exp(-float(em)) > BACKGROUND[res]
+            )
+            nodes.append((cons, positives))
+    if alphabet is None or "NAME" not in header or "LENG" not in header:
+        raise HMMFormatError("couldn't parse HMM header", header)
+    length = int(header["LENG"])
+    if len(nodes) != length:
+        raise HMMFormatError(
+            f"model {header['NAME']}: expected {length} nodes, found {len(nodes)}"
+        )
+    return HMMModel(
+        header["NAME"],
+        length,
+        int(header["CKSUM"]) if "CKSUM" in header else None,
+        " " + "".join(cons for cons, _ in nodes),
+        [frozenset()] + [positives for _, positives in nodes],
+    )
+
+
+def iter_models(input):
+    """iterate over the models in an HMMER3 ASCII file, yielding HMMModel objects"""
+    lines = []
+    for line in input:
+        if line.startswith("//"):
+            yield _parse_model(lines)
+            lines = []
+        else:
+            lines.append(line)
+
+
+@lru_cache(maxsize=None)
+def load_models(path):
+    """return a dictionary mapping model name to HMMModel for the HMM file at @path"""
+    with open(path) as f:
+        return {model.name: model for model in iter_models(f)}
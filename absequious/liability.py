@@ -0,0 +1,97 @@
+"""
+developability liabilities of the aligned domains (aln --liabilities): residues and motifs
+prone to chemical modification or misfolding.  each unique sequence is scanned once, with a
+single regular expression matching the first residue of every motif
+
+liabilities are reported as name:domain:position, position counting from 1 within the
+domain where the motif starts, joined with ";" in the order found
+"""
+
+import re
+from bisect import bisect_right
+from collections import Counter
+from functools import lru_cache
+from itertools import accumulate
+
+# the liabilities, in the order the summary lists them
+LIABILITIES = (
+    # N-linked glycosylation sites, N[^P][ST]
+    "n_glycosylation",
+    # deamidation, NG or NS
+    "deamidation",
+    # aspartate isomerization, DG
+    "isomerization",
+    # with an odd number of cysteines, each but the disulfide-bonded pair: the last of FR1
+    # and the last of FR3
+    "unpaired_cysteine",
+    # oxidation of methionine and tryptophan in the CDRs
+    "met_oxidation",
+    "trp_oxidation",
+)
+
+# sequences scanned are remembered, so that the reads of a clone are scanned once
+CACHE_SIZE = 1 << 18
+
+_SCAN = re.compile("N(?=[GS]|[^P][ST])|D(?=G)|[CMW]")
+_OXIDATION = {"M": "met_oxidation", "W": "trp_oxidation"}
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def scan(domains, names):
+    """
+    the liabilities of a sequence split into @domains, strings of upper-case residues, named
+    @names, eg ("H-FR1", ...), as a string in the form described above
+    """
+    seq = "".join(domains)
+    starts = list(accumulate(map(len, domains), initial=0))[:-1]
+    found, cysteines = [], []
+    for m in _SCAN.finditer(seq):
+        i, residue = m.start(), m.group()
+        dom = bisect_right(starts, i) - 1
+        if residue == "N":
+            if seq[i + 1] != "P" and seq[i + 2 : i + 3] in ("S", "T"):
+                found.append(("n_glycosylation", dom, i))
+            if seq[i + 1] in "GS":
+                found.append(("deamidation", dom, i))
+        elif residue == "D":
+            found.append(("isomerization", dom, i))
+        elif residue == "C":
+            cysteines.append((dom, i))
+        elif "CDR" in names[dom]:
+            found.append((_OXIDATION[residue], dom, i))
+
+    if len(cysteines) % 2:
+        # the last cysteine of each of FR1 and FR3 form the conserved disulfide bond
+        last = {}
+        for dom, i in cysteines:
+            last[dom] = i
+        bonded = {i for dom, i in last.items() if names[dom].endswith(("FR1", "FR3"))}
+        found += [
+            ("unpaired_cysteine", dom, i) for dom, i in cysteines if i not in bonded
+        ]
+        found.sort(key=lambda hit: hit[2])
+    return ";".join(
+        f"{name}:{names[dom]}:{i - starts[dom] + 1}" for name, dom, i in found
+    )
+
+
+def annotate(domains, names):
+    """
+    the liabilities of each read, given @domains, a column of residues for each domain,
+    named @names
+    """
+    names = tuple(names)
+    return [scan(seq_domains, names) for seq_domains in zip(*domains)]
+
+
+def count(column):
+    """
+    the number of reads with each liability, given a @column of liabilities as annotate
+    returns, counting each distinct annotation once
+    """
+    ctr = Counter()
+    for liabilities, n in Counter(column).items():
+        if liabilities:
+            for name in {hit.split(":", 1)[0] for hit in liabilities.split(";")}:
+                ctr[name] += n
+    return ctr
@@ -0,0 +1,257 @@
+"""
+per-stage timing of a run (aln --metrics, --profile): the wall and CPU time spent in each
+stage of the pipeline, and the number of reads through it, summed over the worker processes
+
+recording is off unless enable() is called: stage() then returns a shared no-op context
+manager and timed_iter() its argument unchanged, so the instrumented code costs a function
+call per batch
+"""
+
+import os
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+from functools import partial
+
+_NULL = nullcontext()
+# the Metrics being recorded by this process, if any
+_active = None
+
+
+def _children_cpu_time():
+    """CPU time used by the finished child processes of this process, eg hmmsearch"""
+    t = os.times()
+    return t.children_user + t.children_system
+
+
+def loaded_modules():
+    """
+    the absequious modules and the top-level packages outside the standard library that
+    this process has imported
+    """
+    stdlib = getattr(sys, "stdlib_module_names", ())
+    names = set()
+    for name in list(sys.modules):
+        top = name.partition(".")[0]
+        if top == "absequious":
+            names.add(name)
+        elif top not in stdlib and not top.startswith("_"):
+            names.add(top)
+    return names
+
+
+class _ProfileStats:
+    """the stats of a cProfile.Profile, as pstats.Stats loads them"""
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+class Metrics:
+    """
+    the time spent in each stage, and the reads through it.  with @profile, each stage is
+    also run under its own cProfile.Profile; a stage started within another is profiled on
+    its own, and the outer stage's profile is paused meanwhile
+    """
+
+    def __init__(self, profile=False):
+        self.profile = profile
+        # stage -> [calls, items, wall time, CPU time]
+        self.stages = {}
+        # gauge -> [samples, sum, max]
+        self.gauges = {}
+        self.pids = {os.getpid()}
+        # the modules loaded by the worker processes, as loaded_modules lists them
+        self.worker_modules = set()
+        # stage -> cProfile.Profile, for this process, and pstats.Stats, for the others
+        self._profilers = {}
+        self._merged_profiles = {}
+        self._profiling = []
+
+    def _add(self, name, calls, items, wall, cpu):
+        totals = self.stages.setdefault(name, [0, 0, 0.0, 0.0])
+        totals[0] += calls
+        totals[1] += items
+        totals[2] += wall
+        totals[3] += cpu
+
+    @contextmanager
+    def stage(self, name, items=0, children=False):
+        """
+        time the block as a call of stage @name, handling @items reads.  with @children, the
+        CPU time of child processes that finish within the block is counted too
+        """
+        start, cpu_start = time.perf_counter(), time.process_time()
+        if children:
+            cpu_start -= _children_cpu_time()
+        if self.profile:
+            import cProfile
+
+            if self._profiling:
+                self._profiling[-1].disable()
+            profiler = self._profilers.get(name)
+            if profiler is None:
+                profiler = self._profilers[name] = cProfile.Profile()
+            self._profiling.append(profiler)
+            profiler.enable()
+        try:
+            yield
+        finally:
+            if self.profile:
+                self._profiling.pop().disable()
+                if self._profiling:
+                    self._profiling[-1].enable()
+            cpu = time.process_time() - cpu_start
+            if children:
+                cpu += _children_cpu_time()
+            self._add(name, 1, items, time.perf_counter() - start, cpu)
+
+    def timed_iter(self, name, iterable):
+        """pass on the items of @iterable, timing each as an item of stage @name"""
+        it = iter(iterable)
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(it)
+                except StopIteration:
+                    return
+            self.stages[name][1] += 1
+            yield item
+
+    def gauge(self, name, value):
+        """record a sample of gauge @name, eg the depth of a queue"""
+        samples = self.gauges.setdefault(name, [0, 0, value])
+        samples[0] += 1
+        samples[1] += value
+        samples[2] = max(samples[2], value)
+
+    def in_worker(self, func):
+        """
+        wrap @func, a function of one argument, to be run in a worker process: it returns
+        (result, snapshot), where snapshot holds the metrics recorded by the call, to be
+        merged into this Metrics
+        """
+        return partial(_collect, func, self.profile)
+
+    def snapshot(self):
+        """the metrics recorded so far, in a form that can be pickled, for merge()"""
+        profiles = {}
+        for name, profiler in self._profilers.items():
+            profiler.create_stats()
+            profiles[name] = profiler.stats
+        return {
+            "pids": self.pids,
+            "stages": self.stages,
+            "gauges": self.gauges,
+            "profiles": profiles,
+            "modules": loaded_modules(),
+        }
+
+    def merge(self, snapshot):
+        """add the metrics of @snapshot, as returned by snapshot(), to these"""
+        import pstats
+
+        self.pids |= snapshot["pids"]
+        self.worker_modules |= snapshot["modules"]
+        for name, (calls, items, wall, cpu) in snapshot["stages"].items():
+            self._add(name, calls, items, wall, cpu)
+        for name, (n, total, most) in snapshot["gauges"].items():
+            samples = self.gauges.setdefault(name, [0, 0, most])
+            samples[0] += n
+            samples[1] += total
+            samples[2] = max(samples[2], most)
+        for name, stats in snapshot["profiles"].items():
+            if name in self._merged_profiles:
+                self._merged_profiles[name].add(_ProfileStats(stats))
+            else:
+                self._merged_profiles[name] = pstats.Stats(_ProfileStats(stats))
+
+    def report(self, **run):
+        """the metrics as a JSON-serializable dict, along with the fields of @run"""
+        stages = {}
+        for name, (calls, items, wall, cpu) in self.stages.items():
+            stages[name] = {
+                "calls": calls,
+                "reads": items,
+                "wall_s": round(wall, 6),
+                "cpu_s": round(cpu, 6),
+                "reads_per_s": round(items / wall, 1) if items and wall else None,
+            }
+        gauges = {
+            name: {"samples": n, "mean": total / n, "max": most}
+            for name, (n, total, most) in self.gauges.items()
+        }
+        return dict(
+            run,
+            processes=len(self.pids),
+            stages=stages,
+            gauges=gauges,
+            worker_modules=sorted(self.worker_modules),
+        )
+
+    def dump_profiles(self, directory):
+        """write the profile of each stage to @directory/{stage}.prof, for pstats"""
+        import pstats
+
+        os.makedirs(directory, exist_ok=True)
+        names = set(self._profilers) | set(self._merged_profiles)
+        for name in sorted(names):
+            stats = None
+            if name in self._profilers:
+                stats = pstats.Stats(self._profilers[name])
+            if name in self._merged_profiles:
+                if stats is None:
+                    stats = self._merged_profiles[name]
+                else:
+                    stats.add(self._merged_profiles[name])
+            stats.dump_stats(os.path.join(directory, f"{name}.prof"))
+
+
+def _collect(func, profile, arg):
+    global _active
+    previous, _active = _active, Metrics(profile)
+    try:
+        result = func(arg)
+    finally:
+        snapshot = _active.snapshot()
+        _active = previous
+    return result, snapshot
+
+
+def enable(profile=False):
+    """start recording metrics in this process, returning the Metrics recorded to"""
+    global _active
+    _active = Metrics(profile)
+    return _active
+
+
+def disable():
+    global _active
+    _active = None
+
+
+def active():
+    """the Metrics being recorded to, or None"""
+    return _active
+
+
+def stage(name, items=0, children=False):
+    """Metrics.stage, for the Metrics being recorded to, if any"""
+    if _active is None:
+        return _NULL
+    return _active.stage(name, items, children)
+
+
+def timed_iter(name, iterable):
+    """Metrics.timed_iter, for the Metrics being recorded to, if any"""
+    if _active is None:
+        return iterable
+    return _active.timed_iter(name, iterable)
+
+
+def gauge(name, value):
+    if _active is not None:
+        _active.gauge(name, value)
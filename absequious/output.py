@@ -0,0 +1,302 @@
+"""
+writing the reads report, padded alignments and summary as CSV, or as typed tables in
+Parquet or Arrow IPC (Feather) files with pyarrow, which is only needed for those
+
+columnar tables are written a row group (or record batch) at a time as rows arrive.  domain
+columns are dictionary-encoded and flags are booleans.  the summary is split into tables of
+its statistics, its clones and, with clustering, its clusters
+"""
+
+import csv
+import importlib.util
+
+FORMATS = ("csv", "parquet", "arrow")
+# rows per Parquet row group, or Arrow record batch
+ROW_GROUP_SIZE = 1 << 16
+
+_FLAGS = ("complete?", "frameshift?", "stop?")
+
+
+_NO_PYARROW = "Parquet and Arrow output need pyarrow (pip install pyarrow)"
+
+
+def check_pyarrow():
+    """
+    raise ImportError if pyarrow isn't installed, without importing it, so that worker
+    processes forked before the output is written don't inherit it; ColumnarReportWriter
+    likewise imports it at the first write
+    """
+    if importlib.util.find_spec("pyarrow") is None:
+        raise ImportError(_NO_PYARROW)
+
+
+def import_pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError(_NO_PYARROW)
+    return pyarrow
+
+
+class _Dictionary:
+    """
+    a dictionary of strings growing as chunks are encoded, so that every record batch of an
+    Arrow file shares it, as the file format requires: later batches only add to it
+    """
+
+    def __init__(self):
+        pa = import_pyarrow()
+        self.codes = {}
+        self.values = pa.array([], pa.string())
+
+    def encode(self, array):
+        pa = import_pyarrow()
+        chunk = array.dictionary_encode()
+        # map the chunk's own dictionary onto this one, adding the values new to it
+        new, mapping = [], []
+        for value in chunk.dictionary.to_pylist():
+            code = self.codes.get(value)
+            if code is None:
+                code = self.codes[value] = len(self.codes)
+                new.append(value)
+            mapping.append(code)
+        if new:
+            self.values = pa.concat_arrays([self.values, pa.array(new, pa.string())])
+        indices = pa.array(mapping, pa.int32()).take(chunk.indices)
+        return pa.DictionaryArray.from_arrays(indices, self.values)
+
+
+class ColumnarWriter:
+    """
+    write a table with pyarrow schema @schema to @path, in @fmt, "parquet" or "arrow".
+    write() takes a dictionary of columns, as lists, and they're written ROW_GROUP_SIZE rows
+    at a time.  string columns of dictionary type are encoded as they're written
+    """
+
+    def __init__(self, path, fmt, schema):
+        pa = import_pyarrow()
+        self.schema = schema
+        self._buffer = {name: [] for name in schema.names}
+        self._dictionaries = {
+            field.name: _Dictionary()
+            for field in schema
+            if pa.types.is_dictionary(field.type)
+        }
+        if fmt == "parquet":
+            import pyarrow.parquet as pq
+
+            self._writer = pq.ParquetWriter(path, schema)
+        else:
+            # the dictionaries only grow, so each batch need only add to them.  LZ4, as
+            # pyarrow.feather writes by default
+            options = pa.ipc.IpcWriteOptions(
+                compression="lz4" if pa.Codec.is_available("lz4") else None,
+                emit_dictionary_deltas=True,
+            )
+            self._writer = pa.ipc.new_file(path, schema, options=options)
+        self._fmt = fmt
+
+    def write(self, columns):
+        for name, values in columns.items():
+            self._buffer[name].extend(values)
+        while self._buffered >= ROW_GROUP_SIZE:
+            self._flush(ROW_GROUP_SIZE)
+
+    @property
+    def _buffered(self):
+        return len(self._buffer[self.schema.names[0]])
+
+    def _flush(self, n):
+        pa = import_pyarrow()
+        arrays = []
+        for field in self.schema:
+            values = self._buffer[field.name]
+            chunk, self._buffer[field.name] = values[:n], values[n:]
+            if field.name not in self._dictionaries:
+                arrays.append(pa.array(chunk, field.type))
+            elif self._fmt == "parquet":
+                # Parquet keeps a dictionary per row group
+                arrays.append(pa.array(chunk, pa.string()).dictionary_encode())
+            else:
+                arrays.append(
+                    self._dictionaries[field.name].encode(pa.array(chunk, pa.string()))
+                )
+        self._writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        if self._buffered:
+            self._flush(self._buffered)
+        self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def report_schema(layout):
+    """the pyarrow schema of the reads report for ReportLayout @layout"""
+    pa = import_pyarrow()
+    categorical = set(layout.domains) | {"chain"}
+    fields = []
+    for name in layout.columns:
+        if name in _FLAGS:
+            fields.append((name, pa.bool_()))
+        elif name in categorical:
+            fields.append((name, pa.dictionary(pa.int32(), pa.string())))
+        else:
+            fields.append((name, pa.string()))
+    return pa.schema(fields)
+
+
+class CSVReportWriter:
+    """write ReportTables to the open text file @fout, as the CSV reads report"""
+
+    def __init__(self, fout, layout):
+        self.fout = fout
+        self._writer = csv.writer(fout, lineterminator="\n")
+        self._writer.writerow(layout.columns)
+
+    def write(self, table):
+        self._writer.writerows(table.rows())
+
+    def close(self):
+        self.fout.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ColumnarReportWriter:
+    """
+    write ReportTables to @path, in @fmt, "parquet" or "arrow", as the reads report.  the
+    file is created, and pyarrow imported, when the first table is written: aln builds the
+    writer before its worker processes are forked
+    """
+
+    def __init__(self, path, fmt, layout):
+        self.path, self.fmt, self.layout = path, fmt, layout
+        self._writer = None
+
+    def _open(self):
+        if self._writer is None:
+            schema = report_schema(self.layout)
+            self._writer = ColumnarWriter(self.path, self.fmt, schema)
+        return self._writer
+
+    def write(self, table):
+        if len(table):
+            writer = self._open()
+            writer.write({name: table[name] for name in writer.schema.names})
+
+    def close(self):
+        self._open().close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def padded_schema(columns):
+    """the pyarrow schema of padded alignments, with @columns as PaddedAlignments has"""
+    pa = import_pyarrow()
+    return pa.schema(
+        (
+            name,
+            pa.string() if name == "read" else pa.dictionary(pa.int32(), pa.string()),
+        )
+        for name in columns
+    )
+
+
+def write_padded(padded, path, fmt, batch_size):
+    """write PaddedAlignments @padded to @path, in @fmt, "parquet" or "arrow" """
+    columns = padded.columns()
+    with ColumnarWriter(path, fmt, padded_schema(columns)) as writer:
+        batch = []
+        for row in padded.rows(batch_size):
+            batch.append(row)
+            if len(batch) >= ROW_GROUP_SIZE:
+                writer.write(dict(zip(columns, map(list, zip(*batch)))))
+                batch = []
+        if batch:
+            writer.write(dict(zip(columns, map(list, zip(*batch)))))
+
+
+def _table(fields, rows):
+    """
+    (schema, columns) for a table of @rows, tuples, with (name, pyarrow type) @fields; ""
+    is null
+    """
+    pa = import_pyarrow()
+    columns = {
+        name: [None if row[i] == "" else row[i] for row in rows]
+        for i, (name, _) in enumerate(fields)
+    }
+    return pa.schema(fields), columns
+
+
+def summary_tables(counts, cluster_dist=None):
+    """
+    the summary of CloneCounts @counts as typed tables: returns a dictionary mapping
+    "summ", "clones" and, given @cluster_dist, "clusters" to (pyarrow schema, columns),
+    with the clones clustered as in the CSV summary
+
+    the statistics are the failed/complete/frameshift/stop fractions, chao1, the unique
+    singleton sequences and the number of clusters, with estimates such as chao1 in count.
+    with ApproxCloneCounts, the statistics and clones have an error column
+    """
+    pa = import_pyarrow()
+    string, category = pa.string(), pa.dictionary(pa.int32(), pa.string())
+    freq = counts.full_seq_freq()
+    # the rows after chao1, the singletons and a blank line are clones
+    estimates, clones = freq[:2], freq[3:]
+    approx = len(estimates[0]) > 5
+
+    stats = []
+    for name, _, fraction, count, total, *error in list(counts.summary()) + estimates:
+        if fraction == count == "":
+            # chao1's estimate is in the total's place
+            count, total = total, ""
+        stats.append((name, fraction, count, total, *(error or [""])))
+    stat_fields = [("statistic", string), ("fraction", pa.float64())]
+    stat_fields += [("count", pa.float64()), ("total", pa.int64())]
+    clone_fields = [("sequence", string), ("cdr3", category)]
+    clone_fields += [("fraction", pa.float64()), ("count", pa.int64())]
+    clone_fields += [("total", pa.int64())]
+    if approx:
+        stat_fields.append(("error", pa.float64()))
+        clone_fields.append(("error", pa.int64()))
+
+    tables = {}
+    if cluster_dist is not None:
+        from .cluster import cluster_clones
+
+        cdr3_cluster, (n_clusters, *clusters) = cluster_clones(counts, cluster_dist)
+        stats.append(("cdr3_clusters", "", n_clusters[4], "", ""))
+        clones = [row + (cdr3_cluster[row[1]],) for row in clones]
+        clone_fields.append(("cluster", category))
+        tables["clusters"] = _table(
+            [("cluster", string), ("cdr3", string), ("fraction", pa.float64())]
+            + [("count", pa.int64()), ("total", pa.int64())],
+            clusters,
+        )
+    tables["summ"] = _table(stat_fields, stats)
+    tables["clones"] = _table(clone_fields, clones)
+    return tables
+
+
+def write_summary_tables(counts, output_base, fmt, cluster_dist=None):
+    """
+    write the summary_tables of CloneCounts @counts to {output_base}_summ.{fmt},
+    {output_base}_clones.{fmt} and, with @cluster_dist, {output_base}_clusters.{fmt}
+    """
+    for name, (schema, columns) in summary_tables(counts, cluster_dist).items():
+        with ColumnarWriter(f"{output_base}_{name}.{fmt}", fmt, schema) as writer:
+            writer.write(columns)
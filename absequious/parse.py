@@ -1,7 +1,9 @@
+import copy
 import re
-from enum import Enum
+from functools import lru_cache
+from typing import NamedTuple
 
-from . import AlnState, Unreachable
+from . import AlnState
 from .utils import revcomp
 
 
@@ -13,40 +15,161 @@ class NoAlignmentFound(ValueError):
     pass
 
 
+# AlnState members, indexed by value, for decoding HMMAln.states
+_STATES = tuple(sorted(AlnState, key=lambda state: state.value))
+
+# the posterior probability of an aligned residue, by the digit hmmsearch displays for it
+_PP_VALUES = {str(digit): (digit + 0.5) / 10 for digit in range(10)}
+_PP_VALUES["*"] = 0.975
+
+# hmmsearch's column labels for the BestMatch fields that are named differently
+_BEST_MATCH_LABELS = {"c-Evalue": "c_evalue", "i-Evalue": "i_evalue"}
+
+
+class BestMatch(NamedTuple):
+    """
+    the coordinates and scores of the first domain reported for a target.  fields can also be
+    looked up by hmmsearch's column labels, eg best_match["c-Evalue"]
+    """
+
+    score: float
+    bias: float
+    c_evalue: float
+    i_evalue: float
+    hmm_from: int
+    hmm_to: int
+    tgt_from: int
+    tgt_to: int
+    env_from: int
+    env_to: int
+    acc: float
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return getattr(self, _BEST_MATCH_LABELS.get(key, key))
+        return tuple.__getitem__(self, key)
+
+
 class HMMAln:
     """
     attributes:
     - seq_id: best-matching target
-    - 
+    - read_id: the read that seq_id was translated from
+    - model: the name of the model (hmmsearch's query) aligned to
+    - best_match: BestMatch for the target's first domain
+    - score_and_eval: (score, conditional E-value) strings for the first domain
+    - residues: the aligned target residues, as ASCII bytes
+    - states: the AlnState value of each of residues, as bytes
+    - annots: residues and states as a list of (residue, AlnState) tuples, built on demand
+    - dna_seq: the read's DNA, in the target's frame
+    - tgt_seq: the target's full translation
     """
 
+    __slots__ = (
+        "seq_id",
+        "read_id",
+        "model",
+        "best_match",
+        "score_and_eval",
+        "residues",
+        "states",
+        "dna_seq",
+        "tgt_seq",
+    )
+
     _domain_re = re.compile(
-        r"== domain .* score: ([-+]?\d*\.?\d+) bits;  conditional E-value: ([-+]?\d*\.?\d+)"
+        r"== domain .* score: ([-+]?\d*\.?\d+) bits;  "
+        r"conditional E-value: ([-+]?\d*\.?\d+(?:[eE][-+]?\d+)?)"
     )
+    _aln_line_re = re.compile(r"\s*(\S+)\s+(\d+) (\S+) (\d+)")
 
     def __init__(self, input, dna_seq, translated):
-        blocks = HMMAln.split_at_boundaries(
-            input,
-            [
-                ("Domain annotation for each sequence", None),
-                ("Alignments for each domain", "seq_table"),
-                ("Internal pipeline statistics summary", "alignments"),
-            ],
-        )
-        self._blocks = blocks
+        try:
+            blocks = next(HMMAln.iter_targets(input))
+        except StopIteration:
+            raise NoAlignmentFound()
+        self._init_from_blocks(blocks, dna_seq, translated)
+
+    @classmethod
+    def from_blocks(cls, blocks, dna_seq, translated):
+        """
+        build an alignment from a single target's "seq_table" and "alignments" blocks, as
+        produced by iter_targets
+        """
+        aln = cls.__new__(cls)
+        aln._init_from_blocks(blocks, dna_seq, translated)
+        return aln
+
+    @classmethod
+    def from_parts(
+        cls,
+        seq_id,
+        best_match,
+        score_and_eval,
+        residues,
+        states,
+        dna_seq,
+        translated,
+        model=None,
+    ):
+        """
+        build an alignment from already-parsed fields, eg from tabular hmmsearch output.
+        @residues and @states are as returned by pack_annots
+        """
+        aln = cls.__new__(cls)
+        aln.seq_id, aln.best_match, aln.model = seq_id, best_match, model
+        aln._init_seqs(dna_seq, translated)
+        aln.score_and_eval = score_and_eval
+        aln.residues, aln.states = residues, states
+        return aln
+
+    def _init_from_blocks(self, blocks, dna_seq, translated):
         self.seq_id, self.best_match = HMMAln.parse_seq_table(blocks["seq_table"])
+        self.model = blocks.get("query")
+        self._init_seqs(dna_seq, translated)
+        self.score_and_eval, annots = HMMAln.parse_aln(
+            self.seq_id, blocks["alignments"]
+        )
+        self.residues, self.states = HMMAln.pack_annots(annots)
 
+    def _init_seqs(self, dna_seq, translated):
         self.tgt_seq = translated[self.seq_id]
-        comp, offs = self.seq_id.split(":")[-2:]
+        self.read_id, comp, offs = self.seq_id.rsplit(":", 2)
         if not offs.startswith("offset_"):
             raise ParseError(f'WTF offset "{offs}"')
         self.dna_seq = (dna_seq if comp == "fwd" else revcomp(dna_seq))[int(offs[7:]) :]
-        self.tgt_len = len(self.tgt_seq)
 
-        self.score_and_eval, self.annots = HMMAln.parse_aln(
-            self.seq_id, blocks["alignments"]
+    @property
+    def tgt_len(self):
+        return len(self.tgt_seq)
+
+    @property
+    def annots(self):
+        return list(zip(self.residues.decode(), map(_STATES.__getitem__, self.states)))
+
+    @staticmethod
+    def pack_annots(annots):
+        """
+        convert a list of (residue, AlnState) tuples, as returned by parse_aln, to
+        (residues, states) bytes
+        """
+        return (
+            "".join(tgt for tgt, _ in annots).encode(),
+            bytes(state.value for _, state in annots),
         )
 
+    def for_read(self, read_id):
+        """
+        return this alignment as it would be for read @read_id, which has the same DNA
+        sequence as the aligned read
+        """
+        if read_id == self.read_id:
+            return self
+        aln = copy.copy(self)
+        aln.seq_id = read_id + self.seq_id[len(self.read_id) :]
+        aln.read_id = read_id
+        return aln
+
     @staticmethod
     def parse_seq_table(block):
         if (
@@ -66,8 +189,8 @@ class HMMAln:
             )
         seq_id = block[0][3:].strip()
         iden = lambda x: x
-        best_match = dict(
-            (label, conv(value))
+        best_match = [
+            conv(value)
             for (label, conv), value in zip(
                 (
                     (None, iden),
@@ -90,27 +213,43 @@ class HMMAln:
                 block[3].split(),
             )
             if label
-        )
-        if len(best_match) != 11:
+        ]
+        if len(best_match) != len(BestMatch._fields):
             raise ParseError(
                 "couldn't parse block starting with 'Domain annotation for each sequence': table"
             )
-        return seq_id, best_match
+        return seq_id, BestMatch(*best_match)
 
     @staticmethod
     def parse_aln(seq_id, block):
         score_and_eval = HMMAln._domain_re.match(block[0]).groups() if block else None
-        if len(block) < 5 or not score_and_eval or not block[3].startswith(seq_id):
+        if (
+            len(block) < 5
+            or not score_and_eval
+            or not block[3].lstrip().startswith(seq_id)
+        ):
             raise ParseError(
                 "couldn't parse block starting with 'Domain annotation for each sequence': format"
             )
         _, ref_st, ref_guide, ref_end = block[1].split()
-        scores = block[2].strip()
         tgt_id, tgt_st, tgt_guide, tgt_end = block[3].split()
+        # the guide line is only meaningful column-by-column, and may begin or end with
+        # spaces, so slice it using the position of the target sequence
+        guide_start = HMMAln._aln_line_re.match(block[3]).start(3)
+        scores = block[2].ljust(guide_start + len(tgt_guide))[guide_start:]
         if seq_id != tgt_id:
             raise ParseError(
                 "inconsistent target names: '{}' != '{}'".format(tgt_id, seq_id)
             )
+        return score_and_eval, HMMAln.guide_annots(ref_guide, scores, tgt_guide)
+
+    @staticmethod
+    def guide_annots(ref_guide, scores, tgt_guide):
+        """
+        annotate an alignment as hmmsearch displays it, given the model's line, the line
+        marking identities and positive scores, and the target's line.  returns a list of
+        (residue, AlnState) tuples
+        """
         annots = []
         for ref, score, tgt in zip(ref_guide, scores, tgt_guide):
             if ref == ".":
@@ -123,43 +262,299 @@ class HMMAln:
                 annots.append((tgt, AlnState.delete))
             else:
                 annots.append((tgt, AlnState.mismatch))
-        return score_and_eval, annots
+        return annots
 
     @staticmethod
-    def split_at_boundaries(input, boundaries):
-        """iterate over input, splitting at boundary strings.  return a dictionary mapping boundary name to subsequent lines of text"""
+    def iter_targets(input):
+        """
+        iterate over a (possibly multi-target, multi-query) hmmsearch report line by line,
+        yielding a dictionary with "seq_table" and "alignments" keys for each target as soon
+        as its section ends, and "query", the name of the query it was found by.  targets
+        are yielded in the order reported by hmmsearch (ie, best-scoring first within each
+        query)
 
-        # make a mutable copy
-        boundaries = boundaries[:]
-
-        ret = {}
-        curr_bound, curr_nom, buff = "", None, []
+        lines are stripped, except for the four lines following each "== domain" header,
+        which are kept intact so that the alignment columns line up
+        """
+        blocks, curr_nom, in_annots, verbatim = None, None, False, 0
+        query = None
         for line_ in input:
+            if verbatim:
+                blocks["alignments"].append(line_.rstrip("\r\n"))
+                verbatim -= 1
+                continue
             line = line_.strip()
-            if line.startswith(curr_bound):
-                if curr_nom:
-                    ret[curr_nom] = buff
-                buff = []
-                try:
-                    curr_bound, curr_nom = boundaries.pop(0)
-                except IndexError:
-                    break
+            if not in_annots:
+                in_annots = line.startswith("Domain annotation for each sequence")
+                if line.startswith("Query:"):
+                    query = line.split()[1]
+            elif line.startswith(">>") or line.startswith(
+                "Internal pipeline statistics summary"
+            ):
+                if blocks:
+                    yield blocks
+                blocks = None
+                if line.startswith(">>"):
+                    blocks = {"seq_table": [line], "alignments": [], "query": query}
+                    curr_nom = "seq_table"
+                else:
+                    in_annots = False
+            elif line.startswith("Alignments for each domain"):
+                curr_nom = "alignments"
+            elif line and blocks:
+                blocks[curr_nom].append(line)
+                if line.startswith("== domain"):
+                    verbatim = 4
+        if blocks:
+            yield blocks
+
+    @staticmethod
+    def iter_alignments(input, dna_seqs, translated):
+        """
+        iterate over the report of a single hmmsearch run over the six-frame translations of
+        many reads, yielding one alignment per target.  @dna_seqs maps read IDs to DNA
+        sequences, and @translated maps target IDs (of the form
+        "{read_id}:{direction}:offset_{n}") to protein sequences
+        """
+        for blocks in HMMAln.iter_targets(input):
+            read_id = blocks["seq_table"][0][3:].strip().rsplit(":", 2)[0]
+            yield HMMAln.from_blocks(blocks, dna_seqs[read_id], translated)
+
+    @staticmethod
+    def iter_domtbl(input):
+        """
+        iterate over a --domtblout file, yielding a (seq_id, query_name, best_match,
+        score_and_eval) tuple for the first reported domain of each target, in the same
+        form as parse_seq_table and parse_aln
+        """
+        last = None
+        for line in input:
+            if line.startswith("#"):
+                continue
+            fields = line.split(None, 22)
+            if len(fields) < 22:
+                raise ParseError("couldn't parse --domtblout line", line)
+            if (fields[0], fields[3]) == last:
+                continue
+            last = (fields[0], fields[3])
+            best_match = BestMatch(
+                score=float(fields[13]),
+                bias=float(fields[14]),
+                c_evalue=float(fields[11]),
+                i_evalue=float(fields[12]),
+                hmm_from=int(fields[15]),
+                hmm_to=int(fields[16]),
+                tgt_from=int(fields[17]),
+                tgt_to=int(fields[18]),
+                env_from=int(fields[19]),
+                env_to=int(fields[20]),
+                acc=float(fields[21]),
+            )
+            yield fields[0], fields[3], best_match, (fields[13], fields[11])
+
+    @staticmethod
+    def iter_stockholm(input, names=None):
+        """
+        iterate over the alignments in a (possibly multi-block) Stockholm file, as written by
+        hmmsearch -A, yielding (name, reference_annotation, rows) tuples, where rows maps
+        sequence names to aligned sequences.  if @names is given, only those rows are kept
+        """
+        msa_name, rf, rows = None, [], {}
+        for line in input:
+            if line.startswith("//"):
+                yield msa_name, "".join(rf), {k: "".join(v) for k, v in rows.items()}
+                msa_name, rf, rows = None, [], {}
+            elif line.startswith("#=GF ID"):
+                msa_name = line.split()[2]
+            elif line.startswith("#=GC RF"):
+                rf.append(line.split()[2])
+            elif line.startswith("#") or not line.strip():
+                continue
             else:
-                if line:
-                    buff.append(line)
-        if buff and curr_nom:
-            ret[curr_nom] = buff
-        return ret
-
-
-def annot_fmt(annots):
-    return "".join(
-        {
-            AlnState.mismatch: "x",
-            AlnState.insert: "i",
-            AlnState.match_high: "M",
-            AlnState.match_low: "M",
-            AlnState.delete: "d",
-        }[a]
-        for _, a in annots
-    )
+                name, aligned = line.split()
+                if names is None or name in names:
+                    rows.setdefault(name, []).append(aligned)
+
+    @staticmethod
+    def rf_columns(rf):
+        """
+        given the reference annotation of an hmmsearch -A alignment, return a tuple of:
+        - the model node of each column (0 for insert columns)
+        - the column of each node (indexed from 1)
+        """
+        col_nodes, node_cols = [], [None]
+        for col, ref in enumerate(rf):
+            if ref in ".-":
+                col_nodes.append(0)
+            else:
+                node_cols.append(col)
+                col_nodes.append(len(node_cols) - 1)
+        return col_nodes, node_cols
+
+    @staticmethod
+    def stockholm_annots(model, rf_columns, row, hmm_from, hmm_to):
+        """
+        annotate one row of an hmmsearch -A alignment, returning a list of
+        (residue, AlnState) tuples identical to those built by parse_aln from the text
+        report.  @model is the absequious.hmm.HMMModel the row was aligned to, and
+        @rf_columns is returned by rf_columns
+        """
+        col_nodes, node_cols = rf_columns
+        states = _match_states(model)
+        start, end = node_cols[hmm_from], node_cols[hmm_to] + 1
+        annots = []
+        for node, tgt in zip(col_nodes[start:end], row[start:end]):
+            if node:
+                annots.append((tgt, states[node].get(tgt, AlnState.mismatch)))
+            elif tgt != ".":
+                annots.append((tgt, AlnState.insert))
+        return annots
+
+    @staticmethod
+    def iter_tabular_alignments(domtbl, sto, models, dna_seqs, translated):
+        """
+        alternative to iter_alignments, building alignments from the --domtblout (@domtbl)
+        and -A (@sto) output of a single hmmsearch run.  @models maps model names to
+        absequious.hmm.HMMModel objects
+        """
+        hits = list(HMMAln.iter_domtbl(domtbl))
+        names = set(
+            f"{seq_id}/{best_match.tgt_from}-{best_match.tgt_to}"
+            for seq_id, _, best_match, _ in hits
+        )
+        msas = {
+            msa_name: (HMMAln.rf_columns(rf), rows)
+            for msa_name, rf, rows in HMMAln.iter_stockholm(sto, names)
+        }
+        for seq_id, query_name, best_match, score_and_eval in hits:
+            rf_columns, rows = msas[query_name]
+            name = f"{seq_id}/{best_match.tgt_from}-{best_match.tgt_to}"
+            if name not in rows:
+                raise ParseError(f"no alignment found for {name}")
+            annots = HMMAln.stockholm_annots(
+                models[query_name],
+                rf_columns,
+                rows[name],
+                best_match.hmm_from,
+                best_match.hmm_to,
+            )
+            read_id = seq_id.rsplit(":", 2)[0]
+            yield HMMAln.from_parts(
+                seq_id,
+                best_match,
+                score_and_eval,
+                *HMMAln.pack_annots(annots),
+                dna_seqs[read_id],
+                translated,
+                query_name,
+            )
+
+    @staticmethod
+    def iter_hit_alignments(hits, dna_seqs, translated):
+        """
+        alternative to iter_alignments, building alignments straight from the hits of an
+        in-process search (pyhmmer.plan7.TopHits), one per reported target, as hmmsearch
+        would report them
+        """
+        for hit in hits.reported:
+            domain = next(iter(hit.domains.reported))
+            ali = domain.alignment
+            # hmmsearch's acc is the mean posterior probability of the aligned residues,
+            # estimated here from the probabilities as displayed
+            pps = [
+                _PP_VALUES[pp] for pp in ali.posterior_probabilities if pp in _PP_VALUES
+            ]
+            best_match = BestMatch(
+                score=domain.score,
+                bias=domain.bias,
+                c_evalue=domain.c_evalue,
+                i_evalue=domain.i_evalue,
+                hmm_from=ali.hmm_from,
+                hmm_to=ali.hmm_to,
+                tgt_from=ali.target_from,
+                tgt_to=ali.target_to,
+                env_from=domain.env_from,
+                env_to=domain.env_to,
+                acc=sum(pps) / max(len(pps), 1),
+            )
+            score_and_eval = (f"{domain.score:.1f}", f"{domain.c_evalue:.2g}")
+            annots = HMMAln.guide_annots(
+                ali.hmm_sequence, ali.identity_sequence, ali.target_sequence
+            )
+            yield HMMAln.from_parts(
+                hit.name,
+                best_match,
+                score_and_eval,
+                *HMMAln.pack_annots(annots),
+                dna_seqs[hit.name.rsplit(":", 2)[0]],
+                translated,
+                hits.query.name,
+            )
+
+    @staticmethod
+    def iter_best(alignments):
+        """
+        filter @alignments down to the best alignment for each read, yielding (read_id,
+        alignment) tuples.  each model's alignments come best-scoring first, so a read's
+        first alignment to a model is its best there.  when several models align a read,
+        it's yielded again each time a later model scores it higher, so the last
+        alignment yielded for each read is the best over all of them
+        """
+        seen, best = set(), {}
+        for aln in alignments:
+            read_id = aln.read_id
+            if (read_id, aln.model) in seen:
+                continue
+            seen.add((read_id, aln.model))
+            prev = best.get(read_id)
+            if prev is None or aln.best_match.score > prev.best_match.score:
+                best[read_id] = aln
+                yield read_id, aln
+
+    @staticmethod
+    def parse_batch(input, dna_seqs, translated):
+        """
+        parse the report of a single hmmsearch run over the six-frame translations of many
+        reads.  returns a dictionary mapping read ID to the alignment of its best-scoring
+        frame (and model); reads without any alignment are omitted
+        """
+        return dict(
+            HMMAln.iter_best(HMMAln.iter_alignments(input, dna_seqs, translated))
+        )
+
+
+@lru_cache(maxsize=None)
+def _match_states(model):
+    """
+    for each match state of @model, a dictionary mapping residues to the AlnState that
+    hmmsearch's alignment display implies; residues not in the dictionary are mismatches
+    """
+    ret = [None]
+    for node in range(1, model.length + 1):
+        states = dict.fromkeys(model.positives[node], AlnState.match_low)
+        states[model.consensus[node].upper()] = AlnState.match_high
+        states["-"] = AlnState.delete
+        ret.append(states)
+    return ret
+
+
+_ANNOT_FMT = bytes.maketrans(
+    bytes(state.value for state in _STATES),
+    bytes(
+        ord(
+            {
+                AlnState.mismatch: "x",
+                AlnState.insert: "i",
+                AlnState.match_high: "M",
+                AlnState.match_low: "M",
+                AlnState.delete: "d",
+            }[state]
+        )
+        for state in _STATES
+    ),
+)
+
+
+def annot_fmt(aln):
+    """format the states of HMMAln @aln as a string, one character per aligned residue"""
+    return aln.states.translate(_ANNOT_FMT).decode()
@@ -0,0 +1,290 @@
+"""
+reading FASTA and FASTQ files of reads, plain or compressed with gzip, bgzip or zstd, as
+(read_id, dna) tuples
+
+plain and bgzip-compressed files can also be split into ranges of bytes (ReadRange), so that
+each worker process reads its own part of the file: a read belongs to the range its first
+line starts in, and a range is read from the first read starting in it
+"""
+
+import gzip
+import io
+import os
+import zlib
+from itertools import chain
+from typing import NamedTuple, Optional
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+# files are split into ranges of about this many (compressed) bytes
+RANGE_BYTES = 4 << 20
+
+
+class ReadsFormatError(ValueError):
+    pass
+
+
+def _compression(path):
+    """the compression of the file at @path: None, "gzip", "bgzf" or "zstd" """
+    with open(path, "rb") as f:
+        head = f.read(18)
+    if head.startswith(ZSTD_MAGIC):
+        return "zstd"
+    if not head.startswith(GZIP_MAGIC):
+        return None
+    # BGZF blocks are gzip members with a "BC" extra subfield, giving the block's size
+    if len(head) == 18 and head[3] & 4 and head[12:14] == b"BC":
+        return "bgzf"
+    return "gzip"
+
+
+def _open_zstd(path):
+    try:
+        import zstandard
+    except ImportError:
+        raise ReadsFormatError(
+            f"{path} is zstd-compressed: reading it needs the zstandard package"
+        )
+    return io.TextIOWrapper(zstandard.open(path, "rb"))
+
+
+def open_reads(path):
+    """open the file of reads at @path for reading as text, decompressing it if need be"""
+    compression = _compression(path)
+    if compression in ("gzip", "bgzf"):
+        # a BGZF file is a series of gzip members, which gzip reads in turn
+        return gzip.open(path, "rt")
+    if compression == "zstd":
+        return _open_zstd(path)
+    return open(path)
+
+
+def _iter_fasta(lines):
+    read_id, seq = None, []
+    for line in lines:
+        if line.startswith(">"):
+            if read_id is not None:
+                yield read_id, "".join(seq)
+            read_id, seq = (line[1:].split(None, 1) or [""])[0], []
+        elif read_id is not None:
+            seq.append(line.strip())
+    if read_id is not None:
+        yield read_id, "".join(seq)
+
+
+def _iter_fastq(lines):
+    lines = iter(lines)
+    for header in lines:
+        if not header.strip():
+            continue
+        seq, plus, qual = next(lines, ""), next(lines, ""), next(lines, "")
+        seq = seq.strip()
+        if (
+            not header.startswith("@")
+            or not plus.startswith("+")
+            or len(qual.strip()) != len(seq)
+        ):
+            raise ReadsFormatError(f"malformed FASTQ record: {header.strip()}")
+        yield (header[1:].split(None, 1) or [""])[0], seq
+
+
+def iter_reads(fin):
+    """
+    iterate over the reads in @fin, an open FASTA or FASTQ file (told apart by their first
+    character), yielding (read_id, dna) tuples.  read IDs are the first word of each
+    header.  FASTQ records must be of four lines each
+    """
+    for line in fin:
+        if line.strip():
+            break
+    else:
+        return
+    lines = chain([line], fin)
+    if line.startswith(">"):
+        yield from _iter_fasta(lines)
+    elif line.startswith("@"):
+        yield from _iter_fastq(lines)
+    else:
+        raise ReadsFormatError(f"not FASTA or FASTQ: {line.strip()[:40]}")
+
+
+class ReadRange(NamedTuple):
+    """
+    a range of a plain or BGZF file of reads: the reads whose first lines start at or after
+    @start and before @end (or the end of the file, if None).  positions are byte offsets,
+    or for BGZF, virtual offsets.  @sync_from is any position before @start (or @start,
+    if it's that of the first read), to read from to find the first line starting in range
+    """
+
+    path: str
+    fastq: bool
+    bgzf: bool
+    sync_from: int
+    start: int
+    end: Optional[int]
+
+
+def _bgzf_blocks(path):
+    """the offset of each BGZF block in the file at @path"""
+    offsets = []
+    with open(path, "rb") as f:
+        offset = 0
+        while True:
+            header = f.read(18)
+            if len(header) < 18:
+                break
+            if not header.startswith(GZIP_MAGIC) or header[12:14] != b"BC":
+                raise ReadsFormatError(f"{path}: bad BGZF block at byte {offset}")
+            offsets.append(offset)
+            offset += int.from_bytes(header[16:18], "little") + 1
+            f.seek(offset)
+    return offsets
+
+
+def split_ranges(path, n):
+    """
+    split the plain or BGZF file of reads at @path into about @n ReadRanges, in order.
+    returns None if the file can't be split, being compressed some other way
+    """
+    compression = _compression(path)
+    if compression not in (None, "bgzf"):
+        return None
+    with open_reads(path) as fin:
+        fastq = next(fin, "").startswith("@")
+
+    size = os.path.getsize(path)
+    if compression == "bgzf":
+        # split at the first block starting after each 1/n of the file
+        blocks = _bgzf_blocks(path)
+        starts, i = [0], 0
+        for k in range(1, n):
+            while i < len(blocks) and blocks[i] < size * k // n:
+                i += 1
+            if i < len(blocks) and blocks[i] > starts[-1]:
+                starts.append(blocks[i])
+        previous = dict(zip(blocks[1:], blocks))
+        sync_from = [previous.get(start, 0) << 16 for start in starts]
+        starts = [start << 16 for start in starts]
+    else:
+        starts = sorted({size * k // n for k in range(n)})
+        sync_from = [max(start - 1, 0) for start in starts]
+    ends = starts[1:] + [None]
+    return [
+        ReadRange(path, fastq, compression == "bgzf", *r)
+        for r in zip(sync_from, starts, ends)
+    ]
+
+
+class _BgzfReader:
+    """
+    the lines of the BGZF file at @path, a block at a time.  positions are virtual offsets,
+    as Bio.bgzf has them: the offset of a block in the file << 16, plus the offset within
+    its decompressed data.  at the end of a block, tell() gives the start of the next
+    """
+
+    def __init__(self, path):
+        self._f = open(path, "rb")
+        self._load(0)
+
+    def _load(self, start):
+        self._f.seek(start)
+        header = self._f.read(18)
+        self._start, self._pos = start, 0
+        if len(header) < 18:
+            self._data, self._next = b"", None
+            return
+        size = int.from_bytes(header[16:18], "little") + 1
+        self._next = start + size
+        # each block is a whole gzip member
+        self._data = zlib.decompress(header + self._f.read(size - 18), 31)
+
+    def seek(self, offset):
+        if offset >> 16 != self._start:
+            self._load(offset >> 16)
+        self._pos = offset & 0xFFFF
+
+    def tell(self):
+        if self._pos and self._pos == len(self._data) and self._next is not None:
+            return self._next << 16
+        return self._start << 16 | self._pos
+
+    def readline(self):
+        parts = []
+        while True:
+            while self._pos >= len(self._data):
+                if self._next is None:
+                    return b"".join(parts)
+                self._load(self._next)
+            i = self._data.find(b"\n", self._pos)
+            end = len(self._data) if i < 0 else i + 1
+            parts.append(self._data[self._pos : end])
+            self._pos = end
+            if i >= 0:
+                return b"".join(parts)
+
+    def close(self):
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _open_range(r):
+    if r.bgzf:
+        return _BgzfReader(r.path)
+    return open(r.path, "rb")
+
+
+def _sync(f, r):
+    """move @f, an open binary file, to the first read of ReadRange @r"""
+    f.seek(r.sync_from)
+    if r.start > r.sync_from:
+        # from anywhere before the range, the next line starts after the first newline
+        f.readline()
+        while f.tell() < r.start and f.readline():
+            pass
+    while True:
+        pos = f.tell()
+        line = f.readline()
+        if not line:
+            break
+        if not r.fastq:
+            if line.startswith(b">"):
+                break
+            continue
+        # in FASTQ, quality lines may also start with "@" (or ">"), but aren't followed by
+        # a line, then a "+" line
+        if line.startswith(b"@"):
+            f.readline()
+            if f.readline().startswith(b"+"):
+                break
+            f.seek(pos)
+            f.readline()
+    f.seek(pos)
+
+
+def _range_lines(f, r):
+    """the lines of the reads of ReadRange @r in @f, positioned at its first read"""
+    n = 0
+    while True:
+        pos = f.tell()
+        line = f.readline()
+        if not line:
+            return
+        # stop at the first read starting after the range
+        if r.end is not None and pos >= r.end:
+            if n % 4 == 0 if r.fastq else line.startswith(b">"):
+                return
+        n += 1
+        yield line.decode()
+
+
+def iter_range(r):
+    """iterate over the reads of ReadRange @r, as (read_id, dna) tuples"""
+    with _open_range(r) as f:
+        _sync(f, r)
+        lines = _range_lines(f, r)
+        yield from (_iter_fastq if r.fastq else _iter_fasta)(lines)
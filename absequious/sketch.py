@@ -0,0 +1,278 @@
+"""
+bounded-memory clone counting, for repertoires too deep to count every unique sequence:
+the most frequent clones are found with Space-Saving, and the numbers of unique sequences,
+singletons and doubletons behind chao1 are estimated from a hash-based sample of them
+"""
+
+import hashlib
+import heapq
+import math
+from collections import Counter
+from itertools import compress
+
+from .algo import CloneCounts, ReportTable, _clean, chao1
+
+# width of the error bounds, in standard errors (~95%)
+Z = 1.96
+
+
+def seq_hash(seq):
+    """a stable hash of @seq, uniform on [0, 1)"""
+    digest = hashlib.blake2b(seq.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") / 2**64
+
+
+class SpaceSaving:
+    """
+    the heavy hitters of a stream, keeping at most @capacity items (Metwally et al. 2005).
+    counts[item] is [count, error]: the item's true count is between count - error and
+    count, and every item occurring more than total / capacity times is kept
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.total = 0
+        self.counts = {}
+        # (count, item) for each item kept; counts are updated lazily, so may be stale
+        self._heap = []
+
+    def update(self, item, n=1):
+        """count @item @n more times, returning the item evicted to make room, if any"""
+        self.total += n
+        entry = self.counts.get(item)
+        if entry is not None:
+            entry[0] += n
+            return None
+        evicted, floor = None, 0
+        if len(self.counts) >= self.capacity:
+            evicted, floor = self._pop_min()
+        self.counts[item] = [floor + n, floor]
+        heapq.heappush(self._heap, (floor + n, item))
+        return evicted
+
+    def _pop_min(self):
+        while True:
+            ct, item = heapq.heappop(self._heap)
+            current = self.counts[item][0]
+            if current == ct:
+                del self.counts[item]
+                return item, ct
+            heapq.heappush(self._heap, (current, item))
+
+    def most_common(self):
+        """(item, count, error) for the items kept, most frequent first"""
+        # ties in the order kept, as Counter.most_common does
+        return sorted(
+            ((item, ct, err) for item, (ct, err) in self.counts.items()),
+            key=lambda t: t[1],
+            reverse=True,
+        )
+
+    def merge(self, other):
+        """
+        add the counts of SpaceSaving @other, keeping the largest (Agarwal et al. 2012).
+        items dropped by either side might have had up to its smallest count there
+        """
+        floors = [s._floor() for s in (self, other)]
+        merged = {}
+        for side, s in enumerate((self, other)):
+            for item, (ct, err) in s.counts.items():
+                acc = merged.setdefault(item, [0, 0, [False, False]])
+                acc[0] += ct
+                acc[1] += err
+                acc[2][side] = True
+        for acc in merged.values():
+            for side, seen in enumerate(acc[2]):
+                if not seen:
+                    acc[0] += floors[side]
+                    acc[1] += floors[side]
+        kept = heapq.nlargest(self.capacity, merged.items(), key=lambda kv: kv[1][0])
+        self.counts = {item: [ct, err] for item, (ct, err, _) in kept}
+        self._heap = [(ct, item) for item, (ct, _) in self.counts.items()]
+        heapq.heapify(self._heap)
+        self.total += other.total
+        return self
+
+    def _floor(self):
+        """the most an item that isn't kept can have occurred"""
+        if len(self.counts) < self.capacity:
+            return 0
+        return min(ct for ct, _ in self.counts.values())
+
+
+class DistinctSample:
+    """
+    a uniform sample of the distinct items in a stream: the @size with the smallest hashes,
+    counted exactly (a bottom-k, or KMV, sketch).  an item is only ever sampled from its
+    first occurrence, as the largest hash sampled can only go down
+    """
+
+    def __init__(self, size):
+        self.size = size
+        # item -> [hash, count, good count]
+        self.counts = {}
+        # (-hash, item), a max-heap of the hashes sampled
+        self._heap = []
+        self.saturated = False
+
+    def update(self, item, n=1, good=0):
+        entry = self.counts.get(item)
+        if entry is not None:
+            entry[1] += n
+            entry[2] += good
+            return
+        h = seq_hash(item)
+        if len(self.counts) >= self.size:
+            # items are being left out, so that the estimates aren't exact
+            self.saturated = True
+            if h >= -self._heap[0][0]:
+                return
+            _, dropped = heapq.heappop(self._heap)
+            del self.counts[dropped]
+        self.counts[item] = [h, n, good]
+        heapq.heappush(self._heap, (-h, item))
+
+    def n_distinct(self):
+        """estimate the number of distinct items seen, and its standard error"""
+        k = len(self.counts)
+        # with too small a sample to estimate from, give the number seen in it
+        if not self.saturated or k <= 2:
+            return k, 0.0
+        est = (k - 1) / -self._heap[0][0]
+        return est, est / math.sqrt(k - 2)
+
+    def n_with(self, index, ct):
+        """
+        estimate the number of distinct items with count (@index 1) or good count (@index
+        2) @ct, and its standard error
+        """
+        k = len(self.counts)
+        hits = sum(1 for entry in self.counts.values() if entry[index] == ct)
+        if not self.saturated:
+            return hits, 0.0
+        n, n_err = self.n_distinct()
+        p = hits / k
+        # from the errors of the number of items and of the fraction of them with the count
+        return n * p, math.sqrt((p * n_err) ** 2 + n**2 * p * (1 - p) / k)
+
+    def merge(self, other):
+        """add the sample of DistinctSample @other, of the same size"""
+        for item, (h, ct, good) in other.counts.items():
+            entry = self.counts.get(item)
+            if entry is not None:
+                entry[1] += ct
+                entry[2] += good
+            else:
+                self.counts[item] = [h, ct, good]
+        self.saturated |= other.saturated
+        if len(self.counts) > self.size:
+            self.saturated = True
+            kept = heapq.nsmallest(
+                self.size, self.counts.items(), key=lambda kv: kv[1][0]
+            )
+            self.counts = dict(kept)
+        self._heap = [(-h, item) for item, (h, _, _) in self.counts.items()]
+        heapq.heapify(self._heap)
+        return self
+
+
+class ApproxCloneCounts(CloneCounts):
+    """
+    CloneCounts in bounded memory: the @max_clones most frequent complete, frameshift-free
+    sequences and the @max_clones most frequent CDR3s are kept, and the numbers of unique
+    sequences, singletons and doubletons are estimated from a sample of @max_clones of them.
+    the failed/complete/frameshift/stop totals are exact, as is everything else until there
+    are more than @max_clones unique sequences (or CDR3s)
+    """
+
+    def __init__(self, max_clones):
+        super().__init__()
+        self.max_clones = max_clones
+        self.clones = SpaceSaving(max_clones)
+        self.sample = DistinctSample(max_clones)
+        self.cdr3s = SpaceSaving(max_clones)
+
+    def add(self, row):
+        """count a row of the reads report, as returned by report_row"""
+        self.add_table(ReportTable.from_rows([row]))
+
+    def add_table(self, table, failed=0):
+        good = self._add_totals(table, failed)
+        seqs = table["sequence"]
+        cdr3s = table.cdr3s()
+        for cdr3, ct in Counter(cdr3s).items():
+            self.cdr3s.update(cdr3, ct)
+        cdr3s = dict(zip(seqs, _clean(cdr3s)))
+        good_ctr = Counter(compress(seqs, good))
+        for seq, ct in Counter(seqs).items():
+            self.sample.update(seq, ct, good_ctr[seq])
+        for seq, ct in good_ctr.items():
+            evicted = self.clones.update(seq, ct)
+            if evicted is not None:
+                del self.seq_to_cdr3[evicted]
+            self.seq_to_cdr3[seq] = cdr3s[seq]
+
+    def merge(self, other):
+        self._merge_totals(other)
+        self.clones.merge(other.clones)
+        self.sample.merge(other.sample)
+        self.cdr3s.merge(other.cdr3s)
+        self.seq_to_cdr3.update(other.seq_to_cdr3)
+        self.seq_to_cdr3 = {seq: self.seq_to_cdr3[seq] for seq in self.clones.counts}
+        return self
+
+    def good_clones(self):
+        return ((seq, ct) for seq, (ct, _) in self.clones.counts.items())
+
+    def cdr3_freq(self):
+        """
+        as CloneCounts.cdr3_freq, with an extra column: the most each count may be
+        overestimated by.  CDR3s are listed if they surely have at least 2 reads
+        """
+        tot = self.total
+        cdr3_cts = sorted(self.cdr3s.most_common())
+        cdr3_cts.sort(key=(lambda item: item[1]), reverse=True)
+        return [
+            (cdr3, ct / tot, ct, tot, err)
+            for cdr3, ct, err in cdr3_cts
+            if ct - err >= 2
+        ]
+
+    def chao1(self):
+        """estimate chao1, and its standard error"""
+        (n, n_err), (f1, f1_err), (f2, f2_err) = (
+            self.sample.n_distinct(),
+            self.sample.n_with(1, 1),
+            self.sample.n_with(1, 2),
+        )
+        # propagate the errors, taking them to be independent
+        d_f1 = (2 * f1 - 1) / (2 * (f2 + 1))
+        d_f2 = -f1 * (f1 - 1) / (2 * (f2 + 1) ** 2)
+        err = math.sqrt(n_err**2 + (d_f1 * f1_err) ** 2 + (d_f2 * f2_err) ** 2)
+        return chao1(n, f1, f2), err
+
+    def full_seq_freq(self):
+        """
+        as CloneCounts.full_seq_freq, with an extra column: for estimates, the half-width of
+        their ~95% interval, and for clones the most their count may be overestimated by.
+        clones are listed if they surely have at least 2 reads
+        """
+        tot = self.total
+        est, err = self.chao1()
+        singletons, s_err = self.sample.n_with(2, 1)
+        ret = [
+            ("chao1_estimated_diversity", "", "", "", est, Z * err),
+            (
+                "unique_singleton_sequences",
+                "",
+                singletons / tot,
+                singletons,
+                tot,
+                Z * s_err,
+            ),
+            ("", "", "", "", "", ""),
+        ]
+        for seq, ct, err in self.clones.most_common():
+            if ct - err >= 2:
+                ret.append((seq, self.seq_to_cdr3[seq], ct / tot, ct, tot, err))
+        return ret
@@ -2,9 +2,12 @@ import sys
 from enum import Enum
 import inspect
 import os
-from Bio.Seq import Seq
+import re
+from itertools import product
 from pathlib import Path
 
+import numpy as np
+
 
 class Dir(Enum):
     fwd = 0
@@ -16,14 +19,48 @@ def translate(dna):
     translate DNA sequence to protein
     raises Bio.Data.CodonTable.TranslationError
     """
+    from Bio.Seq import Seq
+
     return str(Seq(dna).translate())
 
 
+# standard genetic code, indexed by 16 * b1 + 4 * b2 + b3 where A=0, C=1, G=2, T=3
+CODON_TABLE = "KNKNTTTTRSRSIIMIQHQHPPPPRRRRLLLLEDEDAAAAGGGGVVVV*Y*YSSSS*CWCLFLF"
+
+# map ASCII to base codes: A=0, C=1, G=2, T=3, N=4; anything else is invalid (255)
+_ENCODE = np.full(256, 255, dtype=np.uint8)
+for _code, _bases in enumerate(("Aa", "Cc", "Gg", "Tt", "Nn")):
+    for _b in _bases:
+        _ENCODE[ord(_b)] = _code
+_COMPLEMENT = np.array([3, 2, 1, 0, 4], dtype=np.uint8)
+
+
+def _codon_lut():
+    """
+    extend CODON_TABLE to codons containing N, indexed by 25 * b1 + 5 * b2 + b3.  as with
+    Biopython, an ambiguous codon translates to the amino acid (or stop) that all of its
+    possible expansions agree on, and to X otherwise
+    """
+    lut = np.zeros(125, dtype=np.uint8)
+    for b1, b2, b3 in product(range(5), repeat=3):
+        aas = set(
+            CODON_TABLE[16 * x1 + 4 * x2 + x3]
+            for x1 in (range(4) if b1 == 4 else (b1,))
+            for x2 in (range(4) if b2 == 4 else (b2,))
+            for x3 in (range(4) if b3 == 4 else (b3,))
+        )
+        lut[25 * b1 + 5 * b2 + b3] = ord(aas.pop() if len(aas) == 1 else "X")
+    return lut
+
+
+_CODON_LUT = _codon_lut()
+
+_REVCOMP = str.maketrans("ACGTN", "TGCAN")
+
+
 def revcomp(dna):
     """reverse compliment"""
-    return "".join(
-        {"A": "T", "T": "A", "G": "C", "C": "G", "N": "N"}[b] for b in dna.upper()[::-1]
-    )
+    return dna.upper().translate(_REVCOMP)[::-1]
 
 
 def translate_six(dna):
@@ -31,23 +68,96 @@ def translate_six(dna):
     returns six translations, as tulples:
         (direction, offset, translation)
     """
-    ret = []
-    for rc in (False, True):
-        for offset in range(3):
-            # to avoid biopython warnings, we need to trim any partial codons, but we don't
-            # want to @trim to be set to 0, or we'll get an empty string
-            trim = -1 * ((len(dna) - offset) % 3) or None
-
-            ret.append(
-                (
-                    Dir.rev_comp if rc else Dir.fwd,
-                    offset,
-                    translate(revcomp(dna)[offset:trim] if rc else dna[offset:trim]),
+    return translate_six_batch([dna])[0]
+
+
+def translate_six_batch(dnas):
+    """
+    six-frame translate a batch of DNA sequences at once.  returns a list with one entry per
+    sequence, each a list of six (direction, offset, translation) tuples, as translate_six.
+
+    the whole batch is encoded into a single array, so that reverse complementing and
+    translation are done with table lookups over every read at once.  raises KeyError for
+    sequences containing anything other than A, C, G, T or N
+    """
+    if not dnas:
+        return []
+    lens = np.fromiter(map(len, dnas), dtype=np.int64, count=len(dnas))
+    ends = np.cumsum(lens)
+    total = int(ends[-1])
+    codes = _ENCODE[
+        np.frombuffer("".join(dnas).encode("ascii", "replace"), dtype=np.uint8)
+    ]
+    if (codes == 255).any():
+        bad = int(np.argmax(codes == 255))
+        raise KeyError("".join(dnas)[bad].upper())
+
+    ret = [[] for _ in dnas]
+    for direction, seq_codes in (
+        (Dir.fwd, codes),
+        (Dir.rev_comp, _COMPLEMENT[codes[::-1]]),
+    ):
+        # translate the codon starting at every position of the concatenated batch, then
+        # pick out each read's frames with strided slices
+        aas = _CODON_LUT[
+            25 * seq_codes[:-2] + 5 * seq_codes[1:-1] + seq_codes[2:]
+        ].tobytes()
+        # reversing the batch also reverses the order of the reads
+        starts = ends - lens if direction is Dir.fwd else total - ends
+        for frames, start, length in zip(ret, starts.tolist(), lens.tolist()):
+            for offset in range(3):
+                n_codons = max(0, (length - offset) // 3)
+                first = start + offset
+                frames.append(
+                    (
+                        direction,
+                        offset,
+                        aas[first : first + 3 * n_codons : 3].decode("ascii"),
+                    )
                 )
-            )
     return ret
 
 
+# conserved VH framework motifs: the FR1 cysteine, the start and end of FR2, the start and
+# cysteine at the end of FR3, and the FR4 "WGxG"
+VH_ANCHORS = tuple(
+    re.compile(pattern)
+    for pattern in (
+        "[LIVM][ST]C[AKTVE][AVGT]S",
+        "W[VIF]RQ",
+        "L[EQ]W[VIML]",
+        "[RK][FVLA]T[IMVL][ST]",
+        "Y[YF]C",
+        "WG[QKR]G",
+    )
+)
+ANCHOR_BONUS = 50
+
+
+def frame_score(protein):
+    """
+    cheap plausibility score for a translated reading frame: the length of its longest
+    stop-free stretch, plus ANCHOR_BONUS for each VH anchor motif found in that stretch
+    """
+    return max(
+        len(seg) + ANCHOR_BONUS * sum(1 for anchor in VH_ANCHORS if anchor.search(seg))
+        for seg in protein.split("*")
+    )
+
+
+def prefilter_frames(frames, top_k):
+    """
+    given a read's translations, as returned by translate_six, keep only the @top_k
+    highest-scoring frames (see frame_score), in their original order
+    """
+    if top_k >= len(frames):
+        return frames
+    ranked = sorted(
+        range(len(frames)), key=lambda i: frame_score(frames[i][2]), reverse=True
+    )
+    return [frames[i] for i in sorted(ranked[:top_k])]
+
+
 def get_script_dir(follow_symlinks=True):
     """
     https://stackoverflow.com/questions/3718657/how-to-properly-determine-current-script-directory/22881871#22881871
@@ -0,0 +1,83 @@
+"""
+time cluster.cluster_cdr3s as the number of unique CDR3s grows, checking it against comparing
+every pair on the smallest
+
+CDR3s are drawn from a pool of random "true" CDR3s of 10 to 20 residues, each with a few
+variants carrying one or two substitutions, as PCR and sequencing errors would give
+
+usage: python benchmarks/bench_cluster.py [-n NUM_CDR3S [NUM_CDR3S ...]] [--max-dist D]
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from absequious.cluster import cluster_cdr3s
+
+AMINO_ACIDS = "ACDEFGHIKLMNPQRSTVWY"
+# variants of each true CDR3
+VARIANTS = 4
+
+
+def synthesize(n, seed=0):
+    """return @n distinct CDR3s"""
+    rng = random.Random(seed)
+    cdr3s = set()
+    while len(cdr3s) < n:
+        true = "".join(rng.choices(AMINO_ACIDS, k=rng.randint(10, 20)))
+        cdr3s.add(true)
+        for _ in range(VARIANTS):
+            variant = list(true)
+            for pos in rng.sample(range(len(true)), rng.randint(1, 2)):
+                variant[pos] = rng.choice(AMINO_ACIDS)
+            cdr3s.add("".join(variant))
+    return sorted(cdr3s)[:n]
+
+
+def pairwise(cdr3s, max_dist):
+    """cluster by comparing every pair, with union-find"""
+    parent = list(range(len(cdr3s)))
+
+    def find(i):
+        while parent[i] != i:
+            i = parent[i]
+        return i
+
+    for i, a in enumerate(cdr3s):
+        for j in range(i):
+            b = cdr3s[j]
+            if len(a) == len(b) and sum(x != y for x, y in zip(a, b)) <= max_dist:
+                root_i, root_j = find(i), find(j)
+                parent[max(root_i, root_j)] = min(root_i, root_j)
+    labels = {}
+    return [labels.setdefault(find(i), len(labels)) for i in range(len(cdr3s))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "-n", type=int, nargs="+", default=[2000, 20000, 200000, 2000000]
+    )
+    parser.add_argument("--max-dist", type=int, default=1)
+    args = parser.parse_args()
+
+    for i, n in enumerate(args.n):
+        cdr3s = synthesize(n)
+        start = time.perf_counter()
+        labels = cluster_cdr3s(cdr3s, args.max_dist)
+        secs = time.perf_counter() - start
+        line = f"{n:9d} CDR3s {max(labels) + 1:9d} clusters {secs:8.2f}s"
+        if i == 0:
+            start = time.perf_counter()
+            assert pairwise(cdr3s, args.max_dist) == labels
+            line += f"  (every pair: {time.perf_counter() - start:.2f}s)"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
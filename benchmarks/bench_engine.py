@@ -0,0 +1,65 @@
+"""
+compare aln throughput (reads/s) with each alignment engine (aln --engine): running hmmsearch
+on each batch of reads, or searching in process with pyhmmer, checking that both produce the
+same alignments.  requires hmmsearch and pyhmmer
+
+each engine is timed over --repeat runs, with the best reported, at each batch size; smaller
+batches make hmmsearch's startup and the HMM's loading a larger share of the work
+
+usage: python benchmarks/bench_engine.py [-j JOBS] [--batch-size N [N ...]] [--repeat N]
+    [--hmm HMM] [READS.fa]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from absequious.__main__ import DEFAULT_HMM, iter_pipeline, iter_reads, open_reads
+
+ENGINES = ("subprocess", "inprocess")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "reads", nargs="?", default=ROOT / "tests" / "fixtures" / "KY199430_1.fa"
+    )
+    parser.add_argument("-j", type=int, default=1, help="worker processes")
+    parser.add_argument("--batch-size", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--hmm", default=DEFAULT_HMM)
+    args = parser.parse_args()
+
+    with open_reads(args.reads) as fin:
+        reads = list(iter_reads(fin))
+
+    print(f"{len(reads)} reads, -j {args.j}")
+    for batch_size in args.batch_size:
+        expected, rates = None, {}
+        for engine in ENGINES:
+            best = None
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                alns = list(
+                    iter_pipeline(reads, args.hmm, batch_size, args.j, engine=engine)
+                )
+                secs = time.perf_counter() - start
+                best = secs if best is None else min(best, secs)
+
+            got = [aln and (aln.seq_id, aln.annots) for aln in alns]
+            assert expected is None or got == expected, f"--engine {engine} differs"
+            expected = got
+            rates[engine] = len(reads) / best
+            print(
+                f"--batch-size {batch_size:<5d} --engine {engine:<10s} {best:8.2f}s  "
+                f"{rates[engine]:10.1f} reads/s"
+            )
+        print(f"inprocess speedup {rates['inprocess'] / rates['subprocess']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+measure the memory held by parsed alignments: the compact, slotted HMMAln record against the
+previous layout (a __dict__ instance holding the raw text blocks, a best_match dictionary and a
+list of (residue, AlnState) tuples), reported per 1M alignments
+
+alignments are copies of the first target of the KY199430_1_batch fixture, with their strings
+copied so that nothing is shared between them, as when parsing hmmsearch output.  sequences
+are cut to the length of a typical VH amplicon read
+
+usage: python benchmarks/bench_memory.py [-n NUM_ALIGNMENTS]
+"""
+
+import argparse
+import gc
+import sys
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from absequious.parse import HMMAln
+
+FIXTURES = ROOT / "tests" / "fixtures"
+
+
+class LegacyAln:
+    """the attributes HMMAln used to keep for each alignment"""
+
+    def __init__(self, aln, blocks):
+        self._blocks = {k: [_copy(line) for line in v] for k, v in blocks.items()}
+        self.seq_id, self.read_id = _copy(aln.seq_id), _copy(aln.read_id)
+        self.best_match = aln.best_match._asdict()
+        self.score_and_eval = tuple(map(_copy, aln.score_and_eval))
+        self.annots = aln.annots
+        self.dna_seq, self.tgt_seq = _copy(aln.dna_seq), _copy(aln.tgt_seq)
+        self.tgt_len = len(self.tgt_seq)
+
+
+def _copy(s):
+    return (s + ".")[:-1]
+
+
+def compact(aln, blocks):
+    return HMMAln.from_parts(
+        _copy(aln.seq_id),
+        aln.best_match._make(aln.best_match),
+        tuple(map(_copy, aln.score_and_eval)),
+        bytes(bytearray(aln.residues)),
+        bytes(bytearray(aln.states)),
+        _copy(aln.dna_seq),
+        {aln.seq_id: _copy(aln.tgt_seq)},
+    )
+
+
+def measure(build, n, aln, blocks):
+    gc.collect()
+    tracemalloc.start()
+    keep = [build(aln, blocks) for _ in range(n)]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del keep
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-n", type=int, default=100000, help="number of alignments")
+    args = parser.parse_args()
+
+    with open(FIXTURES / "KY199430_1.fa") as f:
+        dna = "".join(line.strip() for line in f if not line.startswith(">"))
+    with open(FIXTURES / "KY199430_1_batch_hmmsearch.txt") as f:
+        blocks = next(HMMAln.iter_targets(f))
+    seq_id = "KY199430.1:fwd:offset_2"
+    aln = HMMAln.from_blocks(blocks, dna, {seq_id: "X"})
+    # the fixture is a whole plasmid; use the sizes of a typical VH amplicon read
+    aln.dna_seq, aln.tgt_seq = aln.dna_seq[:450], "X" * 150
+
+    for name, build in (("legacy", LegacyAln), ("compact", compact)):
+        size = measure(build, args.n, aln, blocks)
+        print(
+            f"{name:8s} {size / args.n:8.0f} bytes/alignment  "
+            f"{size * 1e6 / args.n / 2**20:8.0f} MiB per 1M alignments"
+        )
+
+
+if __name__ == "__main__":
+    main()
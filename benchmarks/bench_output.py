@@ -0,0 +1,82 @@
+"""
+compare writing the reads report as CSV, Parquet and Arrow IPC (see absequious/output.py):
+the seconds to write it, the size of the file, and the seconds to load it back, into a
+pandas DataFrame (with read_csv, or from the pyarrow table) and, for the columnar formats,
+as a pyarrow table
+
+rows are synthesized as in bench_report.py, and written a batch at a time as aln writes them
+
+usage: python benchmarks/bench_output.py [-n NUM_ROWS] [--clones NUM_CLONES]
+    [--batch-size N]
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+from absequious import algo, output
+from bench_report import synthesize
+
+
+def write(rows, path, fmt, batch_size):
+    if fmt == "csv":
+        writer = output.CSVReportWriter(open(path, "w"), algo.DEFAULT_LAYOUT)
+    else:
+        writer = output.ColumnarReportWriter(path, fmt, algo.DEFAULT_LAYOUT)
+    with writer:
+        for i in range(0, len(rows), batch_size):
+            writer.write(algo.ReportTable.from_rows(rows[i : i + batch_size]))
+
+
+def load(path, fmt):
+    """load @path into a pandas DataFrame, returning (seconds, seconds as a pyarrow table)"""
+    import pandas as pd
+    import pyarrow.feather
+    import pyarrow.parquet
+
+    start = time.perf_counter()
+    if fmt == "csv":
+        pd.read_csv(path)
+        return time.perf_counter() - start, None
+    read_table = (
+        pyarrow.parquet.read_table if fmt == "parquet" else pyarrow.feather.read_table
+    )
+    table = read_table(path)
+    arrow_secs = time.perf_counter() - start
+    table.to_pandas()
+    return time.perf_counter() - start, arrow_secs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-n", type=int, default=100000, help="number of report rows")
+    parser.add_argument("--clones", type=int, default=20000, help="number of clones")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    rows = synthesize(args.n, args.clones)
+    print(f"{args.n} rows")
+    print(f"  {'format':8s} {'write':>9s} {'size':>10s} {'pandas':>9s} {'pyarrow':>9s}")
+    with TemporaryDirectory() as temp_dir:
+        for fmt in output.FORMATS:
+            path = Path(temp_dir) / f"reads.{fmt}"
+            start = time.perf_counter()
+            write(rows, path, fmt, args.batch_size)
+            write_secs = time.perf_counter() - start
+            pandas_secs, arrow_secs = load(path, fmt)
+            size = os.path.getsize(path) / 1e6
+            arrow = f"{arrow_secs:8.3f}s" if arrow_secs is not None else f"{'-':>9s}"
+            print(
+                f"  {fmt:8s} {write_secs:8.3f}s {size:8.1f}MB {pandas_secs:8.3f}s {arrow}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+compare the time taken to parse hmmsearch output with the text-report parser
+(HMMAln.iter_alignments) and the --domtblout/-A parser (HMMAln.iter_tabular_alignments)
+
+synthetic reports are built by replicating the first target of the KY199430_1_batch fixtures
+
+usage: python benchmarks/bench_parse.py [-n NUM_ALIGNMENTS]
+"""
+
+import argparse
+import sys
+import time
+from io import StringIO
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from absequious import utils
+from absequious.hmm import load_models
+from absequious.parse import HMMAln
+
+FIXTURES = ROOT / "tests" / "fixtures"
+HMM = ROOT / "absequious" / "data" / "ighv.hmm"
+TARGET = "KY199430.1:fwd:offset_2"
+
+
+def synthesize(n):
+    """
+    return (text_report, domtbl, sto, dna_seqs, translated) for @n copies of the fixture's
+    first target
+    """
+    text = (FIXTURES / "KY199430_1_batch_hmmsearch.txt").read_text().splitlines(True)
+    start = next(i for i, line in enumerate(text) if line.startswith(">>"))
+    end = next(i for i, line in enumerate(text) if i > start and line.startswith(">>"))
+    stats = next(
+        i for i, line in enumerate(text) if line.startswith("Internal pipeline")
+    )
+    section = "".join(text[start:end])
+    domtbl_rows = [
+        line
+        for line in (FIXTURES / "KY199430_1_batch.domtblout")
+        .read_text()
+        .splitlines(True)
+        if line.startswith(TARGET + " ")
+    ]
+    sto = (FIXTURES / "KY199430_1_batch.sto").read_text().splitlines(True)
+    sto_rows = [line for line in sto if line.startswith(TARGET + "/")]
+    rf = [line for line in sto if line.startswith("#=GC RF")]
+
+    dna = _fixture_dna()
+    frames = {
+        f"{comp.name}:offset_{offset}": seq
+        for comp, offset, seq in utils.translate_six(dna)
+    }
+    names = [f"synth{i}" for i in range(n)]
+    dna_seqs = {name: dna for name in names}
+    translated = {
+        f"{name}:{frame}": seq for name in names for frame, seq in frames.items()
+    }
+
+    text_report = "".join(text[:start])
+    text_report += "".join(section.replace("KY199430.1", name) for name in names)
+    text_report += "".join(text[stats:])
+    domtbl = "".join(
+        row.replace("KY199430.1", name) for name in names for row in domtbl_rows
+    )
+    sto_text = "# STOCKHOLM 1.0\n#=GF ID ighv\n\n"
+    sto_text += "".join(
+        row.replace("KY199430.1", name) for name in names for row in sto_rows
+    )
+    sto_text += "".join(rf) + "//\n"
+    return text_report, domtbl, sto_text, dna_seqs, translated
+
+
+def _fixture_dna():
+    with open(FIXTURES / "KY199430_1.fa") as f:
+        return "".join(line.strip() for line in f if not line.startswith(">"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-n", type=int, default=100000, help="number of alignments")
+    args = parser.parse_args()
+
+    text_report, domtbl, sto, dna_seqs, translated = synthesize(args.n)
+    models = load_models(HMM)
+
+    start = time.perf_counter()
+    n_text = sum(
+        1 for _ in HMMAln.iter_alignments(StringIO(text_report), dna_seqs, translated)
+    )
+    text_secs = time.perf_counter() - start
+
+    start = time.perf_counter()
+    n_tab = sum(
+        1
+        for _ in HMMAln.iter_tabular_alignments(
+            StringIO(domtbl), StringIO(sto), models, dna_seqs, translated
+        )
+    )
+    tab_secs = time.perf_counter() - start
+
+    assert n_text == n_tab == args.n
+    for name, secs in (("text", text_secs), ("tabular", tab_secs)):
+        print(
+            f"{name:8s} {secs:8.2f}s  {secs * 100000 / args.n:8.2f}s per 100k alignments"
+        )
+
+
+if __name__ == "__main__":
+    main()
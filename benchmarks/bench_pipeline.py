@@ -0,0 +1,239 @@
+"""
+time each stage of aln over synthetic repertoires (see repertoire.py), and aln end to end,
+recording the results to a history file and flagging stages that got slower than the last
+run with the same settings
+
+the stages are timed one after another over each batch of reads, in a single process and
+without collapsing duplicate reads:
+  translate_six  six-frame translation (utils.translate_six_batch, with prefilter_frames)
+  alignment      hmmsearch over the batch's translations
+  parse          parsing hmmsearch's report (HMMAln.parse_batch)
+  report         the reads report (algo.ReportTable.from_alignments)
+  full_seq_freq  clone counting (CloneCounts.add_table) and the summary's clone frequencies
+end_to_end then runs python -m absequious aln over the whole file, as from the command line.
+without HMMER installed, --replay RECORDING replays hmmsearch's output as recorded by
+hmmsearch_replay.py record, over a repertoire generated with the same options and at least
+as many reads
+
+each run appends a JSON line to --history, with the settings, the git commit and the seconds
+and reads/s of each stage; with --check, the exit status is 1 if any stage was more than
+--tolerance slower than in the last run recorded with the same settings on the same host
+
+usage: python benchmarks/bench_pipeline.py [-n NUM_READS [NUM_READS ...]] [--batch-size N]
+    [-j JOBS] [--engine ENGINE] [--replay RECORDING] [--history PATH] [--no-history]
+    [--check] [--tolerance FRACTION] [repertoire options]
+"""
+
+import argparse
+import io
+import json
+import platform
+import subprocess
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+from tempfile import NamedTemporaryFile, TemporaryDirectory
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+from absequious import algo, utils
+from absequious.__main__ import DEFAULT_HMM, FRAMES_PER_READ, batches, iter_reads
+from absequious.parse import HMMAln
+from hmmsearch_replay import install_stand_in
+from repertoire import add_repertoire_arguments, repertoire_from_args, write_reads
+
+STAGES = ("translate_six", "alignment", "parse", "report", "full_seq_freq")
+REPERTOIRE_OPTIONS = (
+    "clones",
+    "clone_dist",
+    "shm_rate",
+    "error_rate",
+    "frameshift_rate",
+    "stop_rate",
+    "rc_fraction",
+    "seed",
+)
+
+
+def time_stages(reads, batch_size, hmm):
+    """
+    time each of STAGES over @reads, (read_id, dna) tuples, a batch at a time, returning
+    their seconds
+    """
+    secs = Counter()
+    counts = algo.CloneCounts()
+    for batch in batches(reads, batch_size):
+        start = time.perf_counter()
+        translated = {}
+        for (read_id, _), frames in zip(
+            batch, utils.translate_six_batch([dna for _, dna in batch])
+        ):
+            for comp, offset, seq in utils.prefilter_frames(frames, FRAMES_PER_READ):
+                translated[f"{read_id}:{comp.name}:offset_{offset}"] = seq
+        secs["translate_six"] += time.perf_counter() - start
+
+        with NamedTemporaryFile("w", suffix=".fa") as trans_f:
+            trans_f.write("".join(f">{k}\n{v}\n" for k, v in translated.items()))
+            trans_f.flush()
+            start = time.perf_counter()
+            cmd = ["hmmsearch", "--notextw", "-Z", str(FRAMES_PER_READ)]
+            proc = subprocess.run(
+                cmd + [str(hmm), trans_f.name],
+                stdout=subprocess.PIPE,
+                text=True,
+                check=True,
+            )
+            secs["alignment"] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        alns = HMMAln.parse_batch(io.StringIO(proc.stdout), dict(batch), translated)
+        chunk = [alns.get(read_id) for read_id, _ in batch]
+        secs["parse"] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        aligned = [aln for aln in chunk if aln is not None]
+        table = algo.ReportTable.from_alignments(aligned)
+        secs["report"] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        counts.add_table(table, len(chunk) - len(aligned))
+        secs["full_seq_freq"] += time.perf_counter() - start
+
+    start = time.perf_counter()
+    counts.full_seq_freq()
+    secs["full_seq_freq"] += time.perf_counter() - start
+    return secs
+
+
+def time_end_to_end(reads_fname, out_dir, jobs, batch_size, engine):
+    """run aln over @reads_fname, returning its seconds and the metrics it recorded"""
+    metrics_fname = Path(out_dir) / "metrics.json"
+    cmd = [sys.executable, "-m", "absequious", "-j", str(jobs), "aln", reads_fname]
+    cmd += [
+        "--output_base",
+        str(Path(out_dir) / "out"),
+        "--batch-size",
+        str(batch_size),
+    ]
+    cmd += ["--engine", engine, "--metrics", str(metrics_fname)]
+    start = time.perf_counter()
+    subprocess.run(cmd, cwd=ROOT, check=True, stderr=subprocess.DEVNULL)
+    secs = time.perf_counter() - start
+    with open(metrics_fname) as fin:
+        return secs, json.load(fin)
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def last_result(history, settings):
+    """the last result in @history (a path) with the same @settings, or None"""
+    last = None
+    if history.exists():
+        with open(history) as fin:
+            for line in fin:
+                result = json.loads(line)
+                if result["settings"] == settings:
+                    last = result
+    return last
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "-n", type=int, nargs="+", default=[1000, 10000], help="numbers of reads"
+    )
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("-j", type=int, default=1, help="jobs for end_to_end")
+    parser.add_argument(
+        "--engine", choices=("subprocess", "inprocess"), default="subprocess"
+    )
+    parser.add_argument("--hmm", default=DEFAULT_HMM)
+    parser.add_argument(
+        "--replay", metavar="RECORDING", help="replay hmmsearch from RECORDING"
+    )
+    parser.add_argument(
+        "--history", type=Path, default=ROOT / "benchmarks" / "history.jsonl"
+    )
+    parser.add_argument(
+        "--no-history", action="store_true", help="don't record results"
+    )
+    parser.add_argument("--check", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    add_repertoire_arguments(parser)
+    args = parser.parse_args()
+
+    regressed = []
+    with TemporaryDirectory() as temp_dir:
+        if args.replay:
+            install_stand_in(args.replay, temp_dir)
+        for n in args.n:
+            reads_fname = str(Path(temp_dir) / f"reads_{n}.fa")
+            with open(reads_fname, "w") as fout:
+                write_reads(repertoire_from_args(args).reads(n), fout)
+            with open(reads_fname) as fin:
+                secs = time_stages(iter_reads(fin), args.batch_size, args.hmm)
+            secs["end_to_end"], metrics = time_end_to_end(
+                reads_fname, temp_dir, args.j, args.batch_size, args.engine
+            )
+
+            settings = {
+                "n": n,
+                "batch_size": args.batch_size,
+                "jobs": args.j,
+                "engine": args.engine,
+                "replay": bool(args.replay),
+                "host": platform.node(),
+            }
+            settings.update((k, getattr(args, k)) for k in REPERTOIRE_OPTIONS)
+            result = {
+                "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "commit": git_commit(),
+                "python": platform.python_version(),
+                "settings": settings,
+                "stages": {
+                    stage: {"secs": round(s, 4), "reads_per_s": round(n / s, 1)}
+                    for stage, s in secs.items()
+                },
+                "end_to_end_metrics": metrics,
+            }
+            last = last_result(args.history, settings)
+
+            print(f"{n} reads")
+            for stage in STAGES + ("end_to_end",):
+                line = (
+                    f"  {stage:14s} {secs[stage]:9.3f}s {n / secs[stage]:12.1f} reads/s"
+                )
+                if last and stage in last["stages"]:
+                    change = secs[stage] / last["stages"][stage]["secs"] - 1
+                    line += f"  {change:+7.1%} vs {last['commit']}"
+                    if change > args.tolerance:
+                        line += " *"
+                        regressed.append((n, stage))
+                print(line)
+            if not args.no_history:
+                with open(args.history, "a") as fout:
+                    fout.write(json.dumps(result) + "\n")
+
+    if regressed:
+        print(f"* more than {args.tolerance:.0%} slower than the last run")
+        if args.check:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+compare aggregating the reads report (summary, full_seq_freq and cdr3_freq) the way algo used
+to, with a pandas DataFrame walked with iterrows and groupby().apply, against algo.ReportTable
+and CloneCounts.add_table, checking that both agree
+
+rows are copies of the KY199430.1 fixture's report row, with random CDR3s drawn from a pool
+of clones of skewed sizes
+
+usage: python benchmarks/bench_report.py [-n NUM_ROWS] [--clones NUM_CLONES]
+"""
+
+import argparse
+import random
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from skbio.diversity import alpha
+
+from absequious import algo, utils
+from absequious.parse import HMMAln
+
+FIXTURES = ROOT / "tests" / "fixtures"
+
+
+def legacy_summary(report, alns):
+    failed = sum(1 for x in alns if x is None)
+    tot = len(report) + failed
+    return (
+        ("failed", "", failed / tot, failed, tot),
+        (
+            "complete",
+            "",
+            report["complete?"].sum() / tot,
+            report["complete?"].sum(),
+            tot,
+        ),
+        (
+            "frameshift",
+            "",
+            report["frameshift?"].sum() / tot,
+            report["frameshift?"].sum(),
+            tot,
+        ),
+        ("stop_codon", "", report["stop?"].sum() / tot, report["stop?"].sum(), tot),
+    )
+
+
+def legacy_cdr3_freq(report, alns):
+    failed = sum(1 for x in alns if x is None)
+    tot = len(report) + failed
+    cdr3_cts = []
+    report.groupby("H-CDR3")["H-CDR3"].apply(
+        lambda x: cdr3_cts.append((x.values[0], len(x) / tot, len(x), tot))
+    )
+    cdr3_cts.sort(key=(lambda row: row[1]), reverse=True)
+    return [t for t in cdr3_cts if t[2] > 1]
+
+
+def legacy_full_seq_freq(report, alns):
+    failed = sum(1 for x in alns if x is None)
+    tot = len(report) + failed
+    good_ctr, all_ctr, seq_to_cdr3 = Counter(), Counter(), {}
+    for _, row in report.iterrows():
+        seq = "".join(row[domain] for domain, _ in algo.DOMAIN_LENS)
+        seq = seq.replace("-", "").upper()
+        seq_to_cdr3[seq] = row["H-CDR3"].replace("-", "").upper()
+        all_ctr[seq] += 1
+        if row["complete?"] and not row["frameshift?"]:
+            good_ctr[seq] += 1
+
+    singletons, ret = 0, []
+    for seq, ct in good_ctr.most_common():
+        if ct < 2:
+            singletons += 1
+        else:
+            ret.append((seq, seq_to_cdr3[seq], ct / tot, ct, tot))
+    ret.insert(0, ("", "", "", "", ""))
+    ret.insert(0, ("unique_singleton_sequences", "", singletons / tot, singletons, tot))
+    ret.insert(
+        0,
+        ("chao1_estimated_diversity", "", "", "", alpha.chao1(list(all_ctr.values()))),
+    )
+    return ret
+
+
+def synthesize(n, n_clones, seed=0):
+    with open(FIXTURES / "KY199430_1.fa") as f:
+        dna = "".join(line.strip() for line in f if not line.startswith(">"))
+    translated = {
+        f"KY199430.1:{comp.name}:offset_{offset}": seq
+        for comp, offset, seq in utils.translate_six(dna)
+    }
+    with open(FIXTURES / "KY199430_1_batch_hmmsearch.txt") as f:
+        aln = next(HMMAln.iter_alignments(f, {"KY199430.1": dna}, translated))
+    template = algo.report_row(aln)
+    cdr3 = algo.REPORT_COLUMNS.index("H-CDR3")
+
+    rng = random.Random(seed)
+    clones = [
+        "".join(rng.choice("ACDEFGHIKLMNPQRSTVWY") for _ in range(rng.randint(8, 18)))
+        for _ in range(n_clones)
+    ]
+    weights = [1 / (rank + 1) for rank in range(n_clones)]
+    rows = []
+    for i, clone in enumerate(rng.choices(clones, weights, k=n)):
+        row = list(template)
+        row[0] = f"read{i}"
+        row[cdr3] = clone
+        row[-3] = rng.random() < 0.9
+        rows.append(row)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-n", type=int, default=1000000, help="number of report rows")
+    parser.add_argument("--clones", type=int, default=50000, help="number of clones")
+    args = parser.parse_args()
+
+    rows = synthesize(args.n, args.clones)
+    alns = [None] * 10 + [True] * len(rows)
+
+    import pandas as pd
+
+    start = time.perf_counter()
+    df = pd.DataFrame(rows, columns=algo.REPORT_COLUMNS)
+    expected = (
+        legacy_summary(df, alns),
+        legacy_full_seq_freq(df, alns),
+        legacy_cdr3_freq(df, alns),
+    )
+    legacy_secs = time.perf_counter() - start
+
+    start = time.perf_counter()
+    table = algo.ReportTable.from_rows(rows)
+    counts = algo.CloneCounts()
+    counts.add_table(table, failed=10)
+    got = (counts.summary(), counts.full_seq_freq(), algo.cdr3_freq(table, alns))
+    columnar_secs = time.perf_counter() - start
+
+    assert got == expected
+    for name, secs in (("pandas", legacy_secs), ("columnar", columnar_secs)):
+        print(f"{name:9s} {secs:8.2f}s  {args.n / secs:12.0f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
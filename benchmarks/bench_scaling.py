@@ -0,0 +1,53 @@
+"""
+measure aln throughput (reads/s) with 1 to N worker processes (aln -j), checking that every
+run produces the same alignments.  requires hmmsearch
+
+usage: python benchmarks/bench_scaling.py [-j MAX_JOBS] [--batch-size N] [--hmm HMM] [READS.fa]
+"""
+
+import argparse
+import multiprocessing
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from absequious.__main__ import DEFAULT_HMM, iter_pipeline, iter_reads, open_reads
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "reads", nargs="?", default=ROOT / "tests" / "fixtures" / "KY199430_1.fa"
+    )
+    parser.add_argument(
+        "-j", type=int, default=multiprocessing.cpu_count(), help="most workers tried"
+    )
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--hmm", default=DEFAULT_HMM)
+    args = parser.parse_args()
+
+    with open_reads(args.reads) as fin:
+        reads = list(iter_reads(fin))
+
+    expected, base_rate = None, None
+    for jobs in range(1, args.j + 1):
+        start = time.perf_counter()
+        alns = list(iter_pipeline(reads, args.hmm, args.batch_size, jobs))
+        secs = time.perf_counter() - start
+
+        got = [aln and (aln.seq_id, aln.annots) for aln in alns]
+        assert expected is None or got == expected, f"-j {jobs} output differs"
+        expected = got
+
+        rate = len(reads) / secs
+        base_rate = base_rate or rate
+        print(
+            f"-j {jobs:<3d} {secs:8.2f}s  {rate:10.1f} reads/s  {rate / base_rate:5.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+compare the accuracy and memory use of counting clones in bounded memory
+(sketch.ApproxCloneCounts, aln --max-clones) against exact counting (algo.CloneCounts)
+
+reads are drawn from a pool of clones with Zipf-distributed sizes, so that there are a few
+large clones and many singletons, and counted a batch at a time as run_pipeline does.  for
+each --max-clones, reports the memory held by the counts, the errors of the chao1 and
+singleton estimates (and whether the exact value is within the reported bounds), and how
+many of the largest clones are found, with the largest error in their counts
+
+usage: python benchmarks/bench_sketch.py [-n NUM_READS] [--clones NUM_CLONES]
+    [--max-clones N [N ...]]
+"""
+
+import argparse
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from absequious import algo
+from absequious.sketch import ApproxCloneCounts
+
+BATCH_SIZE = 500
+TOP = 100
+FR1_TO_FR3 = (
+    "EVQLVESGGGLVQPGGSLRLSCAASGFNIKDTYIHWVRQAPGKGLEWVARIYPTNGYTRYADSVKGRFTISADTSKNTAYLQMNSLR"
+    "AEDTAVYYC"
+)
+FR4 = "WGQGTLVTVSS"
+AMINO_ACIDS = np.frombuffer(b"ACDEFGHIKLMNPQRSTVWY", dtype=np.uint8)
+
+
+def synthesize(n, clones, seed=0):
+    """return the clone of each of @n reads, and the CDR3 of each of @clones clones"""
+    rng = np.random.default_rng(seed)
+    read_clones = (rng.zipf(1.2, size=n) - 1) % clones
+    cdr3s = rng.choice(AMINO_ACIDS, size=(clones, 13)).tobytes().decode()
+    return read_clones, [cdr3s[i : i + 13] for i in range(0, len(cdr3s), 13)]
+
+
+def tables(read_clones, cdr3s):
+    """the reads as ReportTables of BATCH_SIZE rows, with new strings for every row"""
+    rng = np.random.default_rng(1)
+    for start in range(0, len(read_clones), BATCH_SIZE):
+        batch = read_clones[start : start + BATCH_SIZE]
+        cdr3 = [cdr3s[i] for i in batch]
+        yield algo.ReportTable(
+            {
+                "read": [""] * len(batch),
+                "sequence": [f"{FR1_TO_FR3}{c}{FR4}" for c in cdr3],
+                "H-CDR3": cdr3,
+                "complete?": list(rng.random(len(batch)) < 0.95),
+                "frameshift?": list(rng.random(len(batch)) < 0.05),
+                "stop?": [False] * len(batch),
+            }
+        )
+
+
+def count(new_counts, read_clones, cdr3s):
+    """count the reads with @new_counts(), returning the counts, seconds and bytes held"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    counts = new_counts()
+    for table in tables(read_clones, cdr3s):
+        counts.add_table(table)
+    secs = time.perf_counter() - start
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return counts, secs, held
+
+
+def rel_err(got, expected):
+    return abs(got - expected) / expected if expected else float(got != expected)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-n", type=int, default=500000, help="number of reads")
+    parser.add_argument("--clones", type=int, default=200000, help="number of clones")
+    parser.add_argument(
+        "--max-clones", type=int, nargs="+", default=[1000, 3000, 10000, 30000]
+    )
+    args = parser.parse_args()
+
+    read_clones, cdr3s = synthesize(args.n, args.clones)
+    exact, secs, held = count(algo.CloneCounts, read_clones, cdr3s)
+    freq = exact.full_seq_freq()
+    chao1, singletons = freq[0][4], freq[1][3]
+    top = {row[0]: row[3] for row in freq[3 : 3 + TOP]}
+    print(
+        f"{len(exact.all_ctr)} unique sequences, chao1 {chao1:.0f}, "
+        f"{singletons} singletons"
+    )
+    print(
+        f"{'max-clones':>10s} {'MB':>8s} {'secs':>7s} {'chao1 err':>10s} "
+        f"{'singl err':>10s} {f'top{TOP} found':>11s} {'max ct err':>11s}"
+    )
+    print(f"{'exact':>10s} {held / 1e6:8.1f} {secs:7.2f}")
+
+    for max_clones in args.max_clones:
+        approx, secs, held = count(
+            lambda: ApproxCloneCounts(max_clones), read_clones, cdr3s
+        )
+        freq = approx.full_seq_freq()
+        _, _, _, _, est_chao1, chao1_bound = freq[0]
+        _, _, _, est_singletons, _, singletons_bound = freq[1]
+        found = {row[0]: row[3] for row in freq[3:] if row[0] in top}
+        ct_err = max((rel_err(found[s], top[s]) for s in found), default=0)
+        within = [
+            "*" if abs(est - exact_value) > bound else " "
+            for est, exact_value, bound in (
+                (est_chao1, chao1, chao1_bound),
+                (est_singletons, singletons, singletons_bound),
+            )
+        ]
+        print(
+            f"{max_clones:10d} {held / 1e6:8.1f} {secs:7.2f} "
+            f"{rel_err(est_chao1, chao1):9.1%}{within[0]} "
+            f"{rel_err(est_singletons, singletons):9.1%}{within[1]} "
+            f"{len(found):11d} {ct_err:11.1%}"
+        )
+    print("* the exact value is outside the reported bounds")
+
+
+if __name__ == "__main__":
+    main()
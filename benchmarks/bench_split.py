@@ -0,0 +1,149 @@
+"""
+compare splitting alignments into domains with the original recursive split_and_pad, the
+current split_and_pad (one alignment at a time) and algo.segment_batch (a batch at a time),
+checking that all three agree
+
+alignments are random pieces of the KY199430_1_batch fixture's alignments, with hmm_from
+adjusted to match, so that they cover partial and stripped domains
+
+usage: python benchmarks/bench_split.py [-n NUM_ALIGNMENTS] [--batch-size N]
+"""
+
+import argparse
+import copy
+import random
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from absequious import AlnState, Unreachable, algo, utils
+from absequious.parse import HMMAln
+
+FIXTURES = ROOT / "tests" / "fixtures"
+
+
+def split_and_pad_recursive(padding_ctr, aln, DOMS=algo.DOMAIN_LENS):
+    """split_and_pad as it was before segment_batch, for comparison"""
+
+    def split(domain_lens, strip_start, annots, start_pos, acc):
+        if domain_lens:
+            dom_name, dom_len = domain_lens[0]
+        else:
+            dom_name, dom_len = "", float("inf")
+        if strip_start:
+            if padding_ctr is not None:
+                for i in range(
+                    min(strip_start, dom_len if dom_len > 1 else strip_start)
+                ):
+                    acc.extend("-" for _ in range(padding_ctr.get(i, 1)))
+
+            if strip_start > dom_len:
+                return [(dom_name, "".join(acc))] + split(
+                    domain_lens[1:] if domain_lens else [],
+                    strip_start - dom_len,
+                    annots,
+                    0,
+                    [],
+                )
+            dom_len -= strip_start
+
+        for pos in range(start_pos, len(annots)):
+            tgt, state = annots[pos]
+            if state is AlnState.insert:
+                acc.append(tgt)
+            elif state is AlnState.delete:
+                acc.append("-")
+            elif state in (AlnState.match_high, AlnState.match_low):
+                acc.append(tgt.upper())
+            elif state is AlnState.mismatch:
+                acc.append(tgt.lower())
+            else:
+                raise Unreachable()
+
+            if padding_ctr is not None and padding_ctr.get(pos, 1) > 1:
+                acc.extend("-" for _ in range(padding_ctr[pos] - 1))
+
+            if state is not AlnState.insert:
+                dom_len -= 1
+                if dom_len < 1:
+                    return [(dom_name, "".join(acc))] + split(
+                        domain_lens[1:] if domain_lens else (), 0, annots, pos + 1, []
+                    )
+        return [(dom_name, "".join(acc))] if acc else []
+
+    return split(DOMS, aln.best_match.hmm_from, aln.annots, 0, [])
+
+
+def synthesize(n, seed=0):
+    """return @n alignments cut at random from the fixture's alignments"""
+    with open(FIXTURES / "KY199430_1.fa") as f:
+        dna = "".join(line.strip() for line in f if not line.startswith(">"))
+    reads = {"KY199430.1": dna, "KY199430.1_rc": utils.revcomp(dna)}
+    with open(FIXTURES / "KY199430_1_batch_hmmsearch.txt") as f:
+        alns = [aln for aln in HMMAln.iter_alignments(f, reads, _Translations())]
+
+    rng = random.Random(seed)
+    ret = []
+    for _ in range(n):
+        aln = copy.copy(rng.choice(alns))
+        start = rng.randrange(len(aln.states) // 2)
+        end = rng.randrange(start, len(aln.states) + 1)
+        skipped = sum(1 for state in aln.states[:start] if state != algo._INSERT)
+        aln.best_match = aln.best_match._replace(
+            hmm_from=aln.best_match.hmm_from + skipped
+        )
+        aln.residues, aln.states = aln.residues[start:end], aln.states[start:end]
+        ret.append(aln)
+    return ret
+
+
+class _Translations(dict):
+    """translations aren't needed here; every target gets a placeholder"""
+
+    def __missing__(self, key):
+        return "X"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-n", type=int, default=100000, help="number of alignments")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    alns = synthesize(args.n)
+    names = [dom_name for dom_name, _ in algo.DOMAIN_LENS] + [""]
+
+    start = time.perf_counter()
+    expected = [split_and_pad_recursive(None, aln) for aln in alns]
+    recursive_secs = time.perf_counter() - start
+
+    start = time.perf_counter()
+    got = [algo.split_and_pad(None, aln) for aln in alns]
+    single_secs = time.perf_counter() - start
+    assert got == expected
+
+    start = time.perf_counter()
+    got = []
+    for i in range(0, len(alns), args.batch_size):
+        batch = alns[i : i + args.batch_size]
+        columns, n_domains = algo.segment_batch(batch)
+        got.extend(
+            [(names[k], columns[k][j]) for k in range(n_domains[j])]
+            for j in range(len(batch))
+        )
+    batch_secs = time.perf_counter() - start
+    assert got == expected
+
+    for name, secs in (
+        ("recursive", recursive_secs),
+        ("single", single_secs),
+        ("batch", batch_secs),
+    ):
+        print(f"{name:10s} {secs:8.2f}s  {args.n / secs:12.0f} alignments/s")
+
+
+if __name__ == "__main__":
+    main()
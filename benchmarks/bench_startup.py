@@ -0,0 +1,214 @@
+"""
+measure how long python -m absequious takes to start, and the memory of its worker processes,
+as a guard against heavy dependencies creeping back into import time
+
+startup runs each command --repeat times in a fresh interpreter and takes the fastest:
+  import  python -c "import absequious.__main__"
+  help    python -m absequious --help
+  trans6  python -m absequious -j 1 trans6, over --reads synthetic reads
+and lists the HEAVY modules each loads.  aln then runs python -m absequious -j JOBS aln
+over the reads, plain with the report in Parquet (if pyarrow is installed), and bgzipped
+with --per-range-dedup, so that workers read the input, and lists the modules its worker
+processes had loaded, from --metrics: the HEAVY ones, and those of the OPTIONAL stages that
+weren't asked for.  it's skipped without hmmsearch on the PATH.  workers then starts a pool
+of -j workers as aln does, after importing only absequious.__main__ (and any --preload
+modules, to compare), and has each translate and parse a batch of reads before reporting
+its memory: VmRSS and VmHWM, and Pss and Private_Dirty from /proc/self/smaps_rollup
+(Linux), which don't count the pages still shared with the parent
+
+with --check, the exit status is 1 if any HEAVY module is loaded at startup, or any HEAVY
+or OPTIONAL module by aln's workers, or if a command takes longer than --max-startup seconds
+
+usage: python benchmarks/bench_startup.py [-j JOBS] [--repeat N] [--reads N]
+    [--preload MODULE [MODULE ...]] [--check] [--max-startup SECS]
+"""
+
+import argparse
+import importlib.util
+import json
+import shutil
+import subprocess
+import sys
+import time
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+from absequious.__main__ import pool_imap, trans6_batch
+from absequious.parse import HMMAln
+from absequious.utils import revcomp
+
+FIXTURES = ROOT / "tests" / "fixtures"
+# the dependencies only some stages need, which aln and trans6 shouldn't import at startup
+HEAVY = ("pandas", "skbio", "scipy", "Bio", "pyarrow", "pyhmmer", "matplotlib")
+# the modules of stages aln only runs when asked to, which its workers never need
+OPTIONAL = (
+    "absequious.cache",
+    "absequious.checkpoint",
+    "absequious.cluster",
+    "absequious.sketch",
+)
+
+
+def time_command(args, repeat):
+    """the fastest of @repeat runs of python @args"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, *args], cwd=ROOT, capture_output=True, check=True
+        )
+        secs = time.perf_counter() - start
+        best = secs if best is None else min(best, secs)
+    return best
+
+
+def heavy_imports(args):
+    """the HEAVY modules python @args imports, from python -X importtime"""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", *args],
+        cwd=ROOT,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+        check=True,
+    )
+    loaded = set()
+    for line in proc.stderr.splitlines():
+        if line.startswith("import time:"):
+            loaded.add(line.rsplit("|", 1)[-1].strip().split(".")[0])
+    return sorted(loaded & set(HEAVY))
+
+
+def aln_worker_modules(reads_fname, jobs, options, temp_dir):
+    """
+    the modules the worker processes of python -m absequious -j @jobs aln loaded, aligning
+    @reads_fname with @options, as its --metrics lists them
+    """
+    metrics_fname = Path(temp_dir) / "metrics.json"
+    cmd = [sys.executable, "-m", "absequious", "-j", str(jobs), "aln", reads_fname]
+    cmd += [
+        "--output_base",
+        str(Path(temp_dir) / "out"),
+        "--metrics",
+        str(metrics_fname),
+    ]
+    subprocess.run(cmd + options, cwd=ROOT, capture_output=True, check=True)
+    with open(metrics_fname) as fin:
+        return json.load(fin)["worker_modules"]
+
+
+def _memory():
+    """this process's memory, in MB, from /proc"""
+    mem = {}
+    for fname, keys in (
+        ("/proc/self/status", ("VmRSS", "VmHWM")),
+        ("/proc/self/smaps_rollup", ("Pss", "Private_Dirty")),
+    ):
+        try:
+            with open(fname) as fin:
+                for line in fin:
+                    key, _, value = line.partition(":")
+                    if key in keys:
+                        mem[key] = int(value.split()[0]) / 1024
+        except OSError:
+            pass
+    return mem
+
+
+def probe_worker(reads):
+    """translate and parse a batch of @reads, as a worker of aln does, returning its memory"""
+    trans6_batch(reads, None)
+    # the reads behind the KY199430_1_batch fixture: KY199430.1 and its reverse complement
+    with open(FIXTURES / "KY199430_1.fa") as fin:
+        dna = "".join(line.strip() for line in fin if not line.startswith(">"))
+    fixture = {"KY199430.1": dna, "KY199430.1_rc": revcomp(dna)}
+    translated = trans6_batch(list(fixture.items()), None, top_frames=6)
+    with open(FIXTURES / "KY199430_1_batch_hmmsearch.txt") as fin:
+        HMMAln.parse_batch(fin, fixture, translated)
+    return _memory()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-j", type=int, default=4, help="worker processes")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--reads", type=int, default=1000, help="reads for trans6")
+    parser.add_argument(
+        "--preload",
+        nargs="+",
+        default=[],
+        metavar="MODULE",
+        help="import these before starting the workers, eg pandas skbio",
+    )
+    parser.add_argument("--check", action="store_true")
+    parser.add_argument("--max-startup", type=float)
+    args = parser.parse_args()
+
+    from repertoire import Repertoire, write_reads
+
+    reads = list(Repertoire(clones=100).reads(args.reads))
+    failed = []
+    with TemporaryDirectory() as temp_dir:
+        reads_fname = str(Path(temp_dir) / "reads.fa")
+        with open(reads_fname, "w") as fout:
+            write_reads(reads, fout)
+        print("startup")
+        for name, cmd in (
+            ("import", ["-c", "import absequious.__main__"]),
+            ("help", ["-m", "absequious", "--help"]),
+            ("trans6", ["-m", "absequious", "-j", "1", "trans6", reads_fname]),
+        ):
+            secs, loaded = time_command(cmd, args.repeat), heavy_imports(cmd)
+            print(f"  {name:8s} {secs:7.3f}s  heavy modules: {loaded}")
+            if loaded:
+                failed.append(name)
+            if args.max_startup is not None and secs > args.max_startup:
+                failed.append(name)
+
+        print(f"aln (-j {args.j})")
+        if shutil.which("hmmsearch") is None:
+            print("  skipped: no hmmsearch on the PATH")
+        else:
+            from Bio import bgzf
+
+            bgzf_fname = reads_fname + ".gz"
+            with open(reads_fname, "rb") as fin, bgzf.BgzfWriter(bgzf_fname) as fout:
+                shutil.copyfileobj(fin, fout)
+            fmt = "parquet" if importlib.util.find_spec("pyarrow") else "csv"
+            for name, fname, options in (
+                (f"{fmt:8s}", reads_fname, ["--output-format", fmt]),
+                ("ranges  ", bgzf_fname, ["--per-range-dedup"]),
+            ):
+                options += ["--batch-size", str(-(-len(reads) // (4 * args.j)))]
+                loaded = aln_worker_modules(fname, args.j, options, temp_dir)
+                unwanted = [m for m in loaded if m in HEAVY or m in OPTIONAL]
+                modules = [m.split(".", 1)[1] for m in loaded if "." in m]
+                print(f"  {name} worker modules: {' '.join(modules)}")
+                print(f"           heavy or optional: {unwanted}")
+                if unwanted:
+                    failed.append(f"aln {name.strip()}")
+
+    for module in args.preload:
+        __import__(module)
+    batch_size = -(-len(reads) // args.j)
+    tasks = [reads[i : i + batch_size] for i in range(0, len(reads), batch_size)]
+    print(f"workers (-j {args.j}, preloaded: {args.preload or 'nothing'})")
+    print(f"  parent   {_fmt_memory(_memory())}")
+    for i, mem in enumerate(pool_imap(probe_worker, tasks, args.j)):
+        print(f"  worker {i} {_fmt_memory(mem)}")
+
+    if failed and args.check:
+        print(f"failed: {', '.join(failed)}")
+        sys.exit(1)
+
+
+def _fmt_memory(mem):
+    return "  ".join(f"{key} {value:6.1f}MB" for key, value in mem.items())
+
+
+if __name__ == "__main__":
+    main()
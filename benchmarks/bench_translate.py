@@ -0,0 +1,53 @@
+"""
+compare six-frame translation one read at a time with Biopython against the batched NumPy
+engine (utils.translate_six_batch)
+
+usage: python benchmarks/bench_translate.py [-n NUM_READS] [--length READ_LENGTH]
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from absequious import utils
+
+
+def translate_six_biopython(dna):
+    ret = []
+    for comp, seq in ((utils.Dir.fwd, dna), (utils.Dir.rev_comp, utils.revcomp(dna))):
+        for offset in range(3):
+            trim = -1 * ((len(seq) - offset) % 3) or None
+            ret.append((comp, offset, utils.translate(seq[offset:trim])))
+    return ret
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-n", type=int, default=20000, help="number of reads")
+    parser.add_argument("--length", type=int, default=400, help="read length")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    dnas = [
+        "".join(rng.choice("ACGT") for _ in range(args.length)) for _ in range(args.n)
+    ]
+
+    start = time.perf_counter()
+    expected = [translate_six_biopython(dna) for dna in dnas]
+    bio_secs = time.perf_counter() - start
+
+    start = time.perf_counter()
+    got = utils.translate_six_batch(dnas)
+    batch_secs = time.perf_counter() - start
+
+    assert got == expected
+    for name, secs in (("biopython", bio_secs), ("batch", batch_secs)):
+        print(f"{name:10s} {secs:8.2f}s  {args.n / secs:12.0f} reads/s")
+
+
+if __name__ == "__main__":
+    main()
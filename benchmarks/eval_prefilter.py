@@ -0,0 +1,64 @@
+"""
+measure the effect of the reading frame prefilter (aln --frames K): how many frames are
+pruned, how often the resulting alignment differs from aligning all six frames, and how long
+each takes.  requires hmmsearch
+
+usage: python benchmarks/eval_prefilter.py [-k K] [--hmm HMM] [READS.fa]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from absequious.__main__ import (
+    DEFAULT_HMM,
+    FRAMES_PER_READ,
+    iter_batch_alignments,
+    iter_reads,
+    open_reads,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "reads", nargs="?", default=ROOT / "tests" / "fixtures" / "KY199430_1.fa"
+    )
+    parser.add_argument("-k", type=int, default=1, help="frames kept per read")
+    parser.add_argument("--hmm", default=DEFAULT_HMM)
+    args = parser.parse_args()
+
+    with open_reads(args.reads) as fin:
+        reads = list(iter_reads(fin))
+    results = {}
+    for top_frames in (FRAMES_PER_READ, args.k):
+        start = time.perf_counter()
+        results[top_frames] = dict(
+            iter_batch_alignments(reads, args.hmm, top_frames=top_frames)
+        )
+        print(f"{top_frames} frames: {time.perf_counter() - start:.2f}s")
+
+    full, pruned = results[FRAMES_PER_READ], results[args.k]
+    differ = sum(
+        1
+        for read_id, _ in reads
+        if (full.get(read_id) is None) != (pruned.get(read_id) is None)
+        or full.get(read_id) is not None
+        and (
+            full[read_id].seq_id != pruned[read_id].seq_id
+            or full[read_id].annots != pruned[read_id].annots
+        )
+    )
+    print(
+        f"pruned {len(reads) * (FRAMES_PER_READ - args.k)} of "
+        f"{len(reads) * FRAMES_PER_READ} frames"
+    )
+    print(f"{differ} of {len(reads)} reads aligned differently")
+
+
+if __name__ == "__main__":
+    main()
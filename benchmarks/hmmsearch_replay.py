@@ -0,0 +1,227 @@
+"""
+a stand-in for hmmsearch that replays its recorded output, for benchmarking where HMMER isn't
+installed
+
+  python benchmarks/hmmsearch_replay.py record [--hmm HMM] [--batch-size N] READS RECORDING
+
+runs the real hmmsearch over the six-frame translations of READS, as aln does, and saves
+each target's section of the report to RECORDING, an SQLite database indexed by target, so
+that recordings of millions of reads replay quickly.  then
+
+  python benchmarks/hmmsearch_replay.py RECORDING [hmmsearch options] HMM SEQFILE
+
+prints the report hmmsearch would give for SEQFILE, built from the sections recorded for its
+targets, ordered by score as hmmsearch orders them.  only the text report is replayed, so
+aln's --parser tabular isn't supported.  install_stand_in() puts an "hmmsearch" replaying a
+recording first on the PATH, as bench_pipeline.py --replay does
+"""
+
+import argparse
+import os
+import sqlite3
+import stat
+import subprocess
+import sys
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from absequious.__main__ import (
+    DEFAULT_HMM,
+    FRAMES_PER_READ,
+    batches,
+    iter_reads,
+    open_reads,
+    trans6_batch,
+)
+
+FORMAT_VERSION = 1
+
+
+def iter_report_sections(report):
+    """
+    iterate over an hmmsearch report, yielding (query, query_length, seq_scores, sections)
+    for each query, where seq_scores maps each target to its score, and sections maps it
+    to its lines of the domain annotation, from the ">>" line on
+    """
+    query, seq_scores, sections, section = None, {}, {}, None
+    in_scores = in_annots = False
+    for line in report:
+        if line.startswith("Query:"):
+            _, query, length = line.split()
+            query_length = int(length.strip("[]M="))
+            seq_scores, sections = {}, {}
+        elif line.startswith("Scores for complete sequences"):
+            in_scores = True
+        elif line.startswith("Domain annotation for each sequence"):
+            in_scores, in_annots = False, True
+        elif line.startswith("Internal pipeline statistics summary"):
+            in_annots = False
+            yield query, query_length, seq_scores, sections
+        elif in_scores:
+            fields = line.split()
+            if len(fields) >= 9 and not line.lstrip().startswith(("E-value", "-")):
+                try:
+                    seq_scores[fields[8]] = float(fields[1])
+                except ValueError:
+                    pass
+        elif in_annots:
+            if line.startswith(">>"):
+                section = sections[line[2:].split()[0]] = []
+            if section is not None:
+                section.append(line)
+
+
+SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value);
+CREATE TABLE queries (query TEXT PRIMARY KEY, length INTEGER, rank INTEGER);
+CREATE TABLE targets (
+    query TEXT, name TEXT, seq TEXT, score REAL, section TEXT, PRIMARY KEY (query, name)
+);
+"""
+
+
+def record(reads_fname, hmm, recording, batch_size):
+    """run hmmsearch over the translations of @reads_fname, saving the report to @recording"""
+    if os.path.exists(recording):
+        os.remove(recording)
+    db = sqlite3.connect(recording)
+    db.executescript(SCHEMA)
+    db.executemany(
+        "INSERT INTO meta VALUES (?, ?)",
+        [("version", FORMAT_VERSION), ("Z", FRAMES_PER_READ)],
+    )
+    with open_reads(reads_fname) as fin, db:
+        for batch in batches(iter_reads(fin), batch_size):
+            with NamedTemporaryFile("wb", suffix=".fa") as trans_f:
+                translated = trans6_batch(batch, trans_f)
+                cmd = ["hmmsearch", "--notextw", "-Z", str(FRAMES_PER_READ)]
+                proc = subprocess.run(
+                    cmd + [str(hmm), trans_f.name],
+                    stdout=subprocess.PIPE,
+                    text=True,
+                    check=True,
+                )
+            for rank, (query, length, scores, sections) in enumerate(
+                iter_report_sections(proc.stdout.splitlines(keepends=True))
+            ):
+                db.execute(
+                    "INSERT OR IGNORE INTO queries VALUES (?, ?, ?)",
+                    (query, length, rank),
+                )
+                db.executemany(
+                    "INSERT OR REPLACE INTO targets VALUES (?, ?, ?, ?, ?)",
+                    (
+                        (query, name, translated[name], scores[name], "".join(lines))
+                        for name, lines in sections.items()
+                    ),
+                )
+    db.close()
+
+
+def read_fasta(fname):
+    """the (name, sequence) records of FASTA file @fname, in order"""
+    records, name, seq = [], None, []
+    with open(fname) as fin:
+        for line in fin:
+            line = line.rstrip("\n")
+            if line.startswith(">"):
+                if name is not None:
+                    records.append((name, "".join(seq)))
+                name, seq = line[1:].split()[0], []
+            else:
+                seq.append(line.strip())
+    if name is not None:
+        records.append((name, "".join(seq)))
+    return records
+
+
+def replay(recording, argv, fout):
+    """
+    write the report of hmmsearch @argv (its arguments) to @fout, from @recording; returns
+    the exit status
+    """
+    db = sqlite3.connect(f"file:{recording}?mode=ro", uri=True)
+    meta = dict(db.execute("SELECT key, value FROM meta"))
+    if meta["version"] != FORMAT_VERSION:
+        sys.exit(f"{recording}: unsupported recording version {meta['version']}")
+
+    args = argparse.ArgumentParser(prog="hmmsearch")
+    args.add_argument("--notextw", action="store_true")
+    args.add_argument("-Z", type=float)
+    args.add_argument("hmm")
+    args.add_argument("seqfile")
+    args, unknown = args.parse_known_args(argv)
+    if unknown:
+        sys.exit(f"hmmsearch_replay: only the text report is replayed, not {unknown}")
+    if args.Z != meta["Z"]:
+        sys.exit(f"hmmsearch_replay: {recording} was recorded with -Z {meta['Z']}")
+
+    targets = read_fasta(args.seqfile)
+    fout.write("# hmmsearch :: search profile(s) against a sequence database\n")
+    fout.write(f"# replayed from {recording}\n\n")
+    queries = db.execute("SELECT query, length FROM queries ORDER BY rank").fetchall()
+    for query, length in queries:
+        hits = []
+        for i, (name, seq) in enumerate(targets):
+            saved = db.execute(
+                "SELECT seq, score, section FROM targets WHERE query = ? AND name = ?",
+                (query, name),
+            ).fetchone()
+            if saved is None:
+                continue
+            saved_seq, score, section = saved
+            if saved_seq != seq:
+                sys.exit(f"hmmsearch_replay: {name} isn't the sequence recorded")
+            hits.append((-score, i, section))
+        # hmmsearch sorts targets by score, and ties in the order searched
+        hits.sort()
+        fout.write(f"Query:       {query}  [M={length}]\n")
+        fout.write("Scores for complete sequences (score includes all domains):\n\n")
+        fout.write("Domain annotation for each sequence (and alignments):\n")
+        if not hits:
+            fout.write("\n   [No targets detected that satisfy reporting thresholds]\n")
+        for _, _, section in hits:
+            fout.write(section)
+        fout.write("\n\nInternal pipeline statistics summary:\n")
+        fout.write("-------------------------------------\n")
+        fout.write(f"Query model(s):  1  ({length} nodes)\n")
+        fout.write(f"Target sequences:  {len(targets)}\n")
+        fout.write("//\n")
+    fout.write("[ok]\n")
+    return 0
+
+
+def install_stand_in(recording, bin_dir):
+    """
+    write an executable "hmmsearch" to @bin_dir that replays @recording, and put @bin_dir
+    first on this process's PATH (which its child processes inherit)
+    """
+    script = Path(bin_dir) / "hmmsearch"
+    cmd = [sys.executable, Path(__file__).resolve(), Path(recording).resolve()]
+    script.write_text(
+        "#!/bin/sh\nexec " + " ".join(f'"{arg}"' for arg in cmd) + ' "$@"\n'
+    )
+    script.chmod(script.stat().st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    os.environ["PATH"] = f"{bin_dir}{os.pathsep}{os.environ['PATH']}"
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "record":
+        parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+        parser.add_argument("reads")
+        parser.add_argument("recording")
+        parser.add_argument("--hmm", default=DEFAULT_HMM)
+        parser.add_argument("--batch-size", type=int, default=10000)
+        args = parser.parse_args(sys.argv[2:])
+        record(args.reads, args.hmm, args.recording, args.batch_size)
+    elif len(sys.argv) > 3:
+        sys.exit(replay(sys.argv[1], sys.argv[2:], sys.stdout))
+    else:
+        sys.exit(__doc__)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+"""
+synthesize a VH repertoire: reads of heavy-chain variable domains built from the consensus of
+absequious/data/ighv.hmm, for benchmarking
+
+each clone is the consensus, with the residues outside H-CDR3 mutated at --shm-rate (somatic
+hypermutation) and a random H-CDR3 of 8 to 20 residues, back-translated with random codons
+and given a few bases of random flank on either side, so that reads start in every frame.
+clone sizes follow --clone-dist:
+  zipf:A       the clone of rank k has size proportional to k ** -A
+  lognormal:S  sizes drawn from a log-normal distribution with sigma S
+  uniform      every clone the same size
+each read is a copy of its clone's DNA with substitutions at --error-rate, and with
+--frameshift-rate and --stop-rate a random base inserted or deleted, or a codon replaced
+by a stop codon.  a --rc-fraction of reads are reverse-complemented
+
+read IDs record how each read was made: r{n}_c{clone}_{fwd|rev}, with _fs and _stop
+appended for reads given a frameshift or a stop codon
+
+usage: python benchmarks/repertoire.py [-n NUM_READS] [--clones NUM_CLONES] [--clone-dist DIST]
+    [--shm-rate RATE] [--error-rate RATE] [--frameshift-rate RATE] [--stop-rate RATE]
+    [--rc-fraction FRACTION] [--fastq] [--seed SEED] OUT
+"""
+
+import argparse
+import random
+import sys
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from absequious import algo, utils
+from absequious.__main__ import DEFAULT_HMM
+from absequious.hmm import AMINO_ACIDS, load_models
+
+BASES = "ACGT"
+# the codons of each amino acid, from utils.CODON_TABLE, which is indexed by 16 * b1 + 4 * b2
+# + b3 for bases numbered in the order of BASES
+CODONS = {}
+for _i, _aa in enumerate(utils.CODON_TABLE):
+    CODONS.setdefault(_aa, []).append(
+        BASES[_i // 16] + BASES[_i // 4 % 4] + BASES[_i % 4]
+    )
+STOP_CODONS = tuple(CODONS["*"])
+# reads are generated and written this many at a time
+CHUNK_SIZE = 10000
+
+
+def domain_bounds(name):
+    """the (start, end) model positions of domain @name, indexed from 1, end exclusive"""
+    start = 1
+    for nom, length in algo.DOMAIN_LENS:
+        if nom == name:
+            return start, start + length
+        start += length
+    raise KeyError(name)
+
+
+def clone_weights(dist, clones, rng):
+    """the relative size of each of @clones clones, given --clone-dist @dist"""
+    kind, _, param = dist.partition(":")
+    if kind == "zipf":
+        return np.arange(1, clones + 1, dtype=float) ** -float(param or 1.2)
+    if kind == "lognormal":
+        return rng.lognormal(0.0, float(param or 1.5), clones)
+    if kind == "uniform":
+        return np.ones(clones)
+    raise ValueError(f"unknown clone size distribution: {dist}")
+
+
+class Repertoire:
+    """
+    the clones of a synthetic repertoire, and reads drawn from them; see the module's
+    docstring for the parameters.  clones holds the DNA of each clone, and the offset of its
+    coding sequence
+    """
+
+    def __init__(
+        self,
+        clones=1000,
+        clone_dist="zipf:1.2",
+        shm_rate=0.05,
+        error_rate=0.001,
+        frameshift_rate=0.01,
+        stop_rate=0.01,
+        rc_fraction=0.5,
+        hmm=DEFAULT_HMM,
+        seed=0,
+    ):
+        self.error_rate = error_rate
+        self.frameshift_rate = frameshift_rate
+        self.stop_rate = stop_rate
+        self.rc_fraction = rc_fraction
+        self._random = random.Random(seed)
+        self._rng = np.random.default_rng(seed)
+
+        (model,) = load_models(hmm).values()
+        consensus = "".join(model.consensus[1:]).upper()
+        cdr3_start, cdr3_end = domain_bounds("H-CDR3")
+        # H-CDR3 is replaced up to the conserved Trp at its end (in the model, it starts
+        # after the Cys and Ala of ...YYCA)
+        prefix, suffix = consensus[: cdr3_start - 1], consensus[cdr3_end - 2 :]
+        self.clones = [self._clone(prefix, suffix, shm_rate) for _ in range(clones)]
+        weights = clone_weights(clone_dist, clones, self._rng)
+        self._cum_weights = np.cumsum(weights / weights.sum())
+
+    def _clone(self, prefix, suffix, shm_rate):
+        rnd = self._random
+        protein = [
+            rnd.choice(AMINO_ACIDS) if rnd.random() < shm_rate else aa
+            for aa in prefix + suffix
+        ]
+        cdr3 = "".join(rnd.choices(AMINO_ACIDS, k=rnd.randint(8, 20)))
+        protein[len(prefix) : len(prefix)] = cdr3
+        dna = "".join(rnd.choice(CODONS[aa]) for aa in protein)
+        flank = lambda: "".join(rnd.choices(BASES, k=rnd.randint(0, 10)))
+        left = flank()
+        # the clone's DNA, and where its coding sequence starts in it
+        return left + dna + flank(), len(left)
+
+    def _read(self, clone):
+        """a read of clone @clone, and the suffix of its ID saying how it was made"""
+        rnd = self._random
+        dna, coding_start = clone
+        tags = ""
+        if self.error_rate:
+            n_errors = self._rng.binomial(len(dna), self.error_rate)
+            if n_errors:
+                seq = list(dna)
+                for pos in rnd.sample(range(len(seq)), n_errors):
+                    seq[pos] = rnd.choice(BASES.replace(seq[pos], ""))
+                dna = "".join(seq)
+        if rnd.random() < self.stop_rate:
+            pos = coding_start + rnd.randrange((len(dna) - coding_start) // 3 - 1) * 3
+            dna = dna[:pos] + rnd.choice(STOP_CODONS) + dna[pos + 3 :]
+            tags += "_stop"
+        if rnd.random() < self.frameshift_rate:
+            pos = rnd.randrange(len(dna))
+            if rnd.random() < 0.5:
+                dna = dna[:pos] + dna[pos + 1 :]
+            else:
+                dna = dna[:pos] + rnd.choice(BASES) + dna[pos:]
+            tags += "_fs"
+        if rnd.random() < self.rc_fraction:
+            return utils.revcomp(dna), "_rev" + tags
+        return dna, "_fwd" + tags
+
+    def reads(self, n):
+        """
+        iterate over @n reads, as (read_id, dna) tuples.  the first reads are the same
+        whatever @n is, so that a recording of hmmsearch over many reads (see
+        hmmsearch_replay.py) serves for fewer
+        """
+        for start in range(0, n, CHUNK_SIZE):
+            read_clones = np.searchsorted(
+                self._cum_weights, self._rng.random(CHUNK_SIZE)
+            )
+            read_clones = np.minimum(read_clones, len(self.clones) - 1)
+            read_clones = read_clones[: n - start]
+            for i, clone in enumerate(read_clones.tolist(), start):
+                dna, tags = self._read(self.clones[clone])
+                yield f"r{i}_c{clone}{tags}", dna
+
+
+def write_reads(reads, fout, fastq=False):
+    """write (read_id, dna) @reads to @fout as FASTA or, with @fastq, FASTQ"""
+    for read_id, dna in reads:
+        if fastq:
+            fout.write(f"@{read_id}\n{dna}\n+\n{'I' * len(dna)}\n")
+        else:
+            fout.write(f">{read_id}\n{dna}\n")
+
+
+def add_repertoire_arguments(parser):
+    """the options of Repertoire, as used by this script and bench_pipeline.py"""
+    parser.add_argument("--clones", type=int, default=1000, help="number of clones")
+    parser.add_argument(
+        "--clone-dist", default="zipf:1.2", help="zipf:A, lognormal:SIGMA or uniform"
+    )
+    parser.add_argument("--shm-rate", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.001)
+    parser.add_argument("--frameshift-rate", type=float, default=0.01)
+    parser.add_argument("--stop-rate", type=float, default=0.01)
+    parser.add_argument("--rc-fraction", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def repertoire_from_args(args):
+    return Repertoire(
+        args.clones,
+        args.clone_dist,
+        args.shm_rate,
+        args.error_rate,
+        args.frameshift_rate,
+        args.stop_rate,
+        args.rc_fraction,
+        seed=args.seed,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("out", help="output file; - for stdout")
+    parser.add_argument("-n", type=int, default=1000, help="number of reads")
+    parser.add_argument("--fastq", action="store_true", help="write FASTQ, not FASTA")
+    add_repertoire_arguments(parser)
+    args = parser.parse_args()
+
+    repertoire = repertoire_from_args(args)
+    if args.out == "-":
+        write_reads(repertoire.reads(args.n), sys.stdout, args.fastq)
+    else:
+        with open(args.out, "w") as fout:
+            write_reads(repertoire.reads(args.n), fout, args.fastq)
+
+
+if __name__ == "__main__":
+    main()
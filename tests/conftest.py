@@ -7,18 +7,75 @@ import pytest
 sys.path.append(".")
 import absequious
 import absequious.utils
+from absequious.parse import HMMAln
+
+FIXTURES = absequious.utils.get_script_dir().parent / "tests" / "fixtures"
+
+
+def read_fasta(fname):
+    """minimal FASTA reader, returning a dict mapping ID to sequence"""
+    ret, seq_id = {}, None
+    with open(fname) as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith(">"):
+                seq_id = line[1:].split()[0]
+                ret[seq_id] = ""
+            elif seq_id:
+                ret[seq_id] += line
+    return ret
 
 
 @pytest.yield_fixture
 def hmmsearch_output():
-    fname = (
-        absequious.utils.get_script_dir().parent
-        / "tests"
-        / "fixtures"
-        / "KY199430_1_hmmsearch.txt"
-    )
+    fname = FIXTURES / "KY199430_1_hmmsearch.txt"
+    with open(fname) as f:
+        yield f
+
+
+@pytest.yield_fixture
+def batch_hmmsearch_output():
+    fname = FIXTURES / "KY199430_1_batch_hmmsearch.txt"
     with open(fname) as f:
         yield f
 
 
-# "KY199430_1.fa"
+@pytest.fixture
+def dna_seqs():
+    return read_fasta(FIXTURES / "KY199430_1.fa")
+
+
+@pytest.fixture
+def translated():
+    return read_fasta(FIXTURES / "KY199430_1.trans.fa")
+
+
+@pytest.fixture
+def batch_reads(dna_seqs):
+    """
+    the reads and translations behind the KY199430_1_batch fixtures: KY199430.1 and its
+    reverse complement
+    """
+    fwd = dna_seqs["KY199430.1"]
+    reads = {"KY199430.1": fwd, "KY199430.1_rc": absequious.utils.revcomp(fwd)}
+    translated = {
+        f"{read_id}:{comp.name}:offset_{offset}": seq
+        for read_id, dna in reads.items()
+        for comp, offset, seq in absequious.utils.translate_six(dna)
+    }
+    return reads, translated
+
+
+@pytest.fixture
+def batch_alns(batch_hmmsearch_output, batch_reads):
+    """the alignments of the batch_reads, parsed from batch_hmmsearch_output, by read ID"""
+    reads, translated = batch_reads
+    return HMMAln.parse_batch(batch_hmmsearch_output, reads, translated)
+
+
+@pytest.yield_fixture
+def batch_tabular_output():
+    with open(FIXTURES / "KY199430_1_batch.domtblout") as domtbl, open(
+        FIXTURES / "KY199430_1_batch.sto"
+    ) as sto:
+        yield domtbl, sto
@@ -0,0 +1,165 @@
+import copy
+from tempfile import TemporaryFile
+
+from absequious import AlnState, algo
+
+
+def test_clone_counts(batch_alns):
+    alns = list(batch_alns.values()) + [None]
+    df = algo.report(alns)
+
+    counts = algo.CloneCounts()
+    for aln in alns:
+        if aln is None:
+            counts.add_failed()
+        else:
+            counts.add(algo.report_row(aln))
+
+    assert list(df.columns) == algo.REPORT_COLUMNS
+    assert counts.total == 3
+    assert counts.summary() == algo.summary(df, alns)
+    assert counts.full_seq_freq() == algo.full_seq_freq(df, alns)
+    assert counts.summary()[0] == ("failed", "", 1 / 3, 1, 3)
+
+
+def test_clone_counts_no_alignments():
+    # a batch in which no read aligned counts its failures, and no empty sequence
+    table = algo.ReportTable.from_alignments([])
+    assert len(table) == 0 and table["sequence"] == []
+    counts = algo.CloneCounts()
+    counts.add_table(table, failed=2)
+    assert counts.all_ctr == {} and counts.seq_to_cdr3 == {}
+    assert counts.summary()[0] == ("failed", "", 1.0, 2, 2)
+
+
+def test_split_and_pad(batch_alns):
+    aln = batch_alns["KY199430.1"]
+    assert algo.split_and_pad(None, aln) == [
+        ("H-FR1", "EVQLVESGGGLVQPGGSLRLSCAA"),
+        ("H-CDR1", "SGFNIKDT"),
+        ("H-FR2", "YIHWVRQAPGKGLEWVA"),
+        ("H-CDR2", "rIYPTNGY"),
+        ("H-FR3", "TRYADSVKGRFTISADTSKNTAYLQMNSLRAEDTAVYYC"),
+        ("H-CDR3", "SR--WggdGfYAMDY"),
+        ("H-FR4", "WGQGTLVTVSS"),
+    ]
+
+    # a partial alignment, starting partway through CDR1
+    part = copy.copy(aln)
+    part.best_match = aln.best_match._replace(hmm_from=30)
+    part.residues, part.states = aln.residues[:40], aln.states[:40]
+    assert algo.split_and_pad(None, part) == [
+        ("H-FR1", ""),
+        ("H-CDR1", "EVQ"),
+        ("H-FR2", "LVESGGGLVQPGGSLRL"),
+        ("H-CDR2", "SCAASGFN"),
+        ("H-FR3", "IKDTYIHWVRQA"),
+    ]
+
+    # with two residues inserted before HMM position 33, the start of H-FR2
+    ins = copy.copy(part)
+    ins.states = part.states[:3] + bytes([AlnState.insert.value] * 2) + part.states[5:]
+    padding = algo.insert_padding([aln, ins])
+    assert list(padding.nonzero()[0]) == [33] and padding[33] == 2
+    assert algo.split_and_pad(padding, ins) == [
+        ("H-FR1", "-" * 24),
+        ("H-CDR1", "-----EVQ"),
+        ("H-FR2", "LVESGGGLVQPGGSLRLSC"),
+        ("H-CDR2", "AASGFNIK"),
+        ("H-FR3", "DTYIHWVRQA" + "-" * 29),
+        ("H-CDR3", "-" * 15),
+        ("H-FR4", "-" * 11),
+    ]
+    assert algo.split_and_pad(padding, aln)[2] == ("H-FR2", "..YIHWVRQAPGKGLEWVA")
+
+    names = [dom_name for dom_name, _ in algo.DOMAIN_LENS] + [""]
+    alns = [aln, part, None]
+    for hmm_from in (1, 25, 26, 33, 122, 200):
+        alns[-1] = copy.copy(part)
+        alns[-1].best_match = aln.best_match._replace(hmm_from=hmm_from)
+        columns, n_domains = algo.segment_batch(alns)
+        for i, x in enumerate(alns):
+            split = [(names[k], columns[k][i]) for k in range(n_domains[i])]
+            assert split == algo.split_and_pad(None, x)
+    assert algo.report_rows(alns) == [algo.report_row(x) for x in alns]
+
+
+def test_padded_alignments(batch_alns):
+    aln = batch_alns["KY199430.1"]
+    alns = []
+    for hmm_from, n_ins in ((1, 0), (30, 2), (40, 3), (100, 1)):
+        x = copy.copy(aln)
+        x.best_match = aln.best_match._replace(hmm_from=hmm_from)
+        x.states = bytes([AlnState.insert.value] * n_ins) + aln.states[n_ins:]
+        alns.append(x)
+
+    # padding accumulated a batch at a time is the same as over all the alignments
+    padded = algo.PaddedAlignments(TemporaryFile())
+    for i in range(0, len(alns), 3):
+        padded.add(alns[i : i + 3])
+    assert (padded.padding == algo.insert_padding(alns)).all()
+
+    assert padded.columns() == ["read"] + algo.REPORT_COLUMNS[algo._DOMAINS] + ["tail"]
+    rows = list(padded.rows(batch_size=3))
+    assert [row[0] for row in rows] == ["KY199430.1"] * 4
+    for i, column in enumerate(zip(*rows)):
+        if i:
+            assert len(set(map(len, column))) == 1
+    for x, row in zip(alns, rows):
+        assert list(row[1:]) == [
+            seq for _, seq in algo.split_and_pad(padded.padding, x)
+        ]
+        unpadded = "".join(seq for _, seq in algo.split_and_pad(None, x))
+        assert "".join(row[1:]).replace(".", "").replace("-", "") == unpadded.replace(
+            "-", ""
+        )
+
+
+def test_report_table(batch_alns):
+    alns = list(batch_alns.values())
+    rows = [algo.report_row(aln) for aln in alns]
+    # an alignment running past FR4 has the residues beyond it in the tail
+    rows.append(rows[0][:10] + ["GK"] + rows[0][11:])
+
+    table = algo.ReportTable.from_rows(rows)
+    assert len(table) == 3 and list(table.rows()) == rows
+    assert table["tail"] == ["", "", "GK"]
+    assert table["sequence"][0] == "".join(rows[0][3:10])
+
+    expected = [(table["H-CDR3"][0], 1.0, 3, 3)]
+    assert algo.cdr3_freq(table, alns) == expected
+    assert algo.cdr3_freq(algo.report(alns + alns[:1]), alns) == expected
+
+
+def test_report_layout_chains(batch_alns):
+    alns = list(batch_alns.values())
+    # a light chain model, with the same domain lengths as the heavy chain's
+    kappa = algo.IGHV._replace(
+        name="igkv",
+        chain="K",
+        domain_lens=tuple(("K" + name[1:], n) for name, n in algo.DOMAIN_LENS),
+    )
+    light = copy.copy(alns[1])
+    light.model = "igkv"
+    alns = [alns[0], light]
+    layout = algo.ReportLayout([algo.IGHV, kappa])
+    assert layout.columns[3] == "chain" and layout.domain_slice == slice(4, 18)
+
+    table = algo.ReportTable.from_alignments(alns, layout)
+    heavy_row = algo.report_row(alns[0])
+    assert table["chain"] == ["H", "K"]
+    assert table["H-CDR3"] == [heavy_row[algo._CDR3], ""]
+    assert table["K-CDR3"] == ["", heavy_row[algo._CDR3]]
+    assert table.cdr3s() == [heavy_row[algo._CDR3]] * 2
+    assert table["sequence"] == [table["sequence"][0]] * 2
+    rows = list(table.rows())
+    assert rows[0][4:11] == heavy_row[3:10] and rows[0][11:18] == [""] * 7
+    assert rows[1][4:11] == [""] * 7 and rows[1][11:18] == heavy_row[3:10]
+    assert list(algo.ReportTable.from_rows(rows, layout).rows()) == rows
+
+    padded = algo.PaddedAlignments(TemporaryFile(), layout)
+    padded.add(alns)
+    assert padded.columns() == ["read", "chain"] + layout.domains
+    heavy, light = padded.rows()
+    assert heavy[:2] == ("KY199430.1", "H") and light[1] == "K"
+    assert heavy[2:9] == light[9:16] and light[2:9] == heavy[9:16] == ("",) * 7
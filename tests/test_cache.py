@@ -0,0 +1,82 @@
+from absequious.__main__ import DEFAULT_HMM, iter_pipeline
+from absequious.cache import AlignmentCache, dump_aln, load_aln
+
+
+def test_dump_aln(batch_alns, batch_reads):
+    reads, _ = batch_reads
+    aln = batch_alns["KY199430.1_rc"]
+    copy = load_aln(dump_aln(aln), "other", reads["KY199430.1_rc"])
+    assert copy.seq_id == "other:rev_comp:offset_2"
+    for attr in ("best_match", "score_and_eval", "annots", "tgt_seq", "dna_seq"):
+        assert getattr(copy, attr) == getattr(aln, attr)
+    assert load_aln(dump_aln(None), "other", "NNNN") is None
+
+
+def test_alignment_cache(batch_alns, batch_reads, tmp_path):
+    reads, _ = batch_reads
+    aln = batch_alns["KY199430.1"]
+    path, hmm = tmp_path / "cache.db", tmp_path / "ighv.hmm"
+    hmm.write_text(DEFAULT_HMM.read_text())
+    reads = [("KY199430.1", reads["KY199430.1"]), ("failed", "NNNN")]
+
+    with AlignmentCache(path, hmm, 6) as cache:
+        assert list(cache.lookup([reads])) == [reads]
+        got = list(cache.merge([[aln, None]]))
+        assert got == [aln, None]
+        assert (cache.hits, cache.misses) == (0, 2)
+
+    with AlignmentCache(path, hmm, 6) as cache:
+        reads.insert(1, ("new", "ACGT"))
+        assert list(cache.lookup([reads])) == [[("new", "ACGT")]]
+        got = list(cache.merge([[None]]))
+        assert got[0].annots == aln.annots and got[1:] == [None, None]
+        assert (cache.hits, cache.misses) == (2, 1)
+
+    # a different --frames, or a change to the HMM, invalidates the cache
+    with AlignmentCache(path, hmm, 1) as cache:
+        assert len(next(cache.lookup([reads]))) == 3
+    hmm.write_text(DEFAULT_HMM.read_text().replace("ighv", "ighv2"))
+    with AlignmentCache(path, hmm, 6, max_entries=1) as cache:
+        assert len(next(cache.lookup([reads[:1]]))) == 1
+        list(cache.merge([[aln]]))
+
+    # eviction keeps only the most recently used entry
+    with AlignmentCache(path, hmm, 6) as cache:
+        assert list(cache.lookup([reads])) == [reads[1:]]
+
+    # another --engine doesn't share entries; they are evicted first, although used later
+    with AlignmentCache(path, hmm, 6, engine="inprocess") as cache:
+        assert list(cache.lookup([reads[:2]])) == [reads[:2]]
+        list(cache.merge([[None, None]]))
+    with AlignmentCache(path, hmm, 6, max_entries=1):
+        pass
+    with AlignmentCache(path, hmm, 6, parser="tabular") as cache:
+        assert list(cache.lookup([reads])) == [reads]
+    with AlignmentCache(path, hmm, 6) as cache:
+        assert list(cache.lookup([reads])) == [reads[1:]]
+
+
+def test_cached_pipeline(tmp_path):
+    # with every read cached, alignments come out a batch at a time, without reading ahead
+    hmm = tmp_path / "ighv.hmm"
+    hmm.write_text(DEFAULT_HMM.read_text())
+    reads = [(f"r{i}", "ACGT" * (i + 1)) for i in range(100)]
+    path = tmp_path / "cache.db"
+    with AlignmentCache(path, hmm, 6) as cache:
+        assert list(cache.lookup([reads])) == [reads]
+        list(cache.merge([[None] * len(reads)]))
+
+    with AlignmentCache(path, hmm, 6) as cache:
+        n_read = 0
+
+        def counted():
+            nonlocal n_read
+            for read in reads:
+                n_read += 1
+                yield read
+
+        alns = iter_pipeline(counted(), hmm, batch_size=10, cache=cache)
+        assert next(alns) is None
+        assert n_read == 10
+        assert list(alns) == [None] * (len(reads) - 1)
+        assert (cache.hits, cache.misses) == (100, 0)
@@ -0,0 +1,29 @@
+import pytest
+
+from absequious import algo
+from absequious.__main__ import DEFAULT_HMM
+from absequious.chains import ModelTableError, model_info, read_model_table
+
+
+def test_model_info(tmp_path):
+    # the table shipped describes the HMM shipped, as the defaults of algo do
+    assert model_info(DEFAULT_HMM) == (algo.IGHV,)
+    assert algo.IGHV.cdr3 == "H-CDR3"
+
+    table = tmp_path / "models.tsv"
+    table.write_text("model\tchain\tdomains\nighv\tK\tK-FR1:30 K-CDR3:12 K-FR4:81\n")
+    (info,) = model_info(DEFAULT_HMM, table)
+    assert info.chain == "K" and info.length == algo.HMM_LEN
+    assert info.domain_lens == (("K-FR1", 30), ("K-CDR3", 12), ("K-FR4", 81))
+
+    # the domains must add up to the model's length + 1
+    for domains in ("K-FR1:30 K-CDR3:12 K-FR4:80", "K-FR1:30"):
+        table.write_text(f"model\tchain\tdomains\nighv\tK\t{domains}\n")
+        with pytest.raises(ModelTableError):
+            model_info(DEFAULT_HMM, table)
+    table.write_text("model\tchain\tdomains\nigkv\tK\tK-FR1:30\n")
+    with pytest.raises(ModelTableError):
+        model_info(DEFAULT_HMM, table)
+    table.write_text("ighv\tK\tK-FR1\n")
+    with pytest.raises(ModelTableError):
+        read_model_table(table)
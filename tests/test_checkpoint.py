@@ -0,0 +1,95 @@
+import gzip
+import io
+
+import pytest
+
+from absequious import algo
+from absequious.checkpoint import Checkpoint, CheckpointError
+from absequious.counts import RunCounts
+from absequious.output import CSVReportWriter
+from absequious.reads import iter_range
+
+
+def _save_chunk(checkpoint, i, alns):
+    layout = algo.DEFAULT_LAYOUT
+    run = RunCounts()
+    aligned = [aln for aln in alns if aln is not None]
+    table = algo.ReportTable.from_alignments(aligned, layout)
+    with checkpoint.open_reads(i, layout) as reads_out:
+        reads_out.write(table)
+    run.add_chunk(alns, table)
+    checkpoint.save(i, run, len(aligned), {})
+    return table
+
+
+def test_checkpoint(batch_alns, tmp_path):
+    fwd, rc = batch_alns["KY199430.1"], batch_alns["KY199430.1_rc"]
+    path = tmp_path / "reads.fa"
+    path.write_text("".join(f">r{i}\nACGTACGTAC\n" for i in range(100)))
+    work_dir = str(tmp_path / "work")
+    settings = {"hmm": "x"}
+
+    checkpoint = Checkpoint(work_dir, str(path), settings, 3)
+    assert [i for i, _ in checkpoint.pending()] == [0, 1, 2]
+    assert sum(len(list(iter_range(r))) for _, r in checkpoint.pending()) == 100
+    tables = [_save_chunk(checkpoint, 0, [fwd, None])]
+    # a run that died while saving chunk 1 leaves half a line in the manifest
+    with open(checkpoint._path("chunks.jsonl"), "a") as fout:
+        fout.write('{"chunk": 1, "st')
+
+    with pytest.raises(CheckpointError):
+        Checkpoint(work_dir, str(path), settings, 3)
+    with pytest.raises(CheckpointError):
+        Checkpoint(work_dir, str(path), {"hmm": "y"}, 3, resume=True)
+    # the number of chunks is the one saved
+    checkpoint = Checkpoint(work_dir, str(path), settings, 5, resume=True)
+    assert [i for i, _ in checkpoint.pending()] == [1, 2]
+    tables.append(_save_chunk(checkpoint, 1, [rc, fwd]))
+    tables.append(_save_chunk(checkpoint, 2, [None]))
+
+    checkpoint = Checkpoint(work_dir, str(path), settings, 3, resume=True)
+    assert checkpoint.pending() == [] and checkpoint.n_reads == 5
+    fout = io.StringIO()
+    checkpoint.copy_reads(CSVReportWriter(fout, algo.DEFAULT_LAYOUT), None, 2)
+    expected = io.StringIO()
+    writer = CSVReportWriter(expected, algo.DEFAULT_LAYOUT)
+    for table in tables:
+        writer.write(table)
+    assert fout.getvalue() == expected.getvalue()
+
+    # the counts of the chunks merge to those of all the reads
+    counts = checkpoint.counts(RunCounts()).counts
+    whole = RunCounts()
+    whole.add_chunk(
+        [fwd, None, rc, fwd, None], algo.ReportTable.from_alignments([fwd, rc, fwd])
+    )
+    assert counts.summary() == whole.counts.summary()
+    assert counts.full_seq_freq() == whole.counts.full_seq_freq()
+
+    checkpoint.remove()
+    assert not (tmp_path / "work").exists()
+
+
+def test_checkpoint_input_changed(tmp_path):
+    path = tmp_path / "reads.fa"
+    path.write_text("".join(f">r{i}\nACGTACGTAC\n" for i in range(100)))
+    work_dir = str(tmp_path / "work")
+    checkpoint = Checkpoint(work_dir, str(path), {}, 2)
+    _save_chunk(checkpoint, 0, [None])
+
+    # the same size, but different reads
+    path.write_text("".join(f">r{i}\nACGTACGTAA\n" for i in range(100)))
+    with pytest.raises(CheckpointError, match="changed"):
+        Checkpoint(work_dir, str(path), {}, 2, resume=True)
+
+
+def test_checkpoint_unsplittable(tmp_path):
+    path = tmp_path / "reads.fa.gz"
+    with gzip.open(path, "wt") as fout:
+        fout.write("".join(f">r{i}\nACGTACGTAC\n" for i in range(100)))
+    work_dir = tmp_path / "work"
+    # a gzipped input can't be checkpointed, and leaves nothing behind to say otherwise
+    for _ in range(2):
+        with pytest.raises(CheckpointError, match="can't be split"):
+            Checkpoint(str(work_dir), str(path), {}, 2)
+        assert not work_dir.exists()
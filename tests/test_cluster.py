@@ -0,0 +1,65 @@
+import random
+
+from absequious import algo
+from absequious.cluster import cluster_cdr3s, cluster_clones
+
+
+def _brute_force(cdr3s, max_dist):
+    """cluster_cdr3s by comparing every pair"""
+    labels = list(range(len(cdr3s)))
+    for i, a in enumerate(cdr3s):
+        for j in range(i):
+            b = cdr3s[j]
+            if len(a) == len(b) and sum(x != y for x, y in zip(a, b)) <= max_dist:
+                old, new = max(labels[i], labels[j]), min(labels[i], labels[j])
+                labels = [new if label == old else label for label in labels]
+    numbering = {}
+    return [numbering.setdefault(label, len(numbering)) for label in labels]
+
+
+def test_cluster_cdr3s():
+    # single linkage: AAAA and CCAA are linked through CAAA
+    assert cluster_cdr3s(["AAAA", "CCAA", "GGGG", "CAAA", "AAA"]) == [0, 0, 1, 0, 2]
+    assert cluster_cdr3s(["AAAA", "CCAA", "AAAC"], max_dist=0) == [0, 1, 2]
+    assert cluster_cdr3s(["AAAA", "CCAA", "AC", "GT"], max_dist=2) == [0, 0, 1, 1]
+    assert cluster_cdr3s([]) == []
+
+    rng = random.Random(0)
+    cdr3s = list(
+        {
+            "".join(rng.choice("ACD") for _ in range(rng.randint(3, 6)))
+            for _ in range(300)
+        }
+    )
+    for max_dist in (1, 2):
+        assert cluster_cdr3s(cdr3s, max_dist) == _brute_force(cdr3s, max_dist)
+
+
+def test_cluster_clones():
+    seqs = ["FRCARAAAWG", "FRCARAAAWG", "FRCARAACWG", "FRCARGGGWG", "FRCARGGGWG"]
+    seqs += ["FRCARTTWG"]
+    table = algo.ReportTable(
+        {
+            "read": seqs,
+            "sequence": seqs,
+            "H-CDR3": [seq[2:-2] for seq in seqs],
+            "complete?": [True] * len(seqs),
+            "frameshift?": [False] * len(seqs),
+            "stop?": [False] * len(seqs),
+        }
+    )
+    counts = algo.CloneCounts()
+    counts.add_table(table, failed=1)
+
+    cdr3_cluster, rows = cluster_clones(counts)
+    assert cdr3_cluster == {
+        "CARAAA": "cluster_1",
+        "CARAAC": "cluster_1",
+        "CARGGG": "cluster_2",
+        "CARTT": "cluster_3",
+    }
+    assert rows == [
+        ("cdr3_clusters", "", "", "", 3),
+        ("cluster_1", "CARAAA", 3 / 7, 3, 7),
+        ("cluster_2", "CARGGG", 2 / 7, 2, 7),
+    ]
@@ -0,0 +1,54 @@
+from absequious import algo
+from absequious.counts import RunCounts
+
+
+def _chunks(alns):
+    fwd, rc = alns["KY199430.1"], alns["KY199430.1_rc"]
+    # reads of two samples, split into chunks as run_pipeline does
+    chunks = [
+        [fwd.for_read("a_1"), None, rc.for_read("b_1")],
+        [fwd.for_read("b_2"), fwd.for_read("a_2")],
+        [None, rc.for_read("a_3")],
+    ]
+    read_ids = [["a_1", "b_0", "b_1"], ["b_2", "a_2"], ["a_0", "a_3"]]
+    return chunks, read_ids
+
+
+def _count(chunks, read_ids, sample_pattern=None):
+    run = RunCounts(sample_pattern)
+    for chunk, ids in zip(chunks, read_ids):
+        aligned = [aln for aln in chunk if aln is not None]
+        run.add_chunk(chunk, algo.ReportTable.from_alignments(aligned), ids)
+    return run
+
+
+def _summaries(counts):
+    return counts.summary(), counts.cdr3_freq(), counts.full_seq_freq()
+
+
+def test_merge_counts(batch_alns, tmp_path):
+    chunks, read_ids = _chunks(batch_alns)
+    whole = _count(chunks, read_ids, r"^(\w)_")
+
+    # counts of consecutive shards, saved and merged in order, summarize as the whole does
+    paths = []
+    for i in range(len(chunks)):
+        paths.append(tmp_path / f"shard{i}.counts")
+        _count(chunks[i : i + 1], read_ids[i : i + 1], r"^(\w)_").dump(paths[-1])
+    merged = RunCounts.load(paths[0])
+    for path in paths[1:]:
+        merged.merge(RunCounts.load(path))
+
+    assert _summaries(merged.counts) == _summaries(whole.counts)
+    assert list(merged.samples) == list(whole.samples) == ["a", "b"]
+    for sample, counts in whole.samples.items():
+        assert _summaries(merged.samples[sample]) == _summaries(counts)
+    assert whole.counts.total == 7
+    assert [whole.samples[s].failed for s in "ab"] == [1, 1]
+    assert [whole.samples[s].total for s in "ab"] == [4, 3]
+
+
+def test_sample():
+    assert RunCounts(r"^(\w)_").sample("a_1") == "a"
+    assert RunCounts(r"lane\d").sample("x_lane2_y") == "lane2"
+    assert RunCounts(r"^(\w)_").sample("nomatch") == ""
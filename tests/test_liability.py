@@ -0,0 +1,62 @@
+from absequious import algo, liability
+from absequious.counts import RunCounts
+
+NAMES = ("H-FR1", "H-CDR1", "H-FR3", "H-CDR3")
+
+
+def test_scan():
+    # NGS is both a glycosylation and a deamidation site, NPS neither; the motif spanning
+    # CDR1 and FR3 is placed where it starts.  of the three cysteines, the last of FR1 and
+    # of FR3 are taken to be bonded
+    domains = ("QVNGSC", "ANPSD", "GMWNATC", "CAMW")
+    assert liability.scan(domains, NAMES) == ";".join(
+        [
+            "n_glycosylation:H-FR1:3",
+            "deamidation:H-FR1:3",
+            "isomerization:H-CDR1:5",
+            "n_glycosylation:H-FR3:4",
+            "unpaired_cysteine:H-CDR3:1",
+            "met_oxidation:H-CDR3:3",
+            "trp_oxidation:H-CDR3:4",
+        ]
+    )
+    # an even number of cysteines are taken to be paired, and Met and Trp outside the
+    # CDRs are left alone
+    assert liability.scan(("C", "", "MW", "C"), NAMES) == ""
+    assert liability.scan(("NS", "", "", ""), NAMES) == "deamidation:H-FR1:1"
+
+
+def test_count():
+    column = ["", "deamidation:H-FR1:1;deamidation:H-CDR3:4", "deamidation:H-FR1:1"]
+    column += ["isomerization:H-CDR1:5"] * 2
+    assert liability.count(column) == {"deamidation": 2, "isomerization": 2}
+
+
+def test_liability_summary(batch_alns, tmp_path):
+    fwd, rc = batch_alns["KY199430.1"], batch_alns["KY199430.1_rc"]
+    layout = algo.ReportLayout(liabilities=True)
+    table = algo.ReportTable.from_alignments([fwd, rc, fwd], layout)
+    assert layout.columns[-1] == "liabilities"
+    domains = [table[name][0] for name in layout.domains]
+    assert table["liabilities"][0] == liability.scan(
+        tuple(domains), tuple(layout.domains)
+    )
+    assert list(table.rows())[0][-1] == table["liabilities"][0]
+
+    run = RunCounts()
+    run.add_chunk([fwd, rc, fwd, None], table)
+    summary = run.counts.summary()
+    assert summary[:4] == algo.CloneCounts.from_report(table, [None]).summary()[:4]
+    expected = liability.count(table["liabilities"])
+    assert [row[0] for row in summary[4:]] == [
+        f"liability_{name}" for name in liability.LIABILITIES
+    ]
+    for name, _, fraction, ct, total in summary[4:]:
+        assert ct == expected[name[len("liability_") :]]
+        assert (fraction, total) == (ct / 4, 4)
+
+    # the counts are saved and merged with the rest
+    run.dump(tmp_path / "run.counts")
+    loaded = RunCounts.load(tmp_path / "run.counts")
+    assert loaded.counts.summary() == summary
+    assert loaded.merge(run).counts.liability_ctr == expected + expected
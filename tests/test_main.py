@@ -0,0 +1,79 @@
+import argparse
+import subprocess
+import sys
+from multiprocessing.pool import ThreadPool
+from pathlib import Path
+
+import pytest
+
+from absequious.__main__ import DedupReads, batches, int_at_least, ordered_imap
+
+
+def test_ordered_imap():
+    submitted = []
+
+    def tasks():
+        for i in range(10):
+            submitted.append(i)
+            yield i
+
+    with ThreadPool(3) as p:
+        results = ordered_imap(p, lambda x: x * x, tasks(), max_in_flight=2)
+        assert next(results) == 0
+        # reading stops once max_in_flight tasks are waiting on the consumer
+        assert len(submitted) == 3
+        assert list(results) == [i * i for i in range(1, 10)]
+
+
+def test_batches():
+    reads = [(f"r{i}", "ACGT") for i in range(5)]
+    assert [len(b) for b in batches(reads, 2)] == [2, 2, 1]
+
+
+def test_int_at_least():
+    parse = int_at_least(3)
+    assert parse("3") == 3
+    for value in ("2", "-1", "x"):
+        with pytest.raises(argparse.ArgumentTypeError):
+            parse(value)
+
+
+def test_dedup_reads(batch_alns, batch_reads):
+    aln = batch_alns["KY199430.1"]
+    dna = batch_reads[0]["KY199430.1"]
+
+    dedup = DedupReads(
+        [("KY199430.1", dna), ("failed", "NNNN"), ("dup", dna), ("failed_dup", "NNNN")]
+    )
+    unique = list(dedup.unique())
+    assert unique == [("KY199430.1", dna), ("failed", "NNNN")]
+    alns = list(dedup.fan_out([aln, None]))
+
+    assert (dedup.n_reads, dedup.n_unique) == (4, 2)
+    assert alns[0] is aln and alns[1] is None and alns[3] is None
+    assert alns[2].seq_id == "dup:fwd:offset_2" and alns[2].read_id == "dup"
+    assert alns[2].annots == aln.annots and alns[2].dna_seq == aln.dna_seq
+
+
+def test_deferred_imports():
+    # the dependencies and modules of only some stages aren't imported at startup, nor by
+    # building the report's writer, so that workers don't inherit them
+    code = (
+        "import sys, absequious.__main__; "
+        "from absequious import algo, output; "
+        "output.ColumnarReportWriter('reads.parquet', 'parquet', algo.DEFAULT_LAYOUT); "
+        "print(' '.join(sorted(sys.modules)))"
+    )
+    loaded = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=Path(__file__).resolve().parent.parent,
+        stdout=subprocess.PIPE,
+        text=True,
+        check=True,
+    ).stdout.split()
+    tops = {name.split(".")[0] for name in loaded}
+    assert "numpy" in tops
+    for heavy in ("pandas", "skbio", "Bio", "pyarrow", "pyhmmer", "cProfile", "sqlite3"):
+        assert heavy not in tops
+    for stage in ("cache", "checkpoint", "cluster", "sketch"):
+        assert f"absequious.{stage}" not in loaded
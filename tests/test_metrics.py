@@ -0,0 +1,62 @@
+import pstats
+import time
+
+from absequious import metrics
+
+
+def _work(n):
+    with metrics.stage("work", n):
+        time.sleep(0.01)
+    return list(metrics.timed_iter("items", range(n)))
+
+
+def test_disabled():
+    assert metrics.active() is None
+    assert metrics.stage("work") is metrics.stage("other", 5)
+    items = [1, 2]
+    assert metrics.timed_iter("items", items) is items
+    assert _work(3) == [0, 1, 2]
+
+
+def test_stages():
+    recorder = metrics.enable()
+    try:
+        assert _work(3) == [0, 1, 2]
+        with metrics.stage("outer"):
+            _work(2)
+        metrics.gauge("depth", 1)
+        metrics.gauge("depth", 4)
+    finally:
+        metrics.disable()
+    assert metrics.active() is None
+
+    calls, items, wall, cpu = recorder.stages["work"]
+    assert (calls, items) == (2, 5) and wall >= 0.02 and cpu < wall
+    assert recorder.stages["items"][:2] == [7, 5]
+    assert recorder.stages["outer"][2] >= 0.01
+
+    report = recorder.report(reads=5)
+    assert report["reads"] == 5 and report["processes"] == 1
+    assert report["stages"]["work"]["reads"] == 5
+    assert report["gauges"]["depth"] == {"samples": 2, "mean": 2.5, "max": 4}
+
+
+def test_merge_workers(tmp_path):
+    recorder = metrics.enable(profile=True)
+    try:
+        _work(1)
+        # as run in a worker process: the worker's metrics are returned with the result
+        result, snapshot = recorder.in_worker(_work)(2)
+        assert metrics.active() is recorder
+    finally:
+        metrics.disable()
+    assert result == [0, 1]
+    recorder.merge(snapshot)
+    assert recorder.stages["work"][:2] == [2, 3]
+    assert "absequious.metrics" in recorder.report()["worker_modules"]
+
+    recorder.dump_profiles(tmp_path)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["items.prof", "work.prof"]
+    stats = pstats.Stats(str(tmp_path / "work.prof")).stats
+    # the profiles of both processes are combined
+    assert any("sleep" in func[2] and stat[0] == 2 for func, stat in stats.items())
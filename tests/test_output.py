@@ -0,0 +1,105 @@
+import csv
+import io
+from tempfile import TemporaryFile
+
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+import pyarrow.feather
+import pyarrow.parquet
+
+from absequious import algo, output
+from absequious.__main__ import write_summary
+
+
+def _read(path, fmt):
+    if fmt == "parquet":
+        return pyarrow.parquet.read_table(path)
+    return pyarrow.feather.read_table(path)
+
+
+def _table(alns, n=10):
+    row = algo.report_row(alns["KY199430.1"])
+    rows = []
+    for i in range(n):
+        x = list(row)
+        x[0] = f"read{i}"
+        x[8] = "ARDYW"[: i % 5 + 1]
+        x[-2] = i % 3 == 0
+        rows.append(x)
+    rows[-1][10] = "GK"
+    return algo.ReportTable.from_rows(rows)
+
+
+@pytest.mark.parametrize("fmt", ["parquet", "arrow"])
+def test_report_writer(batch_alns, tmp_path, monkeypatch, fmt):
+    table = _table(batch_alns)
+    # several row groups, with dictionaries growing across them
+    monkeypatch.setattr(output, "ROW_GROUP_SIZE", 3)
+    path = tmp_path / f"reads.{fmt}"
+    with output.ColumnarReportWriter(path, fmt, algo.DEFAULT_LAYOUT) as writer:
+        writer.write(table.take(range(4)))
+        writer.write(table.take([]))
+        writer.write(table.take(range(4, len(table))))
+
+    result = _read(path, fmt)
+    assert result.schema == output.report_schema(algo.DEFAULT_LAYOUT)
+    assert pa.types.is_dictionary(result.schema.field("H-CDR3").type)
+    assert result.schema.field("frameshift?").type == pa.bool_()
+    if fmt == "parquet":
+        assert pyarrow.parquet.ParquetFile(path).num_row_groups == 4
+    columns = result.to_pydict()
+    for name in algo.REPORT_COLUMNS:
+        assert columns[name] == list(table[name])
+
+
+def test_csv_report_writer(batch_alns):
+    table = _table(batch_alns)
+    fout = io.StringIO()
+    writer = output.CSVReportWriter(fout, algo.DEFAULT_LAYOUT)
+    writer.write(table)
+    rows = list(csv.reader(io.StringIO(fout.getvalue())))
+    assert rows[0] == algo.REPORT_COLUMNS
+    assert rows[1:] == [list(map(str, row)) for row in table.rows()]
+
+
+@pytest.mark.parametrize("fmt", ["parquet", "arrow"])
+def test_write_padded(batch_alns, tmp_path, fmt):
+    alns = list(batch_alns.values())
+    padded = algo.PaddedAlignments(TemporaryFile())
+    padded.add(alns)
+    expected = list(padded.rows(batch_size=2))
+
+    path = tmp_path / f"padded.{fmt}"
+    output.write_padded(padded, path, fmt, batch_size=2)
+    result = _read(path, fmt)
+    assert result.schema.names == padded.columns()
+    assert list(zip(*result.to_pydict().values())) == expected
+
+
+@pytest.mark.parametrize("cluster_dist", [None, 1])
+def test_summary_tables(batch_alns, tmp_path, cluster_dist):
+    table = _table(batch_alns, n=40)
+    counts = algo.CloneCounts()
+    counts.add_table(table, 2)
+
+    fout = io.StringIO()
+    write_summary(counts, fout, cluster_dist)
+    summ = list(csv.reader(io.StringIO(fout.getvalue())))
+
+    output.write_summary_tables(counts, tmp_path / "out", "parquet", cluster_dist)
+    names = {"summ", "clones"} | ({"clusters"} if cluster_dist else set())
+    assert {path.name for path in tmp_path.iterdir()} == {
+        f"out_{name}.parquet" for name in names
+    }
+    stats = _read(tmp_path / "out_summ.parquet", "parquet").to_pydict()
+    by_name = dict(zip(stats["statistic"], zip(stats["fraction"], stats["count"])))
+    assert by_name["failed"] == (2 / 42, 2)
+    assert by_name["chao1_estimated_diversity"][0] is None
+    assert (by_name.get("cdr3_clusters") is None) == (cluster_dist is None)
+
+    clones = _read(tmp_path / "out_clones.parquet", "parquet").to_pydict()
+    csv_clones = [row for row in summ if len(row) >= 5 and row[0] in clones["sequence"]]
+    assert len(csv_clones) == len(clones["sequence"]) > 0
+    for row, count in zip(csv_clones, clones["count"]):
+        assert int(row[3]) == count
@@ -1,5 +1,101 @@
-from absequious.parse import HMMAln
+import io
 
+import pytest
 
-def test_parse(hmmsearch_output):
-    x = HMMAln(hmmsearch_output)
+from absequious import AlnState
+from absequious.__main__ import DEFAULT_HMM, iter_inprocess_alignments
+from absequious.hmm import load_models
+from absequious.parse import HMMAln, annot_fmt
+
+
+def test_parse(hmmsearch_output, dna_seqs, translated):
+    x = HMMAln(hmmsearch_output, dna_seqs["KY199430.1"], translated)
+    assert x.seq_id == "KY199430.1:fwd:offset_2"
+    assert x.best_match["hmm_from"] == 1 and x.best_match["hmm_to"] == 98
+    assert x.best_match["tgt_from"] == 53 and x.best_match["tgt_to"] == 150
+    assert len(x.annots) == 98
+
+
+def test_parse_batch(batch_hmmsearch_output, batch_reads):
+    reads, translated = batch_reads
+    alns = HMMAln.parse_batch(batch_hmmsearch_output, reads, translated)
+    assert sorted(alns) == ["KY199430.1", "KY199430.1_rc"]
+    assert alns["KY199430.1"].seq_id == "KY199430.1:fwd:offset_2"
+    assert alns["KY199430.1_rc"].seq_id == "KY199430.1_rc:rev_comp:offset_2"
+    assert alns["KY199430.1"].annots == alns["KY199430.1_rc"].annots
+    assert alns["KY199430.1"].dna_seq == alns["KY199430.1_rc"].dna_seq
+
+
+def test_parse_aln_guide_columns(batch_hmmsearch_output):
+    # domain 2 of the first target has a guide line starting with a space
+    blocks = next(HMMAln.iter_targets(batch_hmmsearch_output))
+    seq_id = "KY199430.1:fwd:offset_2"
+    _, annots = HMMAln.parse_aln(seq_id, blocks["alignments"][5:10])
+    assert "".join(tgt for tgt, _ in annots) == "QVSLTCLVKGFYPSDIAVEW"
+    assert [state for _, state in annots[:4]] == [
+        AlnState.mismatch,
+        AlnState.match_low,
+        AlnState.match_low,
+        AlnState.match_high,
+    ]
+
+
+def test_parse_tabular(batch_hmmsearch_output, batch_tabular_output, batch_reads):
+    reads, translated = batch_reads
+    domtbl, sto = batch_tabular_output
+    text_alns = HMMAln.parse_batch(batch_hmmsearch_output, reads, translated)
+    tab_alns = dict(
+        HMMAln.iter_best(
+            HMMAln.iter_tabular_alignments(
+                domtbl, sto, load_models(DEFAULT_HMM), reads, translated
+            )
+        )
+    )
+    assert sorted(tab_alns) == sorted(text_alns)
+    for read_id, aln in tab_alns.items():
+        assert aln.seq_id == text_alns[read_id].seq_id
+        assert aln.best_match == text_alns[read_id].best_match
+        assert aln.score_and_eval == text_alns[read_id].score_and_eval
+        assert aln.annots == text_alns[read_id].annots
+
+
+def test_inprocess_alignments(batch_hmmsearch_output, batch_reads):
+    pytest.importorskip("pyhmmer")
+    reads, translated = batch_reads
+    text_alns = HMMAln.parse_batch(batch_hmmsearch_output, reads, translated)
+    alns = dict(iter_inprocess_alignments(list(reads.items()), DEFAULT_HMM, 6))
+    assert sorted(alns) == sorted(text_alns)
+    for read_id, aln in alns.items():
+        expected = text_alns[read_id]
+        assert aln.seq_id == expected.seq_id
+        for field in ("hmm_from", "hmm_to", "tgt_from", "tgt_to", "env_from", "env_to"):
+            assert aln.best_match[field] == expected.best_match[field]
+        assert aln.score_and_eval == expected.score_and_eval
+        assert aln.annots == expected.annots
+
+
+def test_compact_alignment(batch_hmmsearch_output, batch_reads):
+    reads, translated = batch_reads
+    aln = HMMAln.parse_batch(batch_hmmsearch_output, reads, translated)["KY199430.1"]
+    assert not hasattr(aln, "__dict__")
+    assert aln.best_match.c_evalue == aln.best_match["c-Evalue"]
+    assert aln.best_match["hmm_from"] == aln.best_match.hmm_from == 1
+    assert len(aln.residues) == len(aln.states) == len(aln.annots)
+    assert annot_fmt(aln) == "".join(
+        {AlnState.insert: "i", AlnState.delete: "d", AlnState.mismatch: "x"}.get(s, "M")
+        for _, s in aln.annots
+    )
+
+
+def test_parse_models(batch_hmmsearch_output, batch_reads):
+    reads, translated = batch_reads
+    report = batch_hmmsearch_output.read()
+    # the same search by a second query, scoring KY199430.1_rc higher
+    second = report.replace("Query:       ighv", "Query:       ighv2")
+    head, rc = second.split(">> KY199430.1_rc")
+    second = head + ">> KY199430.1_rc" + rc.replace("!  193.0", "!  199.0", 1)
+    alns = HMMAln.parse_batch(io.StringIO(report + second), reads, translated)
+    assert alns["KY199430.1"].model == "ighv"
+    assert alns["KY199430.1"].best_match.score == 193.0
+    assert alns["KY199430.1_rc"].model == "ighv2"
+    assert alns["KY199430.1_rc"].best_match.score == 199.0
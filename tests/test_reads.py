@@ -0,0 +1,107 @@
+import gzip
+import random
+
+import pytest
+from Bio import bgzf
+
+from absequious.reads import (
+    ReadsFormatError,
+    _BgzfReader,
+    iter_range,
+    iter_reads,
+    open_reads,
+    split_ranges,
+)
+
+
+def _reads(n=2000, seed=0):
+    rng = random.Random(seed)
+    return [
+        (f"r{i}", "".join(rng.choices("ACGT", k=rng.randint(50, 300))))
+        for i in range(n)
+    ]
+
+
+def _fasta(reads):
+    # sequences wrapped over several lines, and headers with descriptions
+    return "".join(
+        f">{read_id} some description\n"
+        + "".join(dna[i : i + 60] + "\n" for i in range(0, len(dna), 60))
+        for read_id, dna in reads
+    )
+
+
+def _fastq(reads, seed=0, quals="@@I#"):
+    # quality lines starting with "@", like headers
+    rng = random.Random(seed)
+    return "".join(
+        f"@{read_id}\n{dna}\n+\n{''.join(rng.choices(quals, k=len(dna)))}\n"
+        for read_id, dna in reads
+    )
+
+
+def _write(path, text, compression=None):
+    if compression == "gzip":
+        with gzip.open(path, "wt") as fout:
+            fout.write(text)
+    elif compression == "bgzf":
+        with bgzf.BgzfWriter(str(path), "wb") as fout:
+            fout.write(text.encode())
+    else:
+        path.write_text(text)
+    return str(path)
+
+
+@pytest.mark.parametrize("compression", [None, "gzip", "bgzf"])
+@pytest.mark.parametrize("fmt", ["fasta", "fastq"])
+def test_iter_reads(tmp_path, fmt, compression):
+    reads = _reads()
+    text = _fasta(reads) if fmt == "fasta" else _fastq(reads)
+    path = _write(tmp_path / "reads", text, compression)
+    with open_reads(path) as fin:
+        assert list(iter_reads(fin)) == reads
+
+    ranges = split_ranges(path, 7)
+    if compression == "gzip":
+        assert ranges is None
+        return
+    for n in (1, 2, 7, 100):
+        ranges = split_ranges(path, n)
+        assert [read for r in ranges for read in iter_range(r)] == reads
+
+
+@pytest.mark.parametrize("compression", [None, "bgzf"])
+def test_iter_range_fastq_quals(tmp_path, compression):
+    # quality lines starting with ">", like FASTA headers, and "@", like FASTQ headers
+    reads = _reads(300)
+    path = _write(tmp_path / "reads", _fastq(reads, quals=">@D"), compression)
+    for n in (2, 7, 40, 100, 300):
+        ranges = split_ranges(path, n)
+        assert [read for r in ranges for read in iter_range(r)] == reads
+
+
+def test_bgzf_reader(tmp_path):
+    # lines, and their virtual offsets, as Bio.bgzf reads them, over several blocks
+    path = _write(tmp_path / "reads.gz", _fasta(_reads()), "bgzf")
+    with bgzf.BgzfReader(path, "rb") as expected, _BgzfReader(path) as f:
+        offsets = []
+        while True:
+            assert f.tell() == expected.tell()
+            offsets.append(f.tell())
+            line = f.readline()
+            assert line == expected.readline()
+            if not line:
+                break
+        assert len({offset >> 16 for offset in offsets}) > 3
+        for offset in offsets[::97]:
+            f.seek(offset)
+            expected.seek(offset)
+            assert f.readline() == expected.readline()
+
+
+def test_iter_reads_errors(tmp_path):
+    with pytest.raises(ReadsFormatError):
+        list(iter_reads(["ACGT\n"]))
+    with pytest.raises(ReadsFormatError):
+        list(iter_reads(["@r1\n", "ACGT\n", "+\n", "II\n"]))
+    assert list(iter_reads(["\n"])) == []
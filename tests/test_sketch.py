@@ -0,0 +1,126 @@
+import random
+from collections import Counter
+
+from skbio.diversity import alpha
+
+from absequious import algo
+from absequious.sketch import ApproxCloneCounts, DistinctSample, SpaceSaving
+
+
+def _stream(n=20000, n_items=5000, seed=0):
+    rng = random.Random(seed)
+    return [f"s{int(n_items * rng.random() ** 3)}" for _ in range(n)]
+
+
+def _table(seqs):
+    return algo.ReportTable(
+        {
+            "read": seqs,
+            "sequence": seqs,
+            "H-CDR3": [seq[-2:] for seq in seqs],
+            "complete?": [not seq.endswith("7") for seq in seqs],
+            "frameshift?": [False] * len(seqs),
+            "stop?": [False] * len(seqs),
+        }
+    )
+
+
+def test_chao1():
+    for counts in ([1, 1, 2, 5], [3, 4], [1] * 10, [2, 2, 1]):
+        freqs = Counter(counts)
+        assert algo.chao1(len(counts), freqs[1], freqs[2]) == alpha.chao1(counts)
+
+
+def test_space_saving():
+    stream = _stream()
+    half = len(stream) // 2
+    halves = [SpaceSaving(200), SpaceSaving(200)]
+    for i, item in enumerate(stream):
+        halves[i >= half].update(item)
+    merged = SpaceSaving(200).merge(halves[0]).merge(halves[1])
+
+    for ss, truth in ((halves[0], Counter(stream[:half])), (merged, Counter(stream))):
+        assert len(ss.counts) == 200 and ss.total == sum(truth.values())
+        for item, ct, err in ss.most_common():
+            assert ct - err <= truth[item] <= ct
+        # every item occurring more than total / capacity times is kept
+        heavy = {item for item, ct in truth.items() if ct > ss.total / 200}
+        assert heavy <= set(ss.counts)
+
+
+def test_distinct_sample():
+    stream = _stream()
+    truth = Counter(stream)
+    exact = DistinctSample(len(truth))
+    sample = DistinctSample(500)
+    for item in stream:
+        exact.update(item)
+        sample.update(item)
+
+    # with room for every item, the estimates are exact
+    assert not exact.saturated
+    assert exact.n_distinct() == (len(truth), 0.0)
+    assert exact.n_with(1, 1) == (sum(ct == 1 for ct in truth.values()), 0.0)
+
+    assert sample.saturated
+    for item, (_, ct, _) in sample.counts.items():
+        assert ct == truth[item]
+    for (est, err), expected in (
+        (sample.n_distinct(), len(truth)),
+        (sample.n_with(1, 1), sum(ct == 1 for ct in truth.values())),
+    ):
+        assert abs(est - expected) <= 3 * err
+
+    # too small a sample to estimate from
+    for size in (1, 2):
+        tiny = DistinctSample(size)
+        for item in stream:
+            tiny.update(item)
+        assert tiny.saturated and tiny.n_distinct() == (size, 0.0)
+
+
+def test_approx_clone_counts():
+    stream = _stream()
+    exact = algo.CloneCounts()
+    roomy, tight = ApproxCloneCounts(10000), ApproxCloneCounts(300)
+    for i in range(0, len(stream), 500):
+        table = _table(stream[i : i + 500])
+        for counts in (exact, roomy, tight):
+            counts.add_table(table, failed=1)
+
+    # until there are more unique sequences than max_clones, the counts are exact
+    assert roomy.summary() == exact.summary()
+    expected = exact.full_seq_freq()
+    got = roomy.full_seq_freq()
+    assert [row[:5] for row in got] == expected
+    assert {row[5] for row in got} == {0, 0.0, ""}
+
+    assert tight.summary() == exact.summary()
+    freq = tight.full_seq_freq()
+    est_chao1, bound = freq[0][4:]
+    assert abs(est_chao1 - expected[0][4]) <= bound
+    truth = {row[0]: row[3] for row in expected[3:]}
+    for seq, cdr3, _, ct, _, err in freq[3:]:
+        assert ct - err <= truth[seq] <= ct and cdr3 == seq[-2:].upper()
+
+    # and so are the CDR3s, which are bounded like the clones
+    assert [row[:4] for row in roomy.cdr3_freq()] == exact.cdr3_freq()
+    truth = Counter(seq[-2:] for seq in stream)
+    tight = ApproxCloneCounts(30)
+    for i in range(0, len(stream), 500):
+        tight.add_table(_table(stream[i : i + 500]))
+    assert len(tight.cdr3s.counts) == 30 and tight.cdr3_freq()
+    for cdr3, _, ct, _, err in tight.cdr3_freq():
+        assert ct - err <= truth[cdr3] <= ct
+
+
+def test_approx_clone_counts_rows(batch_alns):
+    # reads counted a row at a time, as a CloneCounts can be
+    alns = list(batch_alns.values()) * 2
+    exact, approx = algo.CloneCounts(), ApproxCloneCounts(10)
+    for counts in (exact, approx):
+        for aln in alns:
+            counts.add(algo.report_row(aln))
+    assert approx.summary() == exact.summary()
+    assert [row[:5] for row in approx.full_seq_freq()] == exact.full_seq_freq()
+    assert [row[:4] for row in approx.cdr3_freq()] == exact.cdr3_freq()
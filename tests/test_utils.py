@@ -1,4 +1,7 @@
+import pytest
+
 from absequious import utils
+from absequious.parse import HMMAln
 
 
 def test_translate_six():
@@ -10,3 +13,45 @@ def test_translate_six():
         (utils.Dir.rev_comp, 1, "LSSVA"),
         (utils.Dir.rev_comp, 2, "CHRLH"),
     ]
+
+
+def _translate_six_biopython(dna):
+    """six-frame translation done one frame at a time with Biopython"""
+    ret = []
+    for comp, seq in ((utils.Dir.fwd, dna), (utils.Dir.rev_comp, utils.revcomp(dna))):
+        for offset in range(3):
+            trim = -1 * ((len(seq) - offset) % 3) or None
+            ret.append((comp, offset, utils.translate(seq[offset:trim])))
+    return ret
+
+
+def test_translate_six_batch():
+    dnas = [
+        "ATGCAACCGATGACAAA",
+        "atgcaNccgatgaNNaaTAG",
+        "GGNCTNTANNNN",
+        "AT",
+        "",
+        "NNNACGTACGTTTTAAAGGGCCCTGA",
+    ]
+    assert utils.translate_six_batch(dnas) == [
+        _translate_six_biopython(dna) for dna in dnas
+    ]
+
+
+def test_translate_six_batch_invalid():
+    with pytest.raises(KeyError):
+        utils.translate_six_batch(["ACGT", "ACRT"])
+
+
+def test_prefilter_frames(batch_hmmsearch_output, batch_reads):
+    # the frame hmmsearch picks for each fixture read must survive even the most aggressive
+    # prefilter
+    reads, translated = batch_reads
+    for read_id, aln in HMMAln.parse_batch(
+        batch_hmmsearch_output, reads, translated
+    ).items():
+        frames = utils.prefilter_frames(utils.translate_six(reads[read_id]), 1)
+        assert [
+            f"{read_id}:{comp.name}:offset_{offset}" for comp, offset, _ in frames
+        ] == [aln.seq_id]